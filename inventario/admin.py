@@ -2,74 +2,163 @@
 from django.contrib import admin
 
 # Importamos todos los modelos que hemos definido en models.py
-from .models import Producto, Cliente, Proveedor, Compra, DetalleCompra, Venta, DetalleVenta
+from .models import Producto, Cliente, Proveedor, Compra, DetalleCompra, Venta, DetalleVenta, Reserva
+from .servicios.borrado import eliminar_clientes, eliminar_proveedores, eliminar_productos
+from .servicios.autocompletar import invalidar_autocompletar
+from .servicios.versiones import marcar_cambio
+from .servicios.busqueda import filtrar_productos_por_texto
+from .servicios.reservas import liberar
+from .servicios.unidad_trabajo import diferir_recalculos
+
+
+# Mixin para que guardar o borrar desde el admin aplique stock y totales
+# una sola vez por producto y cabecera (ver servicios.unidad_trabajo)
+class DiferirRecalculosAdminMixin:
+    def changeform_view(self, *args, **kwargs):
+        with diferir_recalculos():
+            return super().changeform_view(*args, **kwargs)
+
+    def delete_view(self, *args, **kwargs):
+        with diferir_recalculos():
+            return super().delete_view(*args, **kwargs)
+
+    def delete_queryset(self, request, queryset):
+        with diferir_recalculos():
+            super().delete_queryset(request, queryset)
+
+
+# Mixin para Cliente, Proveedor y Producto: el borrado usa servicios.borrado
+# (stock y totales en bloque) y se añaden acciones para archivar sin borrar
+class BorradoEnBloqueAdminMixin(DiferirRecalculosAdminMixin):
+    eliminar = None
+    actions = ['archivar', 'desarchivar']
+
+    def delete_model(self, request, obj):
+        self.eliminar([obj.pk])
+
+    def delete_queryset(self, request, queryset):
+        self.eliminar(list(queryset.values_list('pk', flat=True)))
+
+    @admin.action(description='Archivar seleccionados (ocultar sin borrar)')
+    def archivar(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        queryset.update(archivado=True)
+        invalidar_autocompletar(queryset.model)  # update() no dispara señales
+        marcar_cambio(queryset.model, ids)
+
+    @admin.action(description='Desarchivar seleccionados')
+    def desarchivar(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        queryset.update(archivado=False)
+        invalidar_autocompletar(queryset.model)
+        marcar_cambio(queryset.model, ids)
 
 # Registramos el modelo Producto para que aparezca en el admin
 @admin.register(Producto)
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(BorradoEnBloqueAdminMixin, admin.ModelAdmin):
+    # Borrado en bloque sin cascada de señales (ver servicios.borrado)
+    eliminar = staticmethod(eliminar_productos)
     # Campos que se mostrarán en la lista principal del admin para Productos
-    list_display = ('nombre', 'precio', 'stock')
+    list_display = ('nombre', 'precio', 'stock', 'reservado')
     # Campos por los que se podrá realizar búsqueda rápida
     search_fields = ('nombre',)
     # Filtros laterales para filtrar productos por precio
-    list_filter = ('precio',)
+    list_filter = ('precio', 'archivado')
+
+    def get_search_results(self, request, queryset, search_term):
+        # El buscador usa el índice FTS5 (nombre y descripción, por prefijo y
+        # sin tildes) en lugar de un LIKE '%texto%' que recorre toda la tabla
+        return filtrar_productos_por_texto(queryset, search_term), False
 
 # Registramos el modelo Cliente en el admin
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BorradoEnBloqueAdminMixin, admin.ModelAdmin):
+    # Borrado en bloque sin cascada de señales (ver servicios.borrado)
+    eliminar = staticmethod(eliminar_clientes)
     # Campos visibles en la lista de clientes
     list_display = ('nombre', 'email', 'telefono')
     # Búsqueda rápida por nombre o email
     search_fields = ('nombre', 'email')
-    # Filtro lateral por nombre del cliente
-    list_filter = ('nombre',)
+    # Filtro lateral por nombre del cliente y por archivado
+    list_filter = ('nombre', 'archivado')
 
 # Registramos el modelo Proveedor
 @admin.register(Proveedor)
-class ProveedorAdmin(admin.ModelAdmin):
+class ProveedorAdmin(BorradoEnBloqueAdminMixin, admin.ModelAdmin):
+    # Borrado en bloque sin cascada de señales (ver servicios.borrado)
+    eliminar = staticmethod(eliminar_proveedores)
     # Campos visibles en la lista de proveedores
     list_display = ('nombre', 'contacto', 'telefono')
     # Búsqueda por nombre del proveedor o contacto
     search_fields = ('nombre', 'contacto')
-    # Filtro lateral por nombre del proveedor
-    list_filter = ('nombre',)
+    # Filtro lateral por nombre del proveedor y por archivado
+    list_filter = ('nombre', 'archivado')
 
 # Registramos el modelo Compra
 @admin.register(Compra)
-class CompraAdmin(admin.ModelAdmin):
+class CompraAdmin(DiferirRecalculosAdminMixin, admin.ModelAdmin):
     # Mostramos id de compra, proveedor, fecha y total
     list_display = ('id', 'proveedor', 'fecha', 'total')
     # Permitimos buscar por nombre del proveedor (relación ForeignKey)
     search_fields = ('proveedor__nombre',)
     # Filtro lateral por fecha de la compra
     list_filter = ('fecha',)
+    # Desplegable que busca al escribir en vez de cargar todos los proveedores
+    autocomplete_fields = ('proveedor',)
 
 # Registramos DetalleCompra, que guarda cada producto comprado en una compra
 @admin.register(DetalleCompra)
-class DetalleCompraAdmin(admin.ModelAdmin):
+class DetalleCompraAdmin(DiferirRecalculosAdminMixin, admin.ModelAdmin):
     # Campos visibles: la compra relacionada, el producto, cantidad y precio unitario
     list_display = ('compra', 'producto', 'cantidad', 'precio_unitario')
     # Búsqueda por nombre del producto
     search_fields = ('producto__nombre',)
     # Filtramos por la compra a la que pertenece el detalle
     list_filter = ('compra',)
+    # Producto y compra se eligen buscando, sin cargar el catálogo entero
+    autocomplete_fields = ('compra', 'producto')
 
 # Registramos el modelo Venta
 @admin.register(Venta)
-class VentaAdmin(admin.ModelAdmin):
+class VentaAdmin(DiferirRecalculosAdminMixin, admin.ModelAdmin):
     # Mostramos id de venta, cliente, fecha y total
     list_display = ('id', 'cliente', 'fecha', 'total')
     # Búsqueda por nombre del cliente (relación ForeignKey)
     search_fields = ('cliente__nombre',)
     # Filtrar por fecha de venta
     list_filter = ('fecha',)
+    # Desplegable que busca al escribir en vez de cargar todos los clientes
+    autocomplete_fields = ('cliente',)
 
 # Registramos DetalleVenta, que guarda cada producto vendido en una venta
 @admin.register(DetalleVenta)
-class DetalleVentaAdmin(admin.ModelAdmin):
+class DetalleVentaAdmin(DiferirRecalculosAdminMixin, admin.ModelAdmin):
     # Mostramos la venta relacionada, producto, cantidad, precio unitario y subtotal
     list_display = ('venta', 'producto', 'cantidad', 'precio_unitario', 'subtotal')
     # Búsqueda por nombre de producto vendido
     search_fields = ('producto__nombre',)
     # Filtrar por la venta a la que pertenece el detalle
     list_filter = ('venta',)
+    # Producto y venta se eligen buscando, sin cargar el catálogo entero
+    autocomplete_fields = ('venta', 'producto')
+
+# Registramos Reserva, que retiene stock de un producto durante un tiempo
+@admin.register(Reserva)
+class ReservaAdmin(admin.ModelAdmin):
+    # Mostramos producto, cantidad retenida, usuario y caducidad
+    list_display = ('id', 'producto', 'cantidad', 'usuario', 'expira')
+    # Filtrar por fecha de caducidad
+    list_filter = ('expira',)
+    # Las reservas se crean por la API: aquí sólo se consultan o se liberan,
+    # para que Producto.reservado no se desincronice
+    readonly_fields = ('producto', 'cantidad', 'usuario', 'creada', 'expira')
+
+    def has_add_permission(self, request):
+        return False
+
+    def delete_model(self, request, obj):
+        liberar(obj)
+
+    def delete_queryset(self, request, queryset):
+        for reserva in queryset:
+            liberar(reserva)
@@ -2,20 +2,35 @@ from django.urls import path
 
 # Importamos todas las vistas de la API definidas en views_api.py
 from .views.views_api import (
-    ProductoListCreateView, ProductoRetrieveUpdateDestroyView,
+    ProductoListCreateView, ProductoRetrieveUpdateDestroyView, ProductoBusquedaView,
     ClienteListCreateView, ClienteRetrieveUpdateDestroyView,
     ProveedorListCreateView, ProveedorRetrieveUpdateDestroyView,
     CompraListCreateView, CompraRetrieveUpdateDestroyView,
     DetalleCompraListCreateView, DetalleCompraRetrieveUpdateDestroyView,
     VentaListCreateView, VentaRetrieveUpdateDestroyView,
     DetalleVentaListCreateView, DetalleVentaRetrieveUpdateDestroyView,
+    ReservaListCreateView, ReservaRetrieveDestroyView, confirmar_reservas_view,
+    StockHistoricoView,
+    autocompletar_view,
+    productos_bulk_view,
+    exportar_view,
+    importar_view,
+    cambios_view,
+    metricas_view,
 )
+from .views.views_async import (
+    productos_async_view, producto_async_view, stock_async_view,
+    clientes_buscar_async_view, venta_async_view, compra_async_view,
+)
+from .views.views_eventos import eventos_view
 
 # Definimos las rutas de la API, agrupadas por recurso
 urlpatterns = [
 
     # ==================== PRODUCTOS ====================
     path('productos/', ProductoListCreateView.as_view(), name='api-producto-list-create'),
+    path('productos/buscar/', ProductoBusquedaView.as_view(), name='api-producto-buscar'),
+    path('productos/bulk/', productos_bulk_view, name='api-producto-bulk'),
     path('productos/<int:pk>/', ProductoRetrieveUpdateDestroyView.as_view(), name='api-producto-detail'),
 
     # ==================== CLIENTES ====================
@@ -42,5 +57,39 @@ urlpatterns = [
     path('detalles-venta/', DetalleVentaListCreateView.as_view(), name='api-detalles-venta-list-create'),
     path('detalles-venta/<int:pk>/', DetalleVentaRetrieveUpdateDestroyView.as_view(), name='api-detalles-venta-detail'),
 
+    # ==================== RESERVAS ====================
+    path('reservas/', ReservaListCreateView.as_view(), name='api-reserva-list-create'),
+    path('reservas/confirmar/', confirmar_reservas_view, name='api-reserva-confirmar'),
+    path('reservas/<int:pk>/', ReservaRetrieveDestroyView.as_view(), name='api-reserva-detail'),
+
+    # ==================== STOCK EN UNA FECHA ====================
+    path('stock-historico/', StockHistoricoView.as_view(), name='api-stock-historico'),
+
+    # ==================== AUTOCOMPLETAR ====================
+    path('autocompletar/<str:recurso>/', autocompletar_view, name='api-autocompletar'),
+
+    # ==================== EXPORTACIÓN (CSV / NDJSON) ====================
+    path('exportar/<str:recurso>/', exportar_view, name='api-exportar'),
+
+    # ==================== IMPORTACIÓN MASIVA (NDJSON / CSV) ====================
+    path('importar/<str:recurso>/', importar_view, name='api-importar'),
+
+    # ==================== CAMBIOS (SINCRONIZACIÓN INCREMENTAL) ====================
+    path('cambios/', cambios_view, name='api-cambios'),
+
+    # ==================== LECTURAS ASYNC (ORM ASYNC, ASGI) ====================
+    path('async/productos/', productos_async_view, name='api-async-producto-list'),
+    path('async/productos/<int:pk>/', producto_async_view, name='api-async-producto-detail'),
+    path('async/stock/', stock_async_view, name='api-async-stock'),
+    path('async/clientes/buscar/', clientes_buscar_async_view, name='api-async-cliente-buscar'),
+    path('async/ventas/<int:pk>/', venta_async_view, name='api-async-venta-detail'),
+    path('async/compras/<int:pk>/', compra_async_view, name='api-async-compra-detail'),
+
+    # ==================== EVENTOS EN VIVO (SSE, ASGI) ====================
+    path('eventos/', eventos_view, name='api-eventos'),
+
+    # ==================== MÉTRICAS (PROMETHEUS) ====================
+    path('_metrics/', metricas_view, name='api-metricas'),
+
     # NUEVO ENDPOINT PARA VALIDACIÓN DE TOKEN (puede agregarse aquí si lo necesitas)
 ]
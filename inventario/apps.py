@@ -13,3 +13,12 @@ class InventarioConfig(AppConfig):
     def ready(self):
         # Importamos el módulo de señales para activar la lógica automática (como actualizar stock, totales, etc.)
         import inventario.signals
+
+        # Cada conexión nueva a la BD registra sus consultas lentas (ver consultas_lentas.py)
+        from django.db.backends.signals import connection_created
+        from inventario.consultas_lentas import instalar
+        connection_created.connect(instalar, dispatch_uid='inventario_consultas_lentas')
+
+        # Y cronometra sus consultas para el perfilado de peticiones (ver perfilado.py)
+        from inventario.perfilado import instalar_cronometro
+        connection_created.connect(instalar_cronometro, dispatch_uid='inventario_perfilado')
@@ -0,0 +1,152 @@
+# inventario/consultas_lentas.py
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.utils import timezone
+
+# Vista que está atendiendo la petición en curso (ver ConsultasLentasMiddleware)
+vista_actual = ContextVar('vista_actual', default=None)
+
+# Evita registrar el propio EXPLAIN o entrar en bucle si también fuese lento
+_explicando = ContextVar('explicando_consulta', default=False)
+
+_RAIZ_PROYECTO = str(settings.BASE_DIR)
+_MARCOS_PILA = 8
+_MAX_SQL = 4000
+
+
+# -------------------------------------------------------------------
+# 🐢 Registro de consultas lentas
+# -------------------------------------------------------------------
+def umbral_ms():
+    """Umbral en milisegundos; None desactiva el registro."""
+    return getattr(settings, 'CONSULTAS_LENTAS_UMBRAL_MS', None)
+
+
+def fichero_log():
+    return str(getattr(settings, 'CONSULTAS_LENTAS_FICHERO', settings.BASE_DIR / 'logs' / 'consultas_lentas.log'))
+
+
+def instalar(sender=None, connection=None, **kwargs):
+    """
+    Receptor de connection_created: añade el cronómetro a cada conexión nueva,
+    de modo que cubre vistas, comandos y tareas por igual.
+    """
+    if connection is not None and registrar_si_lenta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(registrar_si_lenta)
+
+
+def registrar_si_lenta(execute, sql, params, many, context):
+    umbral = umbral_ms()
+    if umbral is None or _explicando.get():
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    resultado = execute(sql, params, many, context)
+    ms = (time.perf_counter() - inicio) * 1000
+    if ms >= umbral:
+        conexion = context['connection']
+        _escribir({
+            'fecha': timezone.now().isoformat(),
+            'ms': round(ms, 2),
+            'sql': sql[:_MAX_SQL],
+            'forma': normalizar_sql(sql),
+            'vista': vista_actual.get(),
+            'plan': None if many else explicar(conexion, sql, params),
+            'pila': resumen_pila(),
+        })
+    return resultado
+
+
+def explicar(conexion, sql, params):
+    """
+    Plan de ejecución de la sentencia (EXPLAIN QUERY PLAN en SQLite, EXPLAIN
+    en otros motores). No vuelve a ejecutar la consulta.
+    """
+    token = _explicando.set(True)
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute(f'{conexion.ops.explain_query_prefix()} {sql}', params)
+            return [' '.join(str(col) for col in fila) for fila in cursor.fetchall()]
+    except Exception as exc:  # El plan es informativo: nunca debe romper la consulta original
+        return [f'(sin plan: {exc})']
+    finally:
+        _explicando.reset(token)
+
+
+def resumen_pila():
+    """Últimos marcos de código del proyecto (sin Django ni librerías) que llevaron a la consulta."""
+    marcos = [
+        f'{os.path.relpath(marco.filename, _RAIZ_PROYECTO)}:{marco.lineno} {marco.name}'
+        for marco in traceback.extract_stack()
+        if marco.filename.startswith(_RAIZ_PROYECTO)
+        and 'site-packages' not in marco.filename
+        and not marco.filename.endswith('consultas_lentas.py')
+    ]
+    return marcos[-_MARCOS_PILA:]
+
+
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTAS_IN = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_ESPACIOS = re.compile(r'\s+')
+
+
+def normalizar_sql(sql):
+    """
+    Forma de la consulta para agrupar: literales y números como ?, listas
+    IN (...) de cualquier longitud iguales y espacios colapsados.
+    """
+    forma = _LITERALES.sub('?', sql)
+    forma = _LISTAS_IN.sub('IN (...)', forma)
+    return _ESPACIOS.sub(' ', forma).strip()
+
+
+# -------------------------------------------------------------------
+# 📝 Escritura en un log local rotativo (una línea JSON por consulta)
+# -------------------------------------------------------------------
+_lock = threading.Lock()
+_manejadores = {}
+
+
+def _manejador(ruta):
+    # Uno por fichero; se crea la carpeta la primera vez que hace falta
+    manejador = _manejadores.get(ruta)
+    if manejador is None:
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        manejador = RotatingFileHandler(
+            ruta, encoding='utf-8',
+            maxBytes=getattr(settings, 'CONSULTAS_LENTAS_MAX_BYTES', 5 * 1024 * 1024),
+            backupCount=getattr(settings, 'CONSULTAS_LENTAS_COPIAS', 5),
+        )
+        _manejadores[ruta] = manejador
+    return manejador
+
+
+def _escribir(registro):
+    linea = json.dumps(registro, ensure_ascii=False, default=str)
+    with _lock:
+        manejador = _manejador(fichero_log())
+        manejador.emit(logging.makeLogRecord({'msg': linea, 'levelno': logging.WARNING}))
+
+
+def leer_registros(ruta=None):
+    """Registros del log y de sus copias rotadas (.1, .2, ...), del más antiguo al más nuevo."""
+    ruta = ruta or fichero_log()
+    copias = getattr(settings, 'CONSULTAS_LENTAS_COPIAS', 5)
+    for fichero in [f'{ruta}.{n}' for n in range(copias, 0, -1)] + [ruta]:
+        if not os.path.exists(fichero):
+            continue
+        with open(fichero, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue
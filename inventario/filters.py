@@ -0,0 +1,111 @@
+# inventario/filters.py
+
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Compra, DetalleCompra, Venta, DetalleVenta, Producto
+
+
+# -------------------------------------------------------------------
+# 🕒 Rangos de fechas que aprovechan los índices
+# -------------------------------------------------------------------
+def _inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+class RangoDiasMixin:
+    """
+    Venta.fecha es DateTimeField: filtrar con fecha__date haría que SQLite
+    calculase la fecha de cada fila y no usara el índice. Traducimos el día a
+    un rango [00:00 del desde, 00:00 del día siguiente al hasta).
+    """
+    def filtrar_desde(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__gte': _inicio_del_dia(value)})
+
+    def filtrar_hasta(self, queryset, name, value):
+        return queryset.filter(**{f'{name}__lt': _inicio_del_dia(value + timedelta(days=1))})
+
+
+def _con_producto(modelo_detalle, campo_cabecera):
+    """Cabeceras con alguna línea del producto: EXISTS sobre el índice (producto, cabecera), sin DISTINCT."""
+    def filtrar(queryset, name, value):
+        lineas = modelo_detalle.objects.filter(producto=value, **{campo_cabecera: OuterRef('pk')})
+        return queryset.filter(Exists(lineas))
+    return filtrar
+
+
+# -------------------------------------------------------------------
+# 🛒 Compras y sus líneas
+# -------------------------------------------------------------------
+class CompraFilter(django_filters.FilterSet):
+    """
+    /api/compras/?proveedor=<id>&fecha_desde=AAAA-MM-DD&fecha_hasta=AAAA-MM-DD
+                 &producto=<id>&total_min=<n>&total_max=<n>
+    """
+    fecha_desde = django_filters.DateFilter(field_name='fecha', lookup_expr='gte')
+    fecha_hasta = django_filters.DateFilter(field_name='fecha', lookup_expr='lte')
+    total_min = django_filters.NumberFilter(field_name='total', lookup_expr='gte')
+    total_max = django_filters.NumberFilter(field_name='total', lookup_expr='lte')
+    producto = django_filters.ModelChoiceFilter(
+        queryset=Producto.objects.all(), method=_con_producto(DetalleCompra, 'compra')
+    )
+
+    class Meta:
+        model = Compra
+        fields = ['proveedor']
+
+
+class DetalleCompraFilter(django_filters.FilterSet):
+    """
+    /api/detalles-compra/?producto=<id>&compra=<id>&proveedor=<id>
+                         &fecha_desde=...&fecha_hasta=...&subtotal_min=<n>&subtotal_max=<n>
+    """
+    proveedor = django_filters.NumberFilter(field_name='compra__proveedor')
+    fecha_desde = django_filters.DateFilter(field_name='compra__fecha', lookup_expr='gte')
+    fecha_hasta = django_filters.DateFilter(field_name='compra__fecha', lookup_expr='lte')
+    subtotal_min = django_filters.NumberFilter(field_name='subtotal', lookup_expr='gte')
+    subtotal_max = django_filters.NumberFilter(field_name='subtotal', lookup_expr='lte')
+
+    class Meta:
+        model = DetalleCompra
+        fields = ['producto', 'compra']
+
+
+# -------------------------------------------------------------------
+# 💰 Ventas y sus líneas
+# -------------------------------------------------------------------
+class VentaFilter(RangoDiasMixin, django_filters.FilterSet):
+    """
+    /api/ventas/?cliente=<id>&fecha_desde=AAAA-MM-DD&fecha_hasta=AAAA-MM-DD
+                &producto=<id>&total_min=<n>&total_max=<n>
+    """
+    fecha_desde = django_filters.DateFilter(field_name='fecha', method='filtrar_desde')
+    fecha_hasta = django_filters.DateFilter(field_name='fecha', method='filtrar_hasta')
+    total_min = django_filters.NumberFilter(field_name='total', lookup_expr='gte')
+    total_max = django_filters.NumberFilter(field_name='total', lookup_expr='lte')
+    producto = django_filters.ModelChoiceFilter(
+        queryset=Producto.objects.all(), method=_con_producto(DetalleVenta, 'venta')
+    )
+
+    class Meta:
+        model = Venta
+        fields = ['cliente']
+
+
+class DetalleVentaFilter(RangoDiasMixin, django_filters.FilterSet):
+    """
+    /api/detalles-venta/?producto=<id>&venta=<id>&cliente=<id>
+                        &fecha_desde=...&fecha_hasta=...&subtotal_min=<n>&subtotal_max=<n>
+    """
+    cliente = django_filters.NumberFilter(field_name='venta__cliente')
+    fecha_desde = django_filters.DateFilter(field_name='venta__fecha', method='filtrar_desde')
+    fecha_hasta = django_filters.DateFilter(field_name='venta__fecha', method='filtrar_hasta')
+    subtotal_min = django_filters.NumberFilter(field_name='subtotal', lookup_expr='gte')
+    subtotal_max = django_filters.NumberFilter(field_name='subtotal', lookup_expr='lte')
+
+    class Meta:
+        model = DetalleVenta
+        fields = ['producto', 'venta']
@@ -1,17 +1,91 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
 from django.contrib.auth.forms import AuthenticationForm
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from .widgets import SelectAutocompletar
 from .models import (
     Cliente, Proveedor, Producto,
     Compra, Venta,
     DetalleCompra, DetalleVenta
 )
 
+# ---------------------------------------------------------
+# 🗄️ OCULTAR REGISTROS ARCHIVADOS EN LOS DESPLEGABLES
+# ---------------------------------------------------------
+class OcultarArchivadosMixin:
+    """
+    Los desplegables de los campos en `campos_archivables` no ofrecen
+    clientes/proveedores/productos archivados, salvo el que ya tenga asignado
+    la instancia que se está editando.
+    """
+    campos_archivables = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for campo in self.campos_archivables:
+            field = self.fields[campo]
+            actual = getattr(self.instance, f'{campo}_id', None)
+            filtro = Q(archivado=False) | Q(pk=actual) if actual else Q(archivado=False)
+            field.queryset = field.queryset.filter(filtro)
+
+# ---------------------------------------------------------
+# 🧾 FORMSET DE LÍNEAS CON UN ÚNICO DESPLEGABLE DE PRODUCTOS
+# ---------------------------------------------------------
+class LineasFormSet(BaseInlineFormSet):
+    """
+    El desplegable de producto de cada línea (SelectAutocompletar) sólo pinta
+    el producto elegido; sus nombres se leen en una consulta para todo el
+    formset y no una por línea. Se aceptan los productos no archivados y los
+    que ya tienen asignados las líneas existentes.
+    """
+    def _construct_form(self, i, **kwargs):
+        return self._compartir_productos(super()._construct_form(i, **kwargs))
+
+    @property
+    def empty_form(self):
+        return self._compartir_productos(super().empty_form)
+
+    def _compartir_productos(self, form):
+        if not hasattr(self, '_productos'):
+            self._asignados = {linea.producto_id for linea in self.get_queryset()}
+            self._productos = Producto.objects.filter(Q(archivado=False) | Q(pk__in=self._asignados))
+        campo = form.fields['producto']
+        campo.queryset = self._productos
+        campo.widget.etiquetas = self._etiquetas_producto  # Callable: sólo se consulta si se pinta
+        return form
+
+    def _etiquetas_producto(self):
+        if not hasattr(self, '_etiquetas'):
+            productos = Producto.objects.filter(pk__in=self._asignados).values_list('pk', 'nombre')
+            self._etiquetas = {str(pk): nombre for pk, nombre in productos}
+        return self._etiquetas
+
+# ---------------------------------------------------------
+# 🔤 NOMBRE ÚNICO DE CLIENTES Y PROVEEDORES
+# ---------------------------------------------------------
+class NombreUnicoFormMixin:
+    """
+    El nombre duplicado (sin distinguir tildes ni mayúsculas) lo detecta
+    Model.clean() con una búsqueda por índice. guardar() cubre la carrera entre
+    esa comprobación y el INSERT: convierte el IntegrityError del índice único
+    en un error del campo y devuelve None para que la vista repinte el form.
+    """
+    def guardar(self):
+        try:
+            with transaction.atomic():
+                return self.save()
+        except IntegrityError as exc:
+            if 'nombre_normalizado' not in str(exc):
+                raise
+            self.add_error('nombre', f"Ya existe un {self._meta.model._meta.verbose_name} con este nombre.")
+            return None
+
 # ---------------------------------------------------------
 # 📦 FORMULARIO DE CLIENTE
 # ---------------------------------------------------------
-class ClienteForm(forms.ModelForm):
+class ClienteForm(NombreUnicoFormMixin, forms.ModelForm):
     class Meta:
         model = Cliente
         fields = ['nombre', 'email', 'telefono']
@@ -37,7 +111,7 @@ class ClienteForm(forms.ModelForm):
 # ---------------------------------------------------------
 # 📦 FORMULARIO DE PROVEEDOR
 # ---------------------------------------------------------
-class ProveedorForm(forms.ModelForm):
+class ProveedorForm(NombreUnicoFormMixin, forms.ModelForm):
     class Meta:
         model = Proveedor
         fields = ['nombre', 'email', 'telefono']
@@ -66,7 +140,7 @@ class ProveedorForm(forms.ModelForm):
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
-        fields = ['nombre', 'descripcion', 'precio', 'stock']
+        fields = ['nombre', 'sku', 'descripcion', 'precio', 'stock']
 
     def clean_nombre(self):
         return self.cleaned_data.get('nombre', '').strip()
@@ -86,28 +160,42 @@ class ProductoForm(forms.ModelForm):
 # ---------------------------------------------------------
 # 📦 FORMULARIO DE COMPRA
 # ---------------------------------------------------------
-class CompraForm(forms.ModelForm):
+class CompraForm(OcultarArchivadosMixin, forms.ModelForm):
+    campos_archivables = ('proveedor',)
+
     class Meta:
         model = Compra
         fields = ['proveedor']
+        widgets = {'proveedor': SelectAutocompletar('proveedores', attrs={'class': 'form-select'})}
+
+class DetalleCompraForm(OcultarArchivadosMixin, forms.ModelForm):
+    campos_archivables = ('producto',)
 
 DetalleCompraFormSet = inlineformset_factory(
-    Compra, DetalleCompra,
+    Compra, DetalleCompra, form=DetalleCompraForm, formset=LineasFormSet,
     fields=['producto', 'cantidad', 'precio_unitario'],
+    widgets={'producto': SelectAutocompletar('productos', attrs={'class': 'form-select'})},
     extra=1, can_delete=True
 )
 
 # ---------------------------------------------------------
 # 📤 FORMULARIO DE VENTA
 # ---------------------------------------------------------
-class VentaForm(forms.ModelForm):
+class VentaForm(OcultarArchivadosMixin, forms.ModelForm):
+    campos_archivables = ('cliente',)
+
     class Meta:
         model = Venta
         fields = ['cliente']
+        widgets = {'cliente': SelectAutocompletar('clientes', attrs={'class': 'form-select'})}
+
+class DetalleVentaForm(OcultarArchivadosMixin, forms.ModelForm):
+    campos_archivables = ('producto',)
 
 DetalleVentaFormSet = inlineformset_factory(
-    Venta, DetalleVenta,
+    Venta, DetalleVenta, form=DetalleVentaForm, formset=LineasFormSet,
     fields=['producto', 'cantidad', 'precio_unitario'],
+    widgets={'producto': SelectAutocompletar('productos', attrs={'class': 'form-select'})},
     extra=1, can_delete=True
 )
 
@@ -0,0 +1,47 @@
+# inventario/management/commands/_importar.py
+# Base común de importar_ventas e importar_compras (el "_" evita que Django lo tome por un comando)
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.servicios.importacion import FORMATOS_IMPORTACION, REGISTROS_POR_LOTE
+
+
+class ComandoImportar(BaseCommand):
+    importador = None  # importar_ventas / importar_compras
+    pedidos = ''       # "ventas" / "compras", para los mensajes
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help="Fichero NDJSON o CSV ('-' para leer de la entrada estándar)")
+        parser.add_argument('--formato', choices=FORMATOS_IMPORTACION,
+                            help='Por defecto se deduce de la extensión (.csv o cualquier otra = ndjson)')
+        parser.add_argument('--lote', type=int, default=REGISTROS_POR_LOTE,
+                            help='Pedidos guardados en cada transacción')
+        parser.add_argument('--max-errores', type=int, default=20,
+                            help='Errores que se muestran (el resto sólo se cuentan)')
+
+    def handle(self, *args, **options):
+        ruta = options['fichero']
+        formato = options['formato'] or ('csv' if ruta.lower().endswith('.csv') else 'ndjson')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        if ruta == '-':
+            resultado = type(self).importador(sys.stdin, formato, options['lote'])
+        else:
+            try:
+                fichero = open(ruta, encoding='utf-8-sig', errors='replace', newline='')
+            except OSError as exc:
+                raise CommandError(f"No se puede abrir {ruta}: {exc}")
+            with fichero:
+                resultado = type(self).importador(fichero, formato, options['lote'])
+
+        for error in resultado.errores[:options['max_errores']]:
+            self.stderr.write(f"Registro {error['registro']}: {error['errores']}")
+        lineas_por_segundo = resultado.lineas / resultado.segundos if resultado.segundos else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.pedidos.capitalize()} creadas: {resultado.creados} ({resultado.lineas} líneas, "
+            f"{resultado.segundos:.2f} s, {lineas_por_segundo:.0f} líneas/s). "
+            f"Registros con errores: {resultado.total_errores}"
+        ))
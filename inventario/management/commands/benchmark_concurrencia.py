@@ -0,0 +1,196 @@
+# inventario/management/commands/benchmark_concurrencia.py
+
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from inventario.models import Producto, Venta
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara las lecturas síncronas de la API servidas como WSGI (un hilo por "
+        "petición, con un número fijo de hilos) con las de /api/async/ servidas como "
+        "ASGI, con muchos clientes a la vez. Se ejecuta en el propio proceso, sin red: "
+        "mide el servidor de aplicación, no uvicorn ni gunicorn."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=500,
+                            help='Clientes concurrentes (por defecto: 500)')
+        parser.add_argument('--peticiones', type=int, default=4,
+                            help='Peticiones seguidas de cada cliente')
+        parser.add_argument('--hilos-wsgi', type=int, default=8,
+                            help='Hilos del servidor WSGI simulado (como gunicorn --threads)')
+        parser.add_argument('--usuario', help='Usuario con el que se autentican las peticiones')
+
+    def handle(self, *args, **options):
+        token = self._token(options['usuario'])
+        rutas = self._rutas()
+        clientes, peticiones = options['clientes'], options['peticiones']
+
+        self.stdout.write(
+            f"{clientes} clientes x {peticiones} peticiones; "
+            f"WSGI con {options['hilos_wsgi']} hilos, ASGI con ASYNC_MAX_CONSULTAS="
+            f"{getattr(settings, 'ASYNC_MAX_CONSULTAS', '-')}"
+        )
+        self.stdout.write(
+            f"{'servidor':<10}{'pet/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+            f"{'errores':>10}{'hilos máx':>11}"
+        )
+        for nombre, indice, servidor in (
+            ('WSGI', 0, lambda: _ServidorWSGI(options['hilos_wsgi'])),
+            ('ASGI', 1, _ServidorASGI),
+        ):
+            caminos = [par[indice] for par in rutas]
+            resultado = asyncio.run(_carga(servidor(), caminos, token, clientes, peticiones))
+            connections.close_all()
+            self._informe(nombre, *resultado)
+
+    def _token(self, username):
+        usuarios = User.objects.filter(is_active=True)
+        user = usuarios.filter(username=username).first() if username else usuarios.order_by('id').first()
+        if user is None:
+            raise CommandError("No hay ningún usuario activo con el que autenticar las peticiones")
+        return str(RefreshToken.for_user(user).access_token)
+
+    def _rutas(self):
+        # Pares (ruta síncrona, ruta async) con la misma respuesta
+        productos = list(Producto.objects.order_by('-id').values_list('id', flat=True)[:50])
+        ventas = list(Venta.objects.order_by('-id').values_list('id', flat=True)[:50])
+        if not productos or not ventas:
+            raise CommandError("Hacen falta productos y ventas en la base de datos para la prueba")
+        rutas = [(reverse('api-producto-list-create'), reverse('api-async-producto-list'))]
+        rutas += [
+            (reverse('api-producto-detail', args=[pk]), reverse('api-async-producto-detail', args=[pk]))
+            for pk in productos
+        ]
+        rutas += [
+            (reverse('api-venta-detail', args=[pk]), reverse('api-async-venta-detail', args=[pk]))
+            for pk in ventas
+        ]
+        return rutas
+
+    def _informe(self, nombre, duracion, latencias, errores, hilos):
+        if len(latencias) > 1:
+            cortes = statistics.quantiles(latencias, n=100)
+            p50, p95, p99 = cortes[49], cortes[94], cortes[98]
+        else:
+            p50 = p95 = p99 = latencias[0] if latencias else 0
+        self.stdout.write(
+            f"{nombre:<10}{len(latencias) / duracion:>10.0f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}"
+            f"{errores:>10}{hilos:>11}"
+        )
+
+
+# -------------------------------------------------------------------
+# 🏋️ Carga: N clientes, cada uno con sus peticiones una tras otra
+# -------------------------------------------------------------------
+async def _carga(servidor, caminos, token, clientes, peticiones):
+    """(segundos, [latencias en ms], errores, máximo de hilos vivos)."""
+    latencias, errores, hilos = [], 0, threading.active_count()
+    cabeceras = [(b'authorization', f'Bearer {token}'.encode()), (b'host', b'localhost')]
+
+    async def cliente(n):
+        nonlocal errores
+        for i in range(peticiones):
+            camino = caminos[(n * peticiones + i) % len(caminos)]
+            inicio = time.perf_counter()
+            try:
+                estado = await servidor.get(camino, cabeceras)
+            except Exception:
+                estado = 500
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            errores += estado >= 400
+
+    async def vigilar_hilos():
+        nonlocal hilos
+        while True:
+            hilos = max(hilos, threading.active_count())
+            await asyncio.sleep(0.01)
+
+    vigilancia = asyncio.create_task(vigilar_hilos())
+    inicio = time.perf_counter()
+    await asyncio.gather(*(cliente(n) for n in range(clientes)))
+    duracion = time.perf_counter() - inicio
+    vigilancia.cancel()
+    servidor.cerrar()
+    return duracion, latencias, errores, hilos
+
+
+class _ServidorWSGI:
+    """WSGIHandler en un pool de hilos fijo: las peticiones de más esperan turno."""
+
+    def __init__(self, hilos):
+        self.handler = WSGIHandler()
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='wsgi')
+
+    async def get(self, camino, cabeceras):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, self._atender, camino, cabeceras)
+
+    def _atender(self, camino, cabeceras):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': camino, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        for nombre, valor in cabeceras:
+            environ['HTTP_' + nombre.decode().upper().replace('-', '_')] = valor.decode()
+        estado = []
+        respuesta = self.handler(environ, lambda status, headers, exc_info=None: estado.append(status))
+        try:
+            b''.join(respuesta)
+        finally:
+            respuesta.close()
+        return int(estado[0].split()[0])
+
+    def cerrar(self):
+        # Cada hilo cierra su conexión a la base de datos antes de terminar
+        for futuro in [self.pool.submit(connections.close_all) for _ in range(self.pool._max_workers)]:
+            futuro.result()
+        self.pool.shutdown()
+
+
+class _ServidorASGI:
+    """ASGIHandler llamado directamente, como lo haría uvicorn con cada conexión."""
+
+    def __init__(self):
+        self.handler = ASGIHandler()
+
+    async def get(self, camino, cabeceras):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': camino, 'raw_path': camino.encode(), 'query_string': b'',
+            'root_path': '', 'headers': cabeceras, 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        cuerpo_enviado, estado = False, []
+
+        async def receive():
+            nonlocal cuerpo_enviado
+            if not cuerpo_enviado:
+                cuerpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # El cliente no se desconecta: Django cancela esta espera al terminar
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado.append(mensaje['status'])
+
+        await self.handler(scope, receive, send)
+        return estado[0]
+
+    def cerrar(self):
+        pass
@@ -0,0 +1,70 @@
+# inventario/management/commands/benchmark_pedidos.py
+
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from inventario.models import Cliente, Proveedor, Producto
+from inventario.serializers import CompraSerializer, VentaSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el alta de compras/ventas línea a línea (señales) con la escritura "
+        "en bloque (bulk_create). Todo se hace en una transacción que se deshace al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tamanos', nargs='+', type=int, default=[10, 100, 1000],
+                            help='Número de líneas por pedido (por defecto: 10 100 1000)')
+        parser.add_argument('--productos', type=int, default=50,
+                            help='Productos distintos entre los que se reparten las líneas')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._ejecutar(options['tamanos'], options['productos'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _ejecutar(self, tamanos, n_productos):
+        proveedor = Proveedor.objects.create(nombre='Proveedor benchmark')
+        cliente = Cliente.objects.create(nombre='Cliente benchmark', email='benchmark@example.com')
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto benchmark {i}', precio=Decimal('1.00'), stock=10 ** 9)
+            for i in range(n_productos)
+        ])
+
+        self.stdout.write(f"{'pedido':<8}{'líneas':>8}{'modo':>12}{'consultas':>12}{'ms':>10}")
+        for tamano in tamanos:
+            detalles = [
+                {'producto': productos[i % n_productos].id, 'cantidad': 1, 'precio_unitario': '1.00'}
+                for i in range(tamano)
+            ]
+            for serializer_class, cabecera in ((CompraSerializer, {'proveedor': proveedor.id}),
+                                               (VentaSerializer, {'cliente': cliente.id})):
+                for en_bloque in (False, True):
+                    consultas, ms = self._medir(serializer_class, cabecera, detalles, tamano, en_bloque)
+                    self.stdout.write(
+                        f"{serializer_class.Meta.model.__name__:<8}{tamano:>8}"
+                        f"{'bloque' if en_bloque else 'fila':>12}{consultas:>12}{ms:>10.1f}"
+                    )
+
+    def _medir(self, serializer_class, cabecera, detalles, tamano, en_bloque):
+        data = dict(cabecera, total=f'{tamano}.00', detalles=detalles)
+        serializer = serializer_class(data=data)
+        serializer.escritura_en_bloque = en_bloque
+        with CaptureQueriesContext(connection) as ctx:
+            inicio = time.perf_counter()
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            ms = (time.perf_counter() - inicio) * 1000
+        return len(ctx.captured_queries), ms
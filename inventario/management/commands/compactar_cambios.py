@@ -0,0 +1,20 @@
+# inventario/management/commands/compactar_cambios.py
+
+from django.core.management.base import BaseCommand
+
+from inventario.servicios.cambios import DIAS_RETENCION_BAJAS, compactar_cambios
+
+
+class Command(BaseCommand):
+    help = (
+        "Compacta el registro de /api/cambios/: deja la última fila de cada objeto "
+        "y purga las bajas antiguas (pensado para ejecutarse con cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=DIAS_RETENCION_BAJAS,
+                            help='Días que se conservan las bajas')
+
+    def handle(self, *args, **options):
+        borrados = compactar_cambios(dias=options['dias'])
+        self.stdout.write(self.style.SUCCESS(f"Filas del registro de cambios borradas: {borrados}"))
@@ -0,0 +1,62 @@
+# inventario/management/commands/importar_catalogo.py
+
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.servicios.catalogo import FILAS_POR_LOTE, sincronizar_catalogo
+
+
+def _leer(fichero, formato):
+    """Genera una fila (dict) por producto; las líneas NDJSON no válidas llegan como texto y se rechazan."""
+    if formato == 'csv':
+        yield from csv.DictReader(fichero)
+        return
+    for linea in fichero:
+        if not linea.strip():
+            continue
+        try:
+            yield json.loads(linea)
+        except ValueError:
+            yield linea.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Da de alta o actualiza por SKU los productos de un fichero CSV o NDJSON "
+        "(columnas sku, nombre, precio y, opcionalmente, descripcion y stock)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichero', help="Fichero NDJSON o CSV ('-' para leer de la entrada estándar)")
+        parser.add_argument('--formato', choices=('ndjson', 'csv'),
+                            help='Por defecto se deduce de la extensión (.csv o cualquier otra = ndjson)')
+        parser.add_argument('--lote', type=int, default=FILAS_POR_LOTE,
+                            help='Filas guardadas en cada transacción')
+        parser.add_argument('--max-errores', type=int, default=20,
+                            help='Errores que se muestran (el resto sólo se cuentan)')
+
+    def handle(self, *args, **options):
+        ruta = options['fichero']
+        formato = options['formato'] or ('csv' if ruta.lower().endswith('.csv') else 'ndjson')
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que 0')
+
+        if ruta == '-':
+            resultado = sincronizar_catalogo(_leer(sys.stdin, formato), options['lote'])
+        else:
+            try:
+                fichero = open(ruta, encoding='utf-8-sig', errors='replace', newline='')
+            except OSError as exc:
+                raise CommandError(f"No se puede abrir {ruta}: {exc}")
+            with fichero:
+                resultado = sincronizar_catalogo(_leer(fichero, formato), options['lote'])
+
+        for error in resultado.errores[:options['max_errores']]:
+            self.stderr.write(f"Fila {error['fila']}: {error['errores']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Productos insertados: {resultado.insertados}, actualizados: {resultado.actualizados}. "
+            f"Filas rechazadas: {resultado.rechazados}"
+        ))
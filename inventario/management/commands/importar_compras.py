@@ -0,0 +1,14 @@
+# inventario/management/commands/importar_compras.py
+
+from inventario.servicios.importacion import importar_compras
+
+from ._importar import ComandoImportar
+
+
+class Command(ComandoImportar):
+    help = (
+        "Da de alta en bloque las compras de un fichero NDJSON (una compra por línea) "
+        "o CSV (una línea de compra por fila). Los registros con errores se saltan."
+    )
+    importador = importar_compras
+    pedidos = 'compras'
@@ -0,0 +1,14 @@
+# inventario/management/commands/importar_ventas.py
+
+from inventario.servicios.importacion import importar_ventas
+
+from ._importar import ComandoImportar
+
+
+class Command(ComandoImportar):
+    help = (
+        "Da de alta en bloque las ventas de un fichero NDJSON (una venta por línea) "
+        "o CSV (una línea de venta por fila). Los registros con errores se saltan."
+    )
+    importador = importar_ventas
+    pedidos = 'ventas'
@@ -0,0 +1,17 @@
+# inventario/management/commands/liberar_reservas.py
+
+from django.core.management.base import BaseCommand
+
+from inventario.servicios.reservas import TAMANO_LOTE, liberar_caducadas
+
+
+class Command(BaseCommand):
+    help = "Libera por lotes las reservas de stock caducadas (pensado para ejecutarse con cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Reservas borradas por transacción')
+
+    def handle(self, *args, **options):
+        liberadas = liberar_caducadas(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f"Reservas caducadas liberadas: {liberadas}"))
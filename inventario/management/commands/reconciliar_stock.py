@@ -0,0 +1,48 @@
+# inventario/management/commands/reconciliar_stock.py
+
+from django.core.management.base import BaseCommand
+
+from inventario.servicios.reconciliacion import TAMANO_LOTE, buscar_discrepancias, corregir_discrepancias
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el stock de cada producto con el que implican el stock inicial, "
+        "las compras y las ventas. Con --corregir deja el valor esperado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corregir', action='store_true',
+                            help='Actualiza el stock de los productos descuadrados')
+        parser.add_argument('--incluir-sin-inicial', action='store_true',
+                            help='Corrige también productos anteriores al histórico (se asume stock inicial 0)')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Productos revisados por consulta')
+
+    def handle(self, *args, **options):
+        encontradas = corregidas = omitidas = 0
+        for discrepancias in buscar_discrepancias(lote=options['lote']):
+            for d in discrepancias:
+                aviso = ''
+                if not d.corregible:
+                    aviso = '  (no corregible: quedaría negativo o por debajo de lo reservado)'
+                elif not d.con_inicial:
+                    aviso = '  (sin stock inicial en el histórico)'
+                self.stdout.write(
+                    f"#{d.producto_id} {d.nombre}: stock {d.actual}, esperado {d.esperado} "
+                    f"({d.diferencia:+d}){aviso}"
+                )
+            encontradas += len(discrepancias)
+            if options['corregir']:
+                corregidos, cambiadas = corregir_discrepancias(discrepancias, options['incluir_sin_inicial'])
+                corregidas += corregidos
+                for d in cambiadas:
+                    self.stdout.write(f"#{d.producto_id} {d.nombre}: su stock ha cambiado durante la revisión, no se corrige")
+                omitidas += len(cambiadas)
+
+        resumen = f"Productos descuadrados: {encontradas}"
+        if options['corregir']:
+            resumen += f". Corregidos: {corregidas}"
+            if omitidas:
+                resumen += f". Cambiados durante la revisión (vuelve a ejecutarlo): {omitidas}"
+        self.stdout.write(self.style.SUCCESS(resumen))
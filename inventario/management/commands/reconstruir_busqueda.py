@@ -0,0 +1,28 @@
+# inventario/management/commands/reconstruir_busqueda.py
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.servicios.busqueda import busqueda_disponible, reconstruir_indice_productos
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenera en bloque el índice de texto completo (FTS5) de productos. "
+        "Útil tras restaurar una copia o cargar productos fuera de Django."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sin-optimizar', action='store_true',
+                            help="No fusionar los segmentos del índice al terminar")
+
+    def handle(self, *args, **options):
+        if not busqueda_disponible():
+            self.stdout.write("La búsqueda de texto completo sólo está disponible con SQLite.")
+            return
+        inicio = time.perf_counter()
+        total = reconstruir_indice_productos(optimizar=not options['sin_optimizar'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice de búsqueda reconstruido: {total} productos en {time.perf_counter() - inicio:.2f} s"
+        ))
@@ -0,0 +1,56 @@
+# inventario/management/commands/slow_queries.py
+
+from django.core.management.base import BaseCommand
+
+from inventario.consultas_lentas import fichero_log, leer_registros
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume el log de consultas lentas agrupando por forma de la SQL "
+        "(literales y listas IN normalizados): las peores primero, con su plan."
+    )
+
+    ORDENES = {
+        'total': lambda g: g['total_ms'],
+        'max': lambda g: g['max_ms'],
+        'veces': lambda g: g['veces'],
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='Número de formas a mostrar')
+        parser.add_argument('--orden', choices=sorted(self.ORDENES), default='total',
+                            help='Criterio: tiempo total acumulado, peor ejecución o número de veces')
+        parser.add_argument('--fichero', help=f'Log a leer (por defecto {fichero_log()})')
+
+    def handle(self, *args, **options):
+        grupos = {}
+        for registro in leer_registros(options['fichero']):
+            grupo = grupos.setdefault(registro['forma'], {
+                'veces': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'peor': None, 'vistas': set(),
+            })
+            grupo['veces'] += 1
+            grupo['total_ms'] += registro['ms']
+            if registro.get('vista'):
+                grupo['vistas'].add(registro['vista'])
+            if registro['ms'] >= grupo['max_ms']:
+                grupo['max_ms'], grupo['peor'] = registro['ms'], registro
+
+        if not grupos:
+            self.stdout.write("No hay consultas lentas registradas.")
+            return
+
+        peores = sorted(grupos.items(), key=lambda item: self.ORDENES[options['orden']](item[1]), reverse=True)
+        for posicion, (forma, grupo) in enumerate(peores[:options['top']], start=1):
+            self.stdout.write(self.style.WARNING(
+                f"#{posicion}  {grupo['veces']} veces, total {grupo['total_ms']:.0f} ms, "
+                f"media {grupo['total_ms'] / grupo['veces']:.1f} ms, peor {grupo['max_ms']:.1f} ms"
+            ))
+            self.stdout.write(f"    {forma}")
+            for vista in sorted(grupo['vistas']):
+                self.stdout.write(f"    vista: {vista}")
+            for paso in grupo['peor'].get('plan') or []:
+                self.stdout.write(f"    plan:  {paso}")
+            for marco in grupo['peor'].get('pila') or []:
+                self.stdout.write(f"    pila:  {marco}")
+        self.stdout.write(f"Formas distintas: {len(grupos)}")
@@ -0,0 +1,16 @@
+# inventario/management/commands/snapshot_stock.py
+
+from django.core.management.base import BaseCommand
+
+from inventario.servicios.historico import crear_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Guarda una foto del stock de todos los productos. Ejecutarlo periódicamente "
+        "(p. ej. cada noche) mantiene constante el coste de las consultas de stock en una fecha."
+    )
+
+    def handle(self, *args, **options):
+        creadas = crear_snapshots()
+        self.stdout.write(self.style.SUCCESS(f"Fotos de stock creadas: {creadas}"))
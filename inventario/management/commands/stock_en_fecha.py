@@ -0,0 +1,26 @@
+# inventario/management/commands/stock_en_fecha.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.models import Producto
+from inventario.servicios.historico import interpretar_fecha, productos_con_stock_en_fecha
+
+
+class Command(BaseCommand):
+    help = "Muestra el stock de uno o todos los productos en una fecha (AAAA-MM-DD o ISO 8601)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('fecha')
+        parser.add_argument('--producto', type=int, help='Id del producto (por defecto, todos)')
+
+    def handle(self, *args, **options):
+        fecha = interpretar_fecha(options['fecha'])
+        if fecha is None:
+            raise CommandError("Fecha no válida: usa AAAA-MM-DD o ISO 8601")
+
+        productos = Producto.objects.order_by('id')
+        if options['producto']:
+            productos = productos.filter(pk=options['producto'])
+        filas = productos_con_stock_en_fecha(fecha, productos).values_list('id', 'nombre', 'stock_en_fecha')
+        for producto_id, nombre, stock in filas.iterator(chunk_size=2000):
+            self.stdout.write(f"{producto_id}\t{nombre}\t{stock}")
@@ -0,0 +1,96 @@
+# inventario/middleware.py
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .consultas_lentas import vista_actual
+from .perfilado import medir_peticion, muestrear, registro
+
+
+# -------------------------------------------------------------------
+# ⏱️ Perfilado de peticiones: Server-Timing + histogramas por ruta
+# -------------------------------------------------------------------
+class PerfiladoMiddleware:
+    """
+    En las peticiones muestreadas (settings.PERFILADO_MUESTREO) mide el tiempo
+    total, el de base de datos y número de consultas, el de serializadores y
+    el de señales. Lo devuelve en la cabecera Server-Timing y lo acumula en
+    los histogramas por ruta que sirve /api/_metrics/. Las no muestreadas
+    pasan sin instrumentar. Funciona igual bajo WSGI y ASGI: con ASGI no
+    obliga a Django a ejecutar las vistas async dentro de un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self._acall(request)
+        if not muestrear():
+            return self.get_response(request)
+
+        with medir_peticion() as medicion:
+            response = self.get_response(request)
+        return self._registrar(request, response, medicion)
+
+    async def _acall(self, request):
+        if not muestrear():
+            return await self.get_response(request)
+
+        with medir_peticion() as medicion:
+            response = await self.get_response(request)
+        return self._registrar(request, response, medicion)
+
+    def _registrar(self, request, response, medicion):
+        total = time.perf_counter() - medicion.inicio
+
+        response['Server-Timing'] = medicion.cabecera_server_timing(total)
+        # Plantilla de la URL (api/ventas/<int:pk>/), no la ruta concreta: cardinalidad acotada
+        match = getattr(request, 'resolver_match', None)
+        ruta = match.route if match else '<sin_ruta>'
+        registro.registrar(ruta, request.method, response.status_code, total, medicion)
+        return response
+
+
+# -------------------------------------------------------------------
+# 🐢 Vista en curso para el registro de consultas lentas
+# -------------------------------------------------------------------
+class ConsultasLentasMiddleware:
+    """
+    Anota qué vista atiende la petición para que cada consulta lenta del
+    log (inventario.consultas_lentas) indique de dónde vino.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.es_async:
+            return self._acall(request)
+        token = vista_actual.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            vista_actual.reset(token)
+
+    async def _acall(self, request):
+        token = vista_actual.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            vista_actual.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        vista_actual.set(f'{request.method} /{match.route} ({match.view_name or view_func.__name__})')
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def snapshot_inicial(apps, schema_editor):
+    # El histórico empieza aquí: guardamos el stock actual de cada producto
+    # como foto de partida para las consultas de stock en una fecha
+    Producto = apps.get_model('inventario', 'Producto')
+    SnapshotStock = apps.get_model('inventario', 'SnapshotStock')
+    ahora = django.utils.timezone.now()
+    lote = []
+    for producto_id, stock in Producto.objects.values_list('id', 'stock').iterator(chunk_size=2000):
+        lote.append(SnapshotStock(producto_id=producto_id, fecha=ahora, stock=stock))
+        if len(lote) >= 2000:
+            SnapshotStock.objects.bulk_create(lote)
+            lote = []
+    SnapshotStock.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_reservas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.IntegerField()),
+                ('origen', models.CharField(choices=[('inicial', 'Stock inicial'), ('compra', 'Compra'), ('venta', 'Venta'), ('ajuste', 'Ajuste manual')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventario.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='snapshot_producto_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_inicial, migrations.RunPython.noop),
+    ]
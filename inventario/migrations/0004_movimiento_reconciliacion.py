@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_historico_stock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movimientostock',
+            name='origen',
+            field=models.CharField(choices=[('inicial', 'Stock inicial'), ('compra', 'Compra'), ('venta', 'Venta'), ('ajuste', 'Ajuste manual'), ('reconciliacion', 'Corrección por reconciliación')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_movimiento_reconciliacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='archivado',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='archivado',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='archivado',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_indices_fecha_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='compra',
+            name='proveedor',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='inventario.proveedor'),
+        ),
+        migrations.AlterField(
+            model_name='detallecompra',
+            name='producto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='inventario.producto'),
+        ),
+        migrations.AlterField(
+            model_name='detalleventa',
+            name='producto',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='inventario.producto'),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='cliente',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ventas', to='inventario.cliente'),
+        ),
+        migrations.AddIndex(
+            model_name='compra',
+            index=models.Index(fields=['proveedor', 'fecha'], name='compra_proveedor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detallecompra',
+            index=models.Index(fields=['producto', 'compra'], name='detcompra_producto_compra_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='detalleventa',
+            index=models.Index(fields=['producto', 'venta'], name='detventa_producto_venta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['cliente', 'fecha'], name='venta_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Índice de texto completo (SQLite FTS5) sobre el nombre y la descripción de los productos
+
+from django.db import migrations
+
+TABLA = 'inventario_producto_fts'
+
+# SQLite borra los triggers al rehacer inventario_producto (lo hace al añadir
+# columnas): las migraciones que toquen la tabla deben volver a crearlos
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_ai AFTER INSERT ON inventario_producto BEGIN
+        INSERT INTO {TABLA}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_ad AFTER DELETE ON inventario_producto BEGIN
+        INSERT INTO {TABLA}({TABLA}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    # Sólo cuando cambian los textos: los UPDATE de stock/reservado no tocan el índice
+    f"""
+    CREATE TRIGGER IF NOT EXISTS inventario_producto_fts_au AFTER UPDATE OF nombre, descripcion ON inventario_producto BEGIN
+        INSERT INTO {TABLA}({TABLA}, rowid, nombre, descripcion) VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO {TABLA}(rowid, nombre, descripcion) VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+]
+
+CREAR = [
+    # Tabla de contenido externo: no duplica los textos, sólo guarda el índice.
+    # remove_diacritics 2 hace que "toner" encuentre "tóner"; prefix acelera los "xx*"
+    f"""
+    CREATE VIRTUAL TABLE {TABLA} USING fts5(
+        nombre, descripcion,
+        content='inventario_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+    """,
+    *TRIGGERS,
+    f"INSERT INTO {TABLA}({TABLA}) VALUES ('rebuild')",
+]
+
+BORRAR = [
+    "DROP TRIGGER IF EXISTS inventario_producto_fts_au",
+    "DROP TRIGGER IF EXISTS inventario_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS inventario_producto_fts_ai",
+    f"DROP TABLE IF EXISTS {TABLA}",
+]
+
+
+def _ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        # FTS5 es propio de SQLite: en otros motores la búsqueda usa icontains
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in sentencias:
+            schema_editor.execute(sql)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.RunPython(_ejecutar(CREAR), _ejecutar(BORRAR)),
+    ]
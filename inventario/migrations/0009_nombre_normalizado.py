@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:19
+
+import importlib
+import unicodedata
+
+from django.db import migrations, models
+
+busqueda = importlib.import_module('inventario.migrations.0008_busqueda_productos')
+
+
+def _normalizar(texto):
+    # Copia de models.normalizar_nombre: la migración no debe cambiar si el modelo cambia
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
+
+
+def rellenar_nombres(apps, schema_editor):
+    # Por lotes de 2000 filas para no cargar tablas enteras en memoria
+    for modelo in ('Producto', 'Cliente', 'Proveedor'):
+        Modelo = apps.get_model('inventario', modelo)
+        lote = []
+        for pk, nombre in Modelo.objects.values_list('id', 'nombre').iterator(chunk_size=2000):
+            lote.append(Modelo(pk=pk, nombre_normalizado=_normalizar(nombre)))
+            if len(lote) >= 2000:
+                Modelo.objects.bulk_update(lote, ['nombre_normalizado'])
+                lote = []
+        Modelo.objects.bulk_update(lote, ['nombre_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_busqueda_productos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='nombre_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='nombre_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='nombre_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(rellenar_nombres, migrations.RunPython.noop),
+        # Añadir la columna rehace inventario_producto y se lleva los triggers de FTS5
+        migrations.RunPython(busqueda._ejecutar(busqueda.TRIGGERS), migrations.RunPython.noop),
+    ]
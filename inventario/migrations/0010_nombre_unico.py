@@ -0,0 +1,61 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:24
+
+import importlib
+
+from django.db import migrations, models
+from django.db.models import Count
+
+nombres = importlib.import_module('inventario.migrations.0009_nombre_normalizado')
+
+TAMANO_LOTE = 2000
+
+
+def desduplicar(apps, schema_editor):
+    """
+    Antes de crear el índice único: se vuelve a normalizar por lotes (puede
+    haber filas creadas con bulk_create sin el campo) y, si dos clientes o
+    proveedores ya tenían el mismo nombre normalizado, el más antiguo conserva
+    la clave y a los demás se les añade " #<id>". El nombre visible no cambia.
+    """
+    for modelo in ('Cliente', 'Proveedor'):
+        Modelo = apps.get_model('inventario', modelo)
+        lote = []
+        for pk, nombre in Modelo.objects.values_list('id', 'nombre').iterator(chunk_size=TAMANO_LOTE):
+            lote.append(Modelo(pk=pk, nombre_normalizado=nombres._normalizar(nombre)))
+            if len(lote) >= TAMANO_LOTE:
+                Modelo.objects.bulk_update(lote, ['nombre_normalizado'])
+                lote = []
+        Modelo.objects.bulk_update(lote, ['nombre_normalizado'])
+
+        repetidos = (
+            Modelo.objects.values('nombre_normalizado')
+            .annotate(veces=Count('id')).filter(veces__gt=1)
+            .values_list('nombre_normalizado', flat=True)
+        )
+        for clave in list(repetidos):
+            filas = list(Modelo.objects.filter(nombre_normalizado=clave).order_by('id')[1:])
+            for fila in filas:
+                sufijo = f' #{fila.pk}'
+                fila.nombre_normalizado = clave[:100 - len(sufijo)] + sufijo
+            Modelo.objects.bulk_update(filas, ['nombre_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_nombre_normalizado'),
+    ]
+
+    operations = [
+        migrations.RunPython(desduplicar, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cliente',
+            name='nombre_normalizado',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='proveedor',
+            name='nombre_normalizado',
+            field=models.CharField(editable=False, max_length=100, unique=True),
+        ),
+    ]
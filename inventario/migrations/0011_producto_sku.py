@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:35
+
+import importlib
+
+from django.db import migrations, models
+
+busqueda = importlib.import_module('inventario.migrations.0008_busqueda_productos')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_nombre_unico'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='sku',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='SKU'),
+        ),
+        # Añadir la columna rehace inventario_producto y se lleva los triggers de FTS5
+        migrations.RunPython(busqueda._ejecutar(busqueda.TRIGGERS), migrations.RunPython.noop),
+    ]
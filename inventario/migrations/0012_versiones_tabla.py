@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+# Una fila por modelo versionado (servicios.versiones crea las que falten)
+MODELOS = [
+    'inventario.Producto', 'inventario.Cliente', 'inventario.Proveedor',
+    'inventario.Compra', 'inventario.DetalleCompra', 'inventario.Venta', 'inventario.DetalleVenta',
+]
+
+
+def crear_versiones(apps, schema_editor):
+    VersionTabla = apps.get_model('inventario', 'VersionTabla')
+    VersionTabla.objects.bulk_create([VersionTabla(modelo=modelo) for modelo in MODELOS], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_producto_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionTabla',
+            fields=[
+                ('modelo', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('modificado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(crear_versiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+RECURSOS = [
+    ('productos', 'Producto'), ('clientes', 'Cliente'), ('proveedores', 'Proveedor'),
+    ('ventas', 'Venta'), ('compras', 'Compra'),
+]
+
+
+def registrar_existentes(apps, schema_editor):
+    """
+    Un alta por cada fila que ya existe, con un INSERT ... SELECT por tabla:
+    así un cliente nuevo puede hacer la carga inicial desde el propio registro.
+    """
+    Cambio = apps.get_model('inventario', 'Cambio')
+    tabla = schema_editor.quote_name(Cambio._meta.db_table)
+    ahora = schema_editor.connection.ops.adapt_datetimefield_value(django.utils.timezone.now())
+    for recurso, modelo in RECURSOS:
+        origen = schema_editor.quote_name(apps.get_model('inventario', modelo)._meta.db_table)
+        schema_editor.execute(
+            f"INSERT INTO {tabla} (recurso, objeto_id, operacion, fecha) "
+            f"SELECT %s, id, 'alta', %s FROM {origen} ORDER BY id",
+            [recurso, ahora],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_versiones_tabla'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompactacionCambios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('horizonte', models.BigIntegerField(default=0)),
+                ('borrados', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('operacion', models.CharField(choices=[('alta', 'Alta'), ('modificacion', 'Modificación'), ('baja', 'Baja')], max_length=12)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recurso', 'objeto_id', 'id'], name='cambio_objeto_idx'), models.Index(fields=['fecha'], name='cambio_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(registrar_existentes, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,148 @@
+import unicodedata
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
+
+
+# -------------------------------
+# MIXIN PARA LÍNEAS QUE MUEVEN STOCK
+# -------------------------------
+class LineaStockMixin:
+    """
+    Recuerda el (producto_id, cantidad) con el que la línea se leyó de la BD,
+    para que las señales muevan sólo la diferencia al editarla.
+    """
+    stock_original = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stock_original = (instance.__dict__.get('producto_id'), instance.__dict__.get('cantidad'))
+        return instance
+
+    def recordar_stock(self):
+        self.stock_original = (self.producto_id, self.cantidad)
+
+# -------------------------------
+# NOMBRE NORMALIZADO PARA BÚSQUEDAS POR PREFIJO
+# -------------------------------
+def normalizar_nombre(texto):
+    """Minúsculas, sin tildes y con espacios simples: ' Papelería  Pérez' → 'papeleria perez'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.casefold().split())
+
+
+class NombreNormalizadoMixin:
+    """
+    Mantiene `nombre_normalizado` (indexado) a partir de `nombre` al guardar,
+    para autocompletar por prefijo con un rango sobre el índice. Sólo se
+    recalcula si el nombre cambia de clave respecto al leído de la BD: las
+    claves con sufijo " #<id>" de la migración 0010 se conservan al editar
+    otros campos. Quien cree filas con bulk_create debe rellenarlo con
+    normalizar_nombre().
+    """
+    nombre_original = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.nombre_original = instance.__dict__.get('nombre')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using, fields, **kwargs)
+        if (fields is None or 'nombre' in fields) and 'nombre' in self.__dict__:
+            self.nombre_original = self.nombre
+
+    def nombre_cambia_clave(self, nombre=None):
+        """True si `nombre` (por defecto el actual) da otra clave que el nombre leído de la BD."""
+        if self._state.adding:
+            return True
+        nombre = self.nombre if nombre is None else nombre
+        return normalizar_nombre(nombre) != normalizar_nombre(self.nombre_original)
+
+    def save(self, *args, **kwargs):
+        # Con 'nombre' diferido y sin asignar no hay nada que recalcular
+        if 'nombre' in self.__dict__ and (
+            self.nombre_cambia_clave() or self.__dict__.get('nombre_normalizado') == ''
+        ):
+            self.nombre_normalizado = normalizar_nombre(self.nombre)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'nombre' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'nombre_normalizado'}
+        super().save(*args, **kwargs)
+        if 'nombre' in self.__dict__:
+            self.nombre_original = self.nombre
+
+
+class NombreUnicoMixin(NombreNormalizadoMixin):
+    """
+    Para modelos con `nombre_normalizado` único: "Pérez" y " perez " son el
+    mismo nombre. La comprobación previa es una búsqueda por el índice único;
+    quien guarde en paralelo debe capturar además el IntegrityError, que es
+    lo que de verdad impide el duplicado.
+    """
+    @classmethod
+    def nombre_en_uso(cls, nombre, excluir_pk=None):
+        return cls._default_manager.filter(
+            nombre_normalizado=normalizar_nombre(nombre)
+        ).exclude(pk=excluir_pk).exists()
+
+    def clean(self):
+        super().clean()
+        if self.nombre and self.nombre_cambia_clave() and self.nombre_en_uso(self.nombre, excluir_pk=self.pk):
+            raise ValidationError({'nombre': f"Ya existe un {self._meta.verbose_name} con este nombre."})
+
+
+# -------------------------------
+# QUERYSET PARA PEDIDOS (COMPRAS Y VENTAS)
+# -------------------------------
+class PedidoQuerySet(models.QuerySet):
+    """
+    con_detalles() trae la cabecera con su cliente/proveedor en un JOIN y todas
+    las líneas (con su producto) en una sola consulta extra, de modo que
+    listar N pedidos cuesta lo mismo tenga cada uno 1 o 100 líneas.
+    """
+    def con_detalles(self):
+        tercero = 'proveedor' if self.model is Compra else 'cliente'
+        lineas = self.model._meta.get_field('detalles').related_model
+        return self.select_related(tercero).prefetch_related(
+            models.Prefetch('detalles', queryset=lineas.objects.select_related('producto').order_by('id'))
+        )
+
 
 # -------------------------------
 # MODELO DE PRODUCTO
 # -------------------------------
-class Producto(models.Model):
+class Producto(NombreNormalizadoMixin, models.Model):
     nombre = models.CharField(max_length=100)  # Nombre del producto
+    nombre_normalizado = models.CharField(max_length=100, editable=False, db_index=True, default='')  # Para autocompletar
+    sku = models.CharField('SKU', max_length=50, unique=True, null=True, blank=True)  # Código del catálogo (opcional)
     descripcion = models.TextField(blank=True)  # Descripción (opcional)
     precio = models.DecimalField(max_digits=10, decimal_places=2)  # Precio por unidad
     stock = models.PositiveIntegerField(default=0)  # Cantidad disponible en stock
+    reservado = models.PositiveIntegerField(default=0, editable=False)  # Unidades retenidas por reservas vivas
+    archivado = models.BooleanField(default=False, db_index=True)  # Oculto en listados sin borrar su histórico
+
+    # Stock con el que se leyó de la BD, para anotar en el histórico los ajustes manuales
+    stock_leido = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.stock_leido = instance.__dict__.get('stock')
+        return instance
+
+    @property
+    def stock_disponible(self):
+        return self.stock - self.reservado
+
+    def save(self, *args, **kwargs):
+        self.sku = self.sku or None  # '' no es un código: sin SKU se guarda NULL y no choca con el índice único
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nombre
@@ -16,11 +151,13 @@ class Producto(models.Model):
 # -------------------------------
 # MODELO DE CLIENTE
 # -------------------------------
-class Cliente(models.Model):
+class Cliente(NombreUnicoMixin, models.Model):
     nombre = models.CharField(max_length=100)
+    nombre_normalizado = models.CharField(max_length=100, editable=False, unique=True)  # Sin duplicados y para autocompletar
     email = models.EmailField(max_length=100, unique=True)
     telefono = models.CharField(max_length=10, blank=True)
     direccion = models.TextField(blank=True)
+    archivado = models.BooleanField(default=False, db_index=True)  # Oculto en listados sin borrar sus ventas
 
     def __str__(self):
         return self.nombre
@@ -29,11 +166,13 @@ class Cliente(models.Model):
 # -------------------------------
 # MODELO DE PROVEEDOR
 # -------------------------------
-class Proveedor(models.Model):
+class Proveedor(NombreUnicoMixin, models.Model):
     nombre = models.CharField(max_length=100)
+    nombre_normalizado = models.CharField(max_length=100, editable=False, unique=True)  # Sin duplicados y para autocompletar
     contacto = models.CharField(max_length=100, blank=True)
     telefono = models.CharField(max_length=10, blank=True)
     email = models.EmailField(max_length=100, blank=True)
+    archivado = models.BooleanField(default=False, db_index=True)  # Oculto en listados sin borrar sus compras
 
     def __str__(self):
         return self.nombre
@@ -43,10 +182,21 @@ class Proveedor(models.Model):
 # MODELO DE COMPRA
 # -------------------------------
 class Compra(models.Model):
-    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE)
+    # Sin índice propio: lo cubre el prefijo de (proveedor, fecha) en Meta.indexes
+    proveedor = models.ForeignKey(Proveedor, on_delete=models.CASCADE, db_index=False)
     fecha = models.DateField(auto_now_add=True)
     total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
 
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listados y paginación por cursor ordenados por (fecha, id)
+            models.Index(fields=['fecha', 'id'], name='compra_fecha_id_idx'),
+            # Filtros por proveedor y rango de fechas (ver filters.py)
+            models.Index(fields=['proveedor', 'fecha'], name='compra_proveedor_fecha_idx'),
+        ]
+
     def actualizar_total(self):
         # Suma de subtotales de todos los detalles relacionados
         total = sum([dc.subtotal for dc in self.detalles.all()])
@@ -60,16 +210,23 @@ class Compra(models.Model):
 # -------------------------------
 # MODELO DE DETALLE DE COMPRA
 # -------------------------------
-class DetalleCompra(models.Model):
+class DetalleCompra(LineaStockMixin, models.Model):
     compra = models.ForeignKey(Compra, on_delete=models.CASCADE, related_name='detalles')
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)  # Cubierto por (producto, compra)
     cantidad = models.PositiveIntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
 
+    class Meta:
+        indexes = [
+            # "Líneas/compras con el producto X" (filtros y EXISTS de filters.py)
+            models.Index(fields=['producto', 'compra'], name='detcompra_producto_compra_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
         super().save(*args, **kwargs)
+        self.recordar_stock()
 
     def __str__(self):
         return f'{self.cantidad} x {self.producto.nombre}'
@@ -79,10 +236,21 @@ class DetalleCompra(models.Model):
 # MODELO DE VENTA
 # -------------------------------
 class Venta(models.Model):
-    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="ventas")
+    # Sin índice propio: lo cubre el prefijo de (cliente, fecha) en Meta.indexes
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="ventas", db_index=False)
     fecha = models.DateTimeField(auto_now_add=True)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    objects = PedidoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listados y paginación por cursor ordenados por (fecha, id)
+            models.Index(fields=['fecha', 'id'], name='venta_fecha_id_idx'),
+            # Filtros por cliente y rango de fechas (ver filters.py)
+            models.Index(fields=['cliente', 'fecha'], name='venta_cliente_fecha_idx'),
+        ]
+
     def actualizar_total(self):
         total = sum([dv.subtotal for dv in self.detalles.all()])
         self.total = total
@@ -95,16 +263,172 @@ class Venta(models.Model):
 # -------------------------------
 # MODELO DE DETALLE DE VENTA
 # -------------------------------
-class DetalleVenta(models.Model):
+class DetalleVenta(LineaStockMixin, models.Model):
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE, related_name="detalles")
-    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_index=False)  # Cubierto por (producto, venta)
     cantidad = models.PositiveIntegerField()
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, editable=False)
 
+    class Meta:
+        indexes = [
+            # "Líneas/ventas con el producto X" (filtros y EXISTS de filters.py)
+            models.Index(fields=['producto', 'venta'], name='detventa_producto_venta_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
         super().save(*args, **kwargs)
+        self.recordar_stock()
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre}"
+
+
+# -------------------------------
+# MODELO DE RESERVA DE STOCK
+# -------------------------------
+class Reserva(models.Model):
+    """
+    Retiene unidades de un producto durante un tiempo limitado mientras se
+    prepara una venta. El total retenido por producto se guarda en
+    Producto.reservado para consultar la disponibilidad sin sumar reservas.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="reservas")
+    cantidad = models.PositiveIntegerField()
+    # SET_NULL y no CASCADE: un borrado en cascada no pasaría por liberar() y
+    # Producto.reservado quedaría alto para siempre. Huérfana, la libera el barrido al caducar
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reserva #{self.id} - {self.cantidad} x producto #{self.producto_id}"
+
+
+# -------------------------------
+# MODELO DE MOVIMIENTO DE STOCK (HISTÓRICO)
+# -------------------------------
+class MovimientoStock(models.Model):
+    """
+    Registro de sólo inserción con cada variación del stock de un producto.
+    Junto con SnapshotStock permite saber el stock en cualquier fecha.
+    """
+    INICIAL = 'inicial'
+    COMPRA = 'compra'
+    VENTA = 'venta'
+    AJUSTE = 'ajuste'
+    RECONCILIACION = 'reconciliacion'
+    ORIGENES = [
+        (INICIAL, 'Stock inicial'),
+        (COMPRA, 'Compra'),
+        (VENTA, 'Venta'),
+        (AJUSTE, 'Ajuste manual'),
+        (RECONCILIACION, 'Corrección por reconciliación'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="movimientos")
+    cantidad = models.IntegerField()  # Positiva si entra stock, negativa si sale
+    origen = models.CharField(max_length=20, choices=ORIGENES)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'),
+            models.Index(fields=['fecha'], name='movimiento_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad:+d} x producto #{self.producto_id} ({self.origen})"
+
+
+# -------------------------------
+# MODELO DE FOTO PERIÓDICA DEL STOCK
+# -------------------------------
+class SnapshotStock(models.Model):
+    """
+    Stock de un producto en un instante. Las consultas históricas parten de
+    la foto más cercana y sólo suman los movimientos posteriores.
+    """
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="snapshots")
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['producto', 'fecha'], name='snapshot_producto_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"Producto #{self.producto_id}: {self.stock} el {self.fecha:%d/%m/%Y %H:%M}"
+
+
+# -------------------------------
+# MODELO DE VERSIÓN POR TABLA (ETag / Last-Modified)
+# -------------------------------
+class VersionTabla(models.Model):
+    """
+    Contador que sube con cada cambio en las filas de un modelo (ver
+    servicios.versiones). La API lo usa para responder 304 a un GET
+    condicional o 412 a una escritura con If-Match sin leer la tabla.
+    """
+    modelo = models.CharField(max_length=100, primary_key=True)  # Etiqueta, p. ej. 'inventario.Producto'
+    version = models.PositiveBigIntegerField(default=0)
+    modificado = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.modelo} v{self.version}"
+
+
+# -------------------------------
+# MODELO DE REGISTRO DE CAMBIOS (SINCRONIZACIÓN INCREMENTAL)
+# -------------------------------
+class Cambio(models.Model):
+    """
+    Una fila por alta, modificación o baja de un producto, cliente,
+    proveedor, venta o compra (ver servicios.cambios). El id, que nunca se
+    reutiliza, es el cursor de /api/cambios/: un cliente pide lo posterior
+    al último id que vio. compactar_cambios() deja sólo la última fila de
+    cada objeto y purga las bajas antiguas.
+    """
+    ALTA = 'alta'
+    MODIFICACION = 'modificacion'
+    BAJA = 'baja'
+    OPERACIONES = [
+        (ALTA, 'Alta'),
+        (MODIFICACION, 'Modificación'),
+        (BAJA, 'Baja'),
+    ]
+
+    recurso = models.CharField(max_length=20)  # 'productos', 'clientes', 'proveedores', 'ventas', 'compras'
+    objeto_id = models.BigIntegerField()
+    operacion = models.CharField(max_length=12, choices=OPERACIONES)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Para compactar: la última fila de cada objeto
+            models.Index(fields=['recurso', 'objeto_id', 'id'], name='cambio_objeto_idx'),
+            models.Index(fields=['fecha'], name='cambio_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.operacion} {self.recurso}/{self.objeto_id}"
+
+
+class CompactacionCambios(models.Model):
+    """
+    Cada pasada de compactar_cambios(). Las bajas con id hasta `horizonte` se
+    han purgado, así que un cursor anterior ya no permite sincronizar.
+    """
+    fecha = models.DateTimeField(default=timezone.now)
+    horizonte = models.BigIntegerField(default=0)
+    borrados = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Compactación del {self.fecha:%d/%m/%Y %H:%M} (horizonte #{self.horizonte})"
@@ -0,0 +1,138 @@
+# inventario/paginacion.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# -------------------------------------------------------------------
+# 🔑 Paginación por clave (keyset / cursor) sobre (fecha, id) o (id,)
+# -------------------------------------------------------------------
+class PaginacionKeyset(BasePagination):
+    """
+    En vez de OFFSET + COUNT(*), cada página pide las filas posteriores a la
+    última de la página anterior:
+
+        WHERE fecha >= :f AND NOT (fecha = :f AND id <= :id)
+        ORDER BY fecha, id LIMIT :n
+
+    Con un índice sobre (fecha, id) cualquier página cuesta lo mismo que la
+    primera, y añadir filas mientras se pagina no hace saltar ni repetir ninguna.
+    La vista indica el orden con `orden_keyset` (el último campo debe ser único).
+    El cliente puede pedir ?page_size= hasta `max_page_size`.
+
+    La respuesta tiene la misma forma que antes salvo 'count':
+        {"next": url|null, "previous": url|null, "results": [...]}
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE or 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    orden_keyset = ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.orden = tuple(getattr(view, 'orden_keyset', self.orden_keyset))
+        assert 1 <= len(self.orden) <= 2, "orden_keyset admite uno o dos campos"
+        self.modelo = queryset.model
+        tamano = self.get_page_size(request)
+        posicion, hacia_atras = self.decodificar_cursor(request)
+
+        if hacia_atras:
+            queryset = queryset.order_by(*[f'-{campo}' for campo in self.orden])
+        else:
+            queryset = queryset.order_by(*self.orden)
+        if posicion is not None:
+            queryset = queryset.filter(self._despues_de(posicion, hacia_atras))
+
+        filas = list(queryset[:tamano + 1])
+        hay_mas = len(filas) > tamano
+        filas = filas[:tamano]
+        if hacia_atras:
+            filas.reverse()
+            self.hay_siguiente, self.hay_anterior = posicion is not None, hay_mas
+        else:
+            self.hay_siguiente, self.hay_anterior = hay_mas, posicion is not None
+
+        self.filas = filas
+        return filas
+
+    def get_page_size(self, request):
+        try:
+            tamano = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(tamano, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.hay_siguiente or not self.filas:
+            return None
+        return self._enlace(self.filas[-1], hacia_atras=False)
+
+    def get_previous_link(self):
+        if not self.hay_anterior:
+            return None
+        if not self.filas:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self._enlace(self.filas[0], hacia_atras=True)
+
+    # --- cursor ---------------------------------------------------------
+
+    def _enlace(self, fila, hacia_atras):
+        valores = [self._campo(campo).value_to_string(fila) for campo in self.orden]
+        crudo = json.dumps({'p': valores, 'r': hacia_atras}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decodificar_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            datos = json.loads(crudo)
+            valores = datos['p']
+            if len(valores) != len(self.orden):
+                raise ValueError
+            posicion = [self._campo(campo).to_python(valor) for campo, valor in zip(self.orden, valores)]
+            return posicion, bool(datos.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, DjangoValidationError):
+            raise NotFound('Cursor no válido')
+
+    def _campo(self, nombre):
+        return self.modelo._meta.get_field('id' if nombre == 'pk' else nombre)
+
+    def _despues_de(self, posicion, hacia_atras):
+        mayor, mayor_igual, menor_igual = ('lt', 'lte', 'gte') if hacia_atras else ('gt', 'gte', 'lte')
+        if len(self.orden) == 1:
+            return Q(**{f'{self.orden[0]}__{mayor}': posicion[0]})
+        # (a, b) > (va, vb)  ⇔  a >= va AND NOT (a = va AND b <= vb)
+        # Así el índice (a, b) se recorre como un único rango en orden
+        (a, b), (va, vb) = self.orden, posicion
+        return Q(**{f'{a}__{mayor_igual}': va}) & ~Q(**{a: va, f'{b}__{menor_igual}': vb})
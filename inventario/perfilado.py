@@ -0,0 +1,224 @@
+# inventario/perfilado.py
+
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Límites (en segundos) de los histogramas de latencia por ruta
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tramos que se miden además del tiempo total de la petición
+TRAMOS = ('bd', 'serializador', 'senales')
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+
+
+# -------------------------------------------------------------------
+# ⏱️ Medición de una petición
+# -------------------------------------------------------------------
+class Medicion:
+    """
+    Tiempos acumulados durante una petición muestreada. Cada tramo se cuenta
+    sólo en su nivel más externo: un serializador anidado dentro de otro o una
+    señal que dispara otra señal no suman dos veces.
+    """
+    __slots__ = ('inicio', 'consultas', 'tiempos', '_abiertos')
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.tiempos = dict.fromkeys(TRAMOS, 0.0)
+        self._abiertos = set()
+
+    def cabecera_server_timing(self, total):
+        partes = [f'total;dur={total * 1000:.1f}']
+        partes.append(f'bd;dur={self.tiempos["bd"] * 1000:.1f};desc="{self.consultas} consultas"')
+        partes.append(f'serializador;dur={self.tiempos["serializador"] * 1000:.1f}')
+        partes.append(f'senales;dur={self.tiempos["senales"] * 1000:.1f}')
+        return ', '.join(partes)
+
+
+def medicion_actual():
+    return _medicion_actual.get()
+
+
+@contextmanager
+def medir_peticion():
+    """
+    Abre una Medicion para la petición en curso. Las consultas SQL las
+    cronometra _cronometrar_consulta, instalado en cada conexión (ver
+    instalar_cronometro). Fuera de una petición muestreada nada de este
+    módulo hace trabajo extra.
+    """
+    medicion = Medicion()
+    token = _medicion_actual.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion_actual.reset(token)
+
+
+def instalar_cronometro(sender=None, connection=None, **kwargs):
+    """
+    Receptor de connection_created. Se instala en cada conexión y no sólo en
+    la del hilo de la petición porque en las vistas async el ORM consulta
+    desde otros hilos (sync_to_async); la medición en curso les llega por
+    el ContextVar.
+    """
+    if connection is not None and _cronometrar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_cronometrar_consulta)
+
+
+def _cronometrar_consulta(execute, sql, params, many, context):
+    medicion = _medicion_actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.tiempos['bd'] += time.perf_counter() - inicio
+        medicion.consultas += 1
+
+
+@contextmanager
+def cronometro(tramo):
+    medicion = _medicion_actual.get()
+    if medicion is None or tramo in medicion._abiertos:
+        yield
+        return
+    medicion._abiertos.add(tramo)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.tiempos[tramo] += time.perf_counter() - inicio
+        medicion._abiertos.discard(tramo)
+
+
+def cronometrado(tramo):
+    """Decorador: suma la duración de la función al tramo indicado."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with cronometro(tramo):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+class CronometrarSerializadorMixin:
+    """
+    Para serializadores de DRF: suma al tramo 'serializador' el tiempo de
+    validar la entrada y de convertir instancias a datos de salida.
+    """
+    def run_validation(self, *args, **kwargs):
+        with cronometro('serializador'):
+            return super().run_validation(*args, **kwargs)
+
+    def to_representation(self, *args, **kwargs):
+        with cronometro('serializador'):
+            return super().to_representation(*args, **kwargs)
+
+
+def muestrear():
+    """True si la petición en curso debe medirse (PERFILADO_MUESTREO entre 0 y 1)."""
+    tasa = getattr(settings, 'PERFILADO_MUESTREO', 1.0)
+    return tasa >= 1 or (tasa > 0 and random.random() < tasa)
+
+
+# -------------------------------------------------------------------
+# 📊 Histogramas por ruta y exposición en formato Prometheus
+# -------------------------------------------------------------------
+class _SerieRuta:
+    __slots__ = ('cubos', 'peticiones', 'segundos', 'consultas', 'tramos')
+
+    def __init__(self):
+        self.cubos = [0] * (len(LIMITES_SEGUNDOS) + 1)  # El último es +Inf
+        self.peticiones = 0
+        self.segundos = 0.0
+        self.consultas = 0
+        self.tramos = dict.fromkeys(TRAMOS, 0.0)
+
+
+class RegistroMetricas:
+    """
+    Agregados en memoria del proceso. Registrar una petición es una búsqueda
+    binaria y unas sumas bajo un lock; el texto sólo se genera al pedir
+    /api/_metrics/.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def registrar(self, ruta, metodo, estado, total, medicion):
+        clave = (ruta, metodo, str(estado))
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = _SerieRuta()
+            serie.cubos[bisect_left(LIMITES_SEGUNDOS, total)] += 1
+            serie.peticiones += 1
+            serie.segundos += total
+            serie.consultas += medicion.consultas
+            for tramo, segundos in medicion.tiempos.items():
+                serie.tramos[tramo] += segundos
+
+    def vaciar(self):
+        with self._lock:
+            self._series.clear()
+
+    def exportar(self):
+        with self._lock:
+            series = sorted(
+                (clave, serie.cubos[:], serie.peticiones, serie.segundos, serie.consultas, dict(serie.tramos))
+                for clave, serie in self._series.items()
+            )
+        lineas = [
+            '# HELP inventario_peticion_segundos Duración de las peticiones HTTP por ruta.',
+            '# TYPE inventario_peticion_segundos histogram',
+        ]
+        for (ruta, metodo, estado), cubos, peticiones, segundos, _, _ in series:
+            etiquetas = f'ruta="{_escapar(ruta)}",metodo="{metodo}",estado="{estado}"'
+            acumulado = 0
+            for limite, cantidad in zip(LIMITES_SEGUNDOS, cubos):
+                acumulado += cantidad
+                lineas.append(f'inventario_peticion_segundos_bucket{{{etiquetas},le="{limite}"}} {acumulado}')
+            lineas.append(f'inventario_peticion_segundos_bucket{{{etiquetas},le="+Inf"}} {peticiones}')
+            lineas.append(f'inventario_peticion_segundos_sum{{{etiquetas}}} {segundos:.6f}')
+            lineas.append(f'inventario_peticion_segundos_count{{{etiquetas}}} {peticiones}')
+
+        lineas += [
+            '# HELP inventario_consultas_total Consultas SQL ejecutadas por ruta.',
+            '# TYPE inventario_consultas_total counter',
+        ]
+        for (ruta, metodo, estado), _, _, _, consultas, _ in series:
+            lineas.append(
+                f'inventario_consultas_total{{ruta="{_escapar(ruta)}",metodo="{metodo}",estado="{estado}"}} {consultas}'
+            )
+
+        for tramo, descripcion in (
+            ('bd', 'Tiempo en la base de datos'),
+            ('serializador', 'Tiempo en serializadores'),
+            ('senales', 'Tiempo en manejadores de señales'),
+        ):
+            nombre = f'inventario_{tramo}_segundos_total'
+            lineas += [f'# HELP {nombre} {descripcion} por ruta.', f'# TYPE {nombre} counter']
+            for (ruta, metodo, estado), _, _, _, _, tramos in series:
+                lineas.append(
+                    f'{nombre}{{ruta="{_escapar(ruta)}",metodo="{metodo}",estado="{estado}"}} {tramos[tramo]:.6f}'
+                )
+        return '\n'.join(lineas) + '\n'
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = RegistroMetricas()
@@ -1,18 +1,31 @@
 from rest_framework import serializers
-from django.db import transaction  # Para manejar transacciones atómicas
+from django.db import IntegrityError, transaction  # Para manejar transacciones atómicas
 from .models import (
     Producto, Cliente, Proveedor,
     Compra, DetalleCompra,
-    Venta, DetalleVenta
+    Venta, DetalleVenta,
+    Reserva,
+)
+from .perfilado import CronometrarSerializadorMixin
+from .servicios.stock import StockInsuficienteError
+from .servicios.reservas import MINUTOS_POR_DEFECTO, MINUTOS_MAXIMOS, reservar
+from .servicios.unidad_trabajo import diferir_recalculos
+from .servicios.lineas import (
+    crear_lineas_compra_en_bloque, crear_lineas_venta_en_bloque,
+    sincronizar_lineas_compra, sincronizar_lineas_venta,
 )
 
 # =======================
 # Serializador para Producto
 # =======================
-class ProductoSerializer(serializers.ModelSerializer):
+class ProductoSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
+    # Stock menos lo retenido por reservas vivas (ver Reserva)
+    stock_disponible = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = Producto
-        fields = '__all__'
+        exclude = ['nombre_normalizado']  # Columna interna para autocompletar
+        read_only_fields = ['reservado']
 
     def validate_nombre(self, value):
         if not value.strip():
@@ -27,47 +40,71 @@ class ProductoSerializer(serializers.ModelSerializer):
     def validate_stock(self, value):
         if value < 0:
             raise serializers.ValidationError('El stock no puede ser negativo')
+        if self.instance is not None and value < self.instance.reservado:
+            raise serializers.ValidationError('El stock no puede quedar por debajo de lo reservado')
         return value
 
 
 # =======================
-# Serializador para Cliente
+# Nombre único de clientes y proveedores
 # =======================
-class ClienteSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Cliente
-        fields = '__all__'
+class NombreUnicoSerializerMixin:
+    """
+    El nombre se compara normalizado (sin tildes, mayúsculas ni espacios de
+    más) con una búsqueda por el índice único de nombre_normalizado. Si otra
+    petición guarda el mismo nombre entre la validación y el INSERT, el índice
+    lanza IntegrityError y se responde igualmente con un 400 sobre 'nombre'.
+    Si el nombre no cambia de clave no se comprueba: la fila conserva la suya.
+    """
+    error_nombre_duplicado = "El nombre ya existe"
 
     def validate_nombre(self, value):
         if not value.strip():
             raise serializers.ValidationError("El nombre no puede estar vacío")
-        cliente_id = self.instance.id if self.instance else None
-        if Cliente.objects.filter(nombre__iexact=value).exclude(id=cliente_id).exists():
-            raise serializers.ValidationError("El nombre ya existe en la lista de clientes")
+        if self.instance is not None and not self.instance.nombre_cambia_clave(value):
+            return value
+        excluir_pk = self.instance.pk if self.instance else None
+        if self.Meta.model.nombre_en_uso(value, excluir_pk=excluir_pk):
+            raise serializers.ValidationError(self.error_nombre_duplicado)
         return value
 
+    def save(self, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().save(**kwargs)
+        except IntegrityError as exc:
+            # Sólo el índice único del nombre es un error del cliente; el resto sigue siendo un 500
+            if 'nombre_normalizado' not in str(exc):
+                raise
+            raise serializers.ValidationError({'nombre': [self.error_nombre_duplicado]})
+
+
+# =======================
+# Serializador para Cliente
+# =======================
+class ClienteSerializer(CronometrarSerializadorMixin, NombreUnicoSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Cliente
+        exclude = ['nombre_normalizado']  # Columna interna para autocompletar
+
+    error_nombre_duplicado = "El nombre ya existe en la lista de clientes"
+
 
 # =======================
 # Serializador para Proveedor
 # =======================
-class ProveedorSerializer(serializers.ModelSerializer):
+class ProveedorSerializer(CronometrarSerializadorMixin, NombreUnicoSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Proveedor
-        fields = '__all__'
+        exclude = ['nombre_normalizado']  # Columna interna para autocompletar
 
-    def validate_nombre(self, value):
-        if not value.strip():
-            raise serializers.ValidationError("El nombre no puede estar vacío")
-        proveedor_id = self.instance.id if self.instance else None
-        if Proveedor.objects.filter(nombre__iexact=value).exclude(id=proveedor_id).exists():
-            raise serializers.ValidationError("El nombre ya existe en la lista de proveedores")
-        return value
+    error_nombre_duplicado = "El nombre ya existe en la lista de proveedores"
 
 
 # =======================
 # Serializador para DetalleCompra
 # =======================
-class DetalleCompraSerializer(serializers.ModelSerializer):
+class DetalleCompraSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
     # subtotal no debe ser editable, se calcula automáticamente
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
@@ -87,8 +124,9 @@ class DetalleCompraSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         # Calculamos el subtotal y validamos que sea correcto
-        cantidad = data.get('cantidad')
-        precio_unitario = data.get('precio_unitario')
+        # En un PATCH parcial, lo que no se envía se toma de la línea actual
+        cantidad = data.get('cantidad', getattr(self.instance, 'cantidad', None))
+        precio_unitario = data.get('precio_unitario', getattr(self.instance, 'precio_unitario', None))
         subtotal_calculado = cantidad * precio_unitario
         # No permitimos que el subtotal enviado sea diferente del calculado (en este caso es read_only, así que viene vacío)
         # Simplemente nos aseguramos que los datos estén consistentes
@@ -97,30 +135,51 @@ class DetalleCompraSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        # Calculamos subtotal automáticamente
-        validated_data['subtotal'] = validated_data['cantidad'] * validated_data['precio_unitario']
-        detalle_compra = super().create(validated_data)
-        # Actualizamos stock del producto sumando la cantidad comprada
-        producto = detalle_compra.producto
-        producto.stock += detalle_compra.cantidad
-        producto.save()
-        return detalle_compra
+        # El subtotal lo calcula DetalleCompra.save() y el stock lo suben las señales
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
     def update(self, instance, validated_data):
-        # Para actualizar stock correctamente, calculamos diferencia entre nueva y vieja cantidad
-        old_cantidad = instance.cantidad
-        new_cantidad = validated_data.get('cantidad', instance.cantidad)
-        validated_data['subtotal'] = new_cantidad * validated_data.get('precio_unitario', instance.precio_unitario)
+        # Las señales mueven sólo la diferencia entre la cantidad vieja y la nueva
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
-        detalle_compra = super().update(instance, validated_data)
+# =======================
+# Líneas anidadas: productos cargados en una sola consulta
+# =======================
+class ProductoLineaField(serializers.PrimaryKeyRelatedField):
+    """
+    Igual que PrimaryKeyRelatedField, pero si la lista de líneas ya ha cargado
+    los productos (ver LineasListSerializer) no hace un SELECT por línea.
+    """
+    def to_internal_value(self, data):
+        productos = self.context.get('productos_en_lote')
+        if productos is not None:
+            try:
+                return productos[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass  # Dejamos que la validación normal genere el error
+        return super().to_internal_value(data)
+
+
+class LineasListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            ids = set()
+            for detalle in data:
+                try:
+                    ids.add(int(detalle.get('producto')))
+                except (AttributeError, TypeError, ValueError):
+                    continue
+            self.context['productos_en_lote'] = Producto.objects.in_bulk(ids)
+        return super().to_internal_value(data)
 
-        diferencia = new_cantidad - old_cantidad
-        producto = detalle_compra.producto
-        producto.stock += diferencia  # sumamos diferencia (puede ser negativo)
-        if producto.stock < 0:
-            raise serializers.ValidationError("No se puede dejar stock negativo")
-        producto.save()
-        return detalle_compra
 
 # =======================
 # Serializador para compra
@@ -128,23 +187,44 @@ class DetalleCompraSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Compra, DetalleCompra
 
-class DetalleCompraSerializer(serializers.ModelSerializer):
+class DetalleCompraLineaSerializer(serializers.ModelSerializer):
+    # Línea anidada dentro de CompraSerializer (sin 'compra', la pone el padre)
+    # Opcional al editar: identifica la línea que se modifica (ver CompraSerializer.update)
+    id = serializers.IntegerField(required=False)
+    producto = ProductoLineaField(queryset=Producto.objects.all())
+
     class Meta:
         model = DetalleCompra
-        fields = ['producto', 'cantidad', 'precio_unitario']
+        fields = ['id', 'producto', 'cantidad', 'precio_unitario']
+        list_serializer_class = LineasListSerializer
 
-class CompraSerializer(serializers.ModelSerializer):
+class CompraSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
     # Relación anidada: una compra contiene varios detalles
-    detalles = DetalleCompraSerializer(many=True)
+    detalles = DetalleCompraLineaSerializer(many=True)
 
     class Meta:
         model = Compra
         fields = ['id', 'proveedor', 'fecha', 'total', 'detalles']
 
+    # True: las líneas se insertan con bulk_create y el stock/total se aplican
+    # una vez por producto y por compra (servicios.lineas). False: una a una con señales.
+    escritura_en_bloque = True
+
+    def _crear_detalles(self, compra, detalles_data):
+        # En un alta el 'id' de línea no tiene sentido: lo asigna la BD
+        detalles_data = [{k: v for k, v in d.items() if k != 'id'} for d in detalles_data]
+        if self.escritura_en_bloque:
+            crear_lineas_compra_en_bloque(compra, detalles_data)
+        else:
+            for detalle in detalles_data:
+                DetalleCompra.objects.create(compra=compra, **detalle)
+
     def validate(self, data):
         """
         Validar que el total coincida con la suma de subtotales de cada detalle.
         """
+        if 'detalles' not in data or data.get('total') is None:
+            return data  # PATCH sin líneas o sin total: el total lo recalcula el servidor
         total_calculado = sum(
             d['cantidad'] * d['precio_unitario'] for d in data['detalles']
         )
@@ -159,27 +239,37 @@ class CompraSerializer(serializers.ModelSerializer):
         Crear una compra con detalles anidados.
         """
         detalles_data = validated_data.pop('detalles')
-        compra = Compra.objects.create(**validated_data)
-        for detalle in detalles_data:
-            DetalleCompra.objects.create(compra=compra, **detalle)
+        try:
+            with diferir_recalculos():
+                compra = Compra.objects.create(**validated_data)
+                self._crear_detalles(compra, detalles_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
+        # El total se recalcula con un UPDATE en la BD: la instancia no lo tiene
+        compra.refresh_from_db(fields=['total'])
         return compra
 
     def update(self, instance, validated_data):
         """
-        Actualizar una compra y reemplazar todos sus detalles.
+        Actualizar una compra aplicando sólo las diferencias en sus detalles:
+        las líneas se casan por 'id' (o por producto si no se envía) y sólo se
+        insertan, modifican o borran las que han cambiado. Si no se envían
+        detalles (PATCH), las líneas no se tocan.
         """
-        detalles_data = validated_data.pop('detalles')
+        detalles_data = validated_data.pop('detalles', None)
         instance.proveedor = validated_data.get('proveedor', instance.proveedor)
         instance.fecha = validated_data.get('fecha', instance.fecha)
         instance.total = validated_data.get('total', instance.total)
-        instance.save()
 
-        # Eliminar todos los detalles existentes antes de volver a crear
-        instance.detalles.all().delete()
-
-        for detalle in detalles_data:
-            DetalleCompra.objects.create(compra=instance, **detalle)
+        try:
+            with diferir_recalculos():
+                instance.save()
+                if detalles_data is not None:
+                    sincronizar_lineas_compra(instance, detalles_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
+        instance.refresh_from_db(fields=['total'])
         return instance
 
 
@@ -187,7 +277,7 @@ class CompraSerializer(serializers.ModelSerializer):
 # =======================
 # Serializador para DetalleVenta
 # =======================
-class DetalleVentaSerializer(serializers.ModelSerializer):
+class DetalleVentaSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
@@ -205,42 +295,29 @@ class DetalleVentaSerializer(serializers.ModelSerializer):
         return value
 
     def validate(self, data):
-        cantidad = data.get('cantidad')
-        precio_unitario = data.get('precio_unitario')
+        # En un PATCH parcial, lo que no se envía se toma de la línea actual
+        cantidad = data.get('cantidad', getattr(self.instance, 'cantidad', None))
+        precio_unitario = data.get('precio_unitario', getattr(self.instance, 'precio_unitario', None))
         subtotal_calculado = cantidad * precio_unitario
         if subtotal_calculado < 0:
             raise serializers.ValidationError("El subtotal calculado no puede ser negativo")
         return data
 
     def create(self, validated_data):
-        validated_data['subtotal'] = validated_data['cantidad'] * validated_data['precio_unitario']
-        detalle_venta = super().create(validated_data)
-
-        # Al crear una venta, restamos stock del producto
-        producto = detalle_venta.producto
-        if producto.stock < detalle_venta.cantidad:
-            raise serializers.ValidationError("No hay suficiente stock para realizar la venta")
-        producto.stock -= detalle_venta.cantidad
-        producto.save()
-
-        return detalle_venta
+        # El stock se descuenta en la señal con un UPDATE condicional: si no
+        # alcanza, se deshace la línea y devolvemos un error de validación
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
     def update(self, instance, validated_data):
-        old_cantidad = instance.cantidad
-        new_cantidad = validated_data.get('cantidad', instance.cantidad)
-        validated_data['subtotal'] = new_cantidad * validated_data.get('precio_unitario', instance.precio_unitario)
-
-        detalle_venta = super().update(instance, validated_data)
-
-        diferencia = new_cantidad - old_cantidad
-        producto = detalle_venta.producto
-        if producto.stock < diferencia:
-            raise serializers.ValidationError("No hay suficiente stock para actualizar la venta")
-        producto.stock -= diferencia  # restamos la diferencia al stock
-        if producto.stock < 0:
-            raise serializers.ValidationError("No se puede dejar stock negativo")
-        producto.save()
-        return detalle_venta
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
 
 # =======================
@@ -249,23 +326,44 @@ class DetalleVentaSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Venta, DetalleVenta
 
-class DetalleVentaSerializer(serializers.ModelSerializer):
+class DetalleVentaLineaSerializer(serializers.ModelSerializer):
+    # Línea anidada dentro de VentaSerializer (sin 'venta', la pone el padre)
+    # Opcional al editar: identifica la línea que se modifica (ver VentaSerializer.update)
+    id = serializers.IntegerField(required=False)
+    producto = ProductoLineaField(queryset=Producto.objects.all())
+
     class Meta:
         model = DetalleVenta
-        fields = ['producto', 'cantidad', 'precio_unitario']
+        fields = ['id', 'producto', 'cantidad', 'precio_unitario']
+        list_serializer_class = LineasListSerializer
 
-class VentaSerializer(serializers.ModelSerializer):
+class VentaSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
     # Usamos 'detalles' porque ese es el related_name en el modelo
-    detalles = DetalleVentaSerializer(many=True)
+    detalles = DetalleVentaLineaSerializer(many=True)
 
     class Meta:
         model = Venta
         fields = ['id', 'cliente', 'fecha', 'total', 'detalles']
 
+    # True: las líneas se insertan con bulk_create y el stock/total se aplican
+    # una vez por producto y por venta (servicios.lineas). False: una a una con señales.
+    escritura_en_bloque = True
+
+    def _crear_detalles(self, venta, detalles_data):
+        # En un alta el 'id' de línea no tiene sentido: lo asigna la BD
+        detalles_data = [{k: v for k, v in d.items() if k != 'id'} for d in detalles_data]
+        if self.escritura_en_bloque:
+            crear_lineas_venta_en_bloque(venta, detalles_data)
+        else:
+            for detalle in detalles_data:
+                DetalleVenta.objects.create(venta=venta, **detalle)
+
     def validate(self, data):
         """
         Validar que el total sea igual a la suma de subtotales de los detalles.
         """
+        if 'detalles' not in data or data.get('total') is None:
+            return data  # PATCH sin líneas o sin total: el total lo recalcula el servidor
         total_calculado = sum(
             d['cantidad'] * d['precio_unitario'] for d in data['detalles']
         )
@@ -280,26 +378,85 @@ class VentaSerializer(serializers.ModelSerializer):
         Crear una venta con detalles anidados.
         """
         detalles_data = validated_data.pop('detalles')
-        venta = Venta.objects.create(**validated_data)
-        for detalle in detalles_data:
-            DetalleVenta.objects.create(venta=venta, **detalle)
+        try:
+            with diferir_recalculos():
+                venta = Venta.objects.create(**validated_data)
+                self._crear_detalles(venta, detalles_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
+        # El total se recalcula con un UPDATE en la BD: la instancia no lo tiene
+        venta.refresh_from_db(fields=['total'])
         return venta
 
     def update(self, instance, validated_data):
         """
-        Actualizar una venta y reemplazar sus detalles.
+        Actualizar una venta aplicando sólo las diferencias en sus detalles:
+        las líneas se casan por 'id' (o por producto si no se envía) y sólo se
+        insertan, modifican o borran las que han cambiado. Si no se envían
+        detalles (PATCH), las líneas no se tocan.
         """
-        detalles_data = validated_data.pop('detalles')
+        detalles_data = validated_data.pop('detalles', None)
         instance.cliente = validated_data.get('cliente', instance.cliente)
         instance.fecha = validated_data.get('fecha', instance.fecha)
         instance.total = validated_data.get('total', instance.total)
-        instance.save()
 
-        # Borra los detalles anteriores
-        instance.detalles.all().delete()
-
-        # Crea los nuevos detalles
-        for detalle in detalles_data:
-            DetalleVenta.objects.create(venta=instance, **detalle)
+        try:
+            with diferir_recalculos():
+                instance.save()
+                if detalles_data is not None:
+                    sincronizar_lineas_venta(instance, detalles_data)
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
 
+        instance.refresh_from_db(fields=['total'])
         return instance
+
+
+# =======================
+# Serializador para Reserva
+# =======================
+class ReservaSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
+    # Duración de la reserva; al terminar las unidades vuelven a estar disponibles
+    minutos = serializers.IntegerField(
+        write_only=True, required=False, min_value=1, max_value=MINUTOS_MAXIMOS
+    )
+
+    class Meta:
+        model = Reserva
+        fields = ['id', 'producto', 'cantidad', 'minutos', 'creada', 'expira']
+        read_only_fields = ['creada', 'expira']
+
+    def validate_cantidad(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("La cantidad debe ser mayor a 0")
+        return value
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        try:
+            return reservar(
+                validated_data['producto'].id,
+                validated_data['cantidad'],
+                minutos=validated_data.get('minutos', MINUTOS_POR_DEFECTO),
+                usuario=request.user if request else None,
+            )
+        except StockInsuficienteError as exc:
+            raise serializers.ValidationError(str(exc))
+
+
+class ConfirmarReservasSerializer(CronometrarSerializadorMixin, serializers.Serializer):
+    # Cliente de la venta y reservas (del usuario) que se convierten en líneas
+    cliente = serializers.PrimaryKeyRelatedField(queryset=Cliente.objects.all())
+    reservas = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+
+# =======================
+# Serializador para el stock en una fecha
+# =======================
+class StockEnFechaSerializer(CronometrarSerializadorMixin, serializers.ModelSerializer):
+    # Valor anotado por servicios.historico.productos_con_stock_en_fecha
+    stock = serializers.IntegerField(source='stock_en_fecha', read_only=True)
+
+    class Meta:
+        model = Producto
+        fields = ['id', 'nombre', 'stock']
@@ -0,0 +1,50 @@
+from .historico import *
+# Histórico de movimientos de stock, fotos periódicas y stock en una fecha
+
+from .stock import *
+# Movimientos de stock atómicos (UPDATE condicional con expresiones F)
+
+from .totales import *
+# Recalcular el total de compras y ventas con un UPDATE por lote
+
+from .unidad_trabajo import *
+# Diferir stock y totales hasta el final de una operación (diferir_recalculos)
+
+from .lineas import *
+# Alta masiva de líneas de compra/venta con bulk_create
+
+from .reservas import *
+# Reservas de stock con caducidad y su conversión en ventas
+
+from .reconciliacion import *
+# Detectar y corregir en bloque el stock que no cuadra con compras y ventas
+
+from .borrado import *
+# Borrado en bloque de clientes, proveedores y productos sin cascada de señales
+
+from .busqueda import *
+# Búsqueda de productos por texto completo (SQLite FTS5)
+
+from .autocompletar import *
+# Autocompletar por prefijo del nombre normalizado, con caché en memoria
+
+from .cache_respuestas import *
+# Caché de las respuestas de productos, clientes y proveedores invalidada por señales
+
+from .cambios import *
+# Registro de altas, modificaciones y bajas para /api/cambios/ y su compactación
+
+from .eventos import *
+# Pub/sub en memoria del stock y los pedidos nuevos para /api/eventos/ (SSE)
+
+from .versiones import *
+# Contador de versión por tabla para ETag/Last-Modified e If-Match en la API
+
+from .exportacion import *
+# Exportación de ventas, compras y stock a CSV/NDJSON leyendo por lotes
+
+from .importacion import *
+# Importación masiva de ventas y compras desde NDJSON/CSV por lotes
+
+from .catalogo import *
+# Alta y actualización masiva de productos por SKU (upsert por lotes)
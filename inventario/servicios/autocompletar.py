@@ -0,0 +1,110 @@
+# inventario/servicios/autocompletar.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from ..models import Cliente, Producto, Proveedor, normalizar_nombre
+
+__all__ = ['RECURSOS_AUTOCOMPLETAR', 'autocompletar', 'invalidar_autocompletar', 'filtrar_por_prefijo']
+
+# Recursos que se pueden autocompletar (/api/autocompletar/<recurso>/)
+RECURSOS_AUTOCOMPLETAR = {
+    'productos': Producto,
+    'clientes': Cliente,
+    'proveedores': Proveedor,
+}
+
+LIMITE_POR_DEFECTO = 20
+
+
+def filtrar_por_prefijo(queryset, texto):
+    """
+    Filas cuyo nombre normalizado empieza por `texto` normalizado. Se expresa
+    como rango (>= 'pap' AND < 'paq') para que cualquier motor recorra el
+    índice de nombre_normalizado; un LIKE 'pap%' no lo usaría en SQLite.
+    """
+    prefijo = normalizar_nombre(texto)
+    if not prefijo:
+        return queryset.none()
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return queryset.filter(nombre_normalizado__gte=prefijo, nombre_normalizado__lt=siguiente)
+
+
+# -------------------------------------------------------------------
+# 🧠 Caché en memoria del proceso
+# -------------------------------------------------------------------
+class _CacheLRU:
+    """
+    Resultados recientes por (recurso, prefijo, límite). Pequeña y con
+    caducidad corta; además se vacía la parte de un recurso cuando se
+    guarda o borra una de sus filas (ver signals.py).
+    """
+    def __init__(self, maximo=512, segundos=60):
+        self.maximo = maximo
+        self.segundos = segundos
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            caduca, valor = entrada
+            if caduca < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + self.segundos, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, recurso=None):
+        with self._lock:
+            if recurso is None:
+                self._datos.clear()
+            else:
+                for clave in [c for c in self._datos if c[0] == recurso]:
+                    del self._datos[clave]
+
+
+_cache = _CacheLRU()
+
+
+# -------------------------------------------------------------------
+# 🔤 Autocompletar
+# -------------------------------------------------------------------
+def autocompletar(recurso, texto, limite=LIMITE_POR_DEFECTO):
+    """
+    Hasta `limite` opciones [{'id': ..., 'text': ...}] cuyo nombre empieza
+    por `texto` (sin distinguir tildes ni mayúsculas), sin archivados y en
+    orden alfabético. Es el formato que esperan los widgets de tipo Select2.
+    """
+    modelo = RECURSOS_AUTOCOMPLETAR[recurso]
+    clave = (recurso, normalizar_nombre(texto), limite)
+    resultados = _cache.obtener(clave)
+    if resultados is None:
+        filas = (
+            filtrar_por_prefijo(modelo.objects.filter(archivado=False), texto)
+            .order_by('nombre_normalizado', 'id')
+            .values_list('id', 'nombre')[:limite]
+        )
+        resultados = [{'id': pk, 'text': nombre} for pk, nombre in filas]
+        _cache.guardar(clave, resultados)
+    return resultados
+
+
+def invalidar_autocompletar(modelo=None):
+    """Olvida lo cacheado del recurso de `modelo` (o todo si es None)."""
+    recurso = None
+    if modelo is not None:
+        recurso = next((r for r, m in RECURSOS_AUTOCOMPLETAR.items() if m is modelo), None)
+        if recurso is None:
+            return
+    _cache.invalidar(recurso)
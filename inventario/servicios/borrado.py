@@ -0,0 +1,108 @@
+# inventario/servicios/borrado.py
+
+from django.db import transaction
+from django.db.models import Sum
+
+from ..models import (
+    Cambio, Cliente, Proveedor, Producto,
+    Compra, DetalleCompra, Venta, DetalleVenta,
+    MovimientoStock,
+)
+from .totales import recalcular_totales_compras, recalcular_totales_ventas
+from .unidad_trabajo import diferir_recalculos, registrar_movimiento
+from .versiones import marcar_cambio
+
+__all__ = ['eliminar_clientes', 'eliminar_proveedores', 'eliminar_productos']
+
+TAMANO_LOTE = 500
+
+
+def _borrar_sin_cascada(queryset, ids=()):
+    """
+    DELETE ... WHERE id IN (...) directo, sin que Django cargue las filas ni
+    dispare post_delete por cada una. Sólo se usa cuando el efecto de las
+    señales (stock y totales) ya se ha aplicado en bloque. `ids` son los
+    objetos que se anotan como baja en el registro de cambios.
+    """
+    borradas = queryset._raw_delete(queryset.db)
+    if borradas:
+        marcar_cambio(queryset.model, ids, Cambio.BAJA)
+    return borradas
+
+
+def _lotes_de_ids(queryset, lote):
+    # Lee los ids de lote en lote; como cada lote se borra antes de pedir el
+    # siguiente, basta con pedir siempre los primeros
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:lote])
+        if not ids:
+            return
+        yield ids
+
+
+def _eliminar_cabeceras(cabeceras, modelo_detalle, campo_cabecera, signo, origen, lote):
+    """
+    Borra compras o ventas por lotes de `lote` cabeceras (acotan el tamaño de
+    cada IN y lo que se lee en memoria). En cada lote se calcula con una
+    consulta agrupada cuánto stock hay que devolver o retirar por producto,
+    se aplica con un UPDATE por producto y se borran líneas y cabeceras sin
+    recalcular totales de cabeceras que van a desaparecer. Quien llama lo
+    envuelve todo en una transacción: si un lote falla no queda nada borrado.
+    """
+    for ids in _lotes_de_ids(cabeceras, lote):
+        with diferir_recalculos():
+            lineas = modelo_detalle.objects.filter(**{f'{campo_cabecera}_id__in': ids})
+            por_producto = lineas.values('producto').annotate(cantidad=Sum('cantidad')).order_by()
+            for fila in por_producto:
+                registrar_movimiento(fila['producto'], -signo * fila['cantidad'], origen)
+            _borrar_sin_cascada(lineas)
+            _borrar_sin_cascada(cabeceras.model.objects.filter(pk__in=ids), ids)
+
+
+# -------------------------------------------------------------------
+# 🗑️ Borrado en bloque de clientes, proveedores y productos
+# -------------------------------------------------------------------
+def eliminar_clientes(cliente_ids, lote=TAMANO_LOTE):
+    """
+    Borra los clientes y todas sus ventas devolviendo al stock lo vendido.
+    """
+    with transaction.atomic():
+        _eliminar_cabeceras(
+            Venta.objects.filter(cliente_id__in=cliente_ids),
+            DetalleVenta, 'venta', -1, MovimientoStock.VENTA, lote,
+        )
+        return Cliente.objects.filter(pk__in=cliente_ids).delete()[1].get(Cliente._meta.label, 0)
+
+
+def eliminar_proveedores(proveedor_ids, lote=TAMANO_LOTE):
+    """
+    Borra los proveedores y todas sus compras retirando del stock lo comprado.
+    Si ya se ha vendido, se rechaza con StockInsuficienteError y no se borra
+    nada (ni los lotes anteriores): en ese caso conviene archivar el proveedor.
+    """
+    with transaction.atomic():
+        _eliminar_cabeceras(
+            Compra.objects.filter(proveedor_id__in=proveedor_ids),
+            DetalleCompra, 'compra', +1, MovimientoStock.COMPRA, lote,
+        )
+        return Proveedor.objects.filter(pk__in=proveedor_ids).delete()[1].get(Proveedor._meta.label, 0)
+
+
+def eliminar_productos(producto_ids, lote=TAMANO_LOTE):
+    """
+    Borra los productos y sus líneas de compra y venta. El stock del producto
+    desaparece con él, pero hay que recalcular (una vez) el total de las
+    compras y ventas que tenían esas líneas. Todo en una transacción.
+    """
+    with transaction.atomic():
+        for modelo_detalle, campo_cabecera, recalcular in (
+            (DetalleCompra, 'compra', recalcular_totales_compras),
+            (DetalleVenta, 'venta', recalcular_totales_ventas),
+        ):
+            lineas = modelo_detalle.objects.filter(producto_id__in=producto_ids)
+            for ids in _lotes_de_ids(lineas, lote):
+                del_lote = modelo_detalle.objects.filter(pk__in=ids)
+                cabeceras = set(del_lote.values_list(f'{campo_cabecera}_id', flat=True))
+                _borrar_sin_cascada(del_lote)
+                recalcular(cabeceras)
+        return Producto.objects.filter(pk__in=producto_ids).delete()[1].get(Producto._meta.label, 0)
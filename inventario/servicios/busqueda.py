@@ -0,0 +1,104 @@
+# inventario/servicios/busqueda.py
+
+import re
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from ..models import Producto
+
+__all__ = ['TABLA_FTS', 'busqueda_disponible', 'consulta_fts', 'buscar_productos',
+           'filtrar_productos_por_texto', 'reconstruir_indice_productos']
+
+# Tabla virtual FTS5 sobre Producto.nombre y Producto.descripcion (migración 0008).
+# Se mantiene al día con triggers de SQLite, así que cubre también los
+# bulk_create/_raw_delete que no disparan señales de Django.
+TABLA_FTS = 'inventario_producto_fts'
+
+# Peso de cada columna en el ranking bm25: coincidir en el nombre cuenta más
+PESO_NOMBRE, PESO_DESCRIPCION = 10.0, 1.0
+
+_PALABRAS = re.compile(r'\w+', re.UNICODE)
+
+
+def busqueda_disponible():
+    """FTS5 sólo existe en SQLite; en otros motores se busca con icontains."""
+    return connection.vendor == 'sqlite'
+
+
+def consulta_fts(texto):
+    """
+    Convierte lo que escribe el usuario en una consulta MATCH segura: cada
+    palabra entre comillas (sin operadores de FTS5) y como prefijo, unidas con
+    AND. "cart ton" encuentra "Cartucho de tóner". Tildes y mayúsculas las
+    ignora el tokenizador (unicode61 remove_diacritics 2).
+    """
+    palabras = _PALABRAS.findall(texto or '')
+    return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+
+# -------------------------------------------------------------------
+# 🔎 Búsqueda
+# -------------------------------------------------------------------
+def buscar_productos(texto, limite=20, incluir_archivados=False):
+    """
+    Productos que coinciden con `texto`, los más relevantes primero (bm25).
+    Devuelve una lista de instancias de Producto.
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return []
+    if not busqueda_disponible():
+        productos = Producto.objects.filter(nombre__icontains=texto.strip())
+        if not incluir_archivados:
+            productos = productos.filter(archivado=False)
+        return list(productos.order_by('nombre')[:limite])
+
+    # Se puntúan todas las coincidencias y se ordena dentro de la propia
+    # consulta FTS: cortar antes de ordenar dejaría fuera a los mejores en
+    # cuanto una palabra común tuviera más coincidencias que el corte. Los
+    # archivados se descartan en el mismo JOIN, antes del LIMIT.
+    filtro_archivados = '' if incluir_archivados else 'AND p.archivado = 0'
+    return list(Producto.objects.raw(
+        f'''
+        SELECT p.*
+        FROM {TABLA_FTS}
+        JOIN inventario_producto AS p ON p.id = {TABLA_FTS}.rowid
+        WHERE {TABLA_FTS} MATCH %s {filtro_archivados}
+        ORDER BY bm25({TABLA_FTS}, %s, %s)
+        LIMIT %s
+        ''',
+        [consulta, PESO_NOMBRE, PESO_DESCRIPCION, limite],
+    ))
+
+
+def filtrar_productos_por_texto(queryset, texto):
+    """
+    Restringe un queryset de productos a los que coinciden con `texto`, sin
+    ranking (útil para el buscador del admin, que ordena por su cuenta).
+    """
+    consulta = consulta_fts(texto)
+    if not consulta:
+        return queryset
+    if not busqueda_disponible():
+        return queryset.filter(nombre__icontains=texto.strip())
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s', [consulta]))
+
+
+# -------------------------------------------------------------------
+# 🔧 Mantenimiento
+# -------------------------------------------------------------------
+def reconstruir_indice_productos(optimizar=True):
+    """
+    Regenera el índice entero desde inventario_producto con el comando
+    'rebuild' de FTS5 (una sola pasada en SQLite, sin cargar modelos en
+    Python) y, opcionalmente, fusiona sus segmentos con 'optimize'.
+    Devuelve el número de productos indexados.
+    """
+    if not busqueda_disponible():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('rebuild')")
+        if optimizar:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+    return Producto.objects.count()
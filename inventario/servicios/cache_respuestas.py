@@ -0,0 +1,173 @@
+# inventario/servicios/cache_respuestas.py
+
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from ..models import Cliente, Producto, Proveedor
+
+__all__ = [
+    'RECURSOS_CACHEADOS', 'obtener_respuesta', 'guardar_respuesta',
+    'invalidar_respuestas', 'estadisticas_cache_respuestas', 'exportar_metricas_cache',
+]
+
+# Modelo -> recurso de la API cuyas respuestas (listado y detalle) se cachean
+RECURSOS_CACHEADOS = {
+    Producto: 'productos',
+    Cliente: 'clientes',
+    Proveedor: 'proveedores',
+}
+
+
+def _cache():
+    alias = getattr(settings, 'CACHE_RESPUESTAS_ALIAS', 'respuestas')
+    return caches[alias] if alias else None
+
+
+# -------------------------------------------------------------------
+# 🔑 Claves: generación del recurso + petición + perfil del usuario
+# -------------------------------------------------------------------
+# Cada recurso tiene un contador de generación guardado en la propia caché.
+# Las respuestas se guardan bajo la generación vigente; invalidar es sumar 1,
+# así que no hay que buscar ni borrar claves y funciona igual en memoria que
+# en un backend compartido por varios procesos (ficheros, Redis...).
+
+def _clave_generacion(recurso):
+    return f'respuestas:generacion:{recurso}'
+
+
+def _generacion(cache, recurso):
+    clave = _clave_generacion(recurso)
+    generacion = cache.get(clave)
+    if generacion is None:
+        # Si se ha perdido (reinicio, expulsión) se parte de un valor nuevo,
+        # para no volver a servir respuestas guardadas con una generación antigua
+        cache.add(clave, time.time_ns(), timeout=None)
+        generacion = cache.get(clave)
+    return generacion
+
+
+def _perfil(user):
+    # Las vistas cacheadas sólo exigen IsAuthenticated, que DRF comprueba antes
+    # de llegar a la caché; el perfil separa además lo que vean staff y superusuarios
+    if user.is_superuser:
+        return 'superusuario'
+    return 'staff' if user.is_staff else 'usuario'
+
+
+def _clave(cache, recurso, request):
+    consulta = urlencode(sorted(request.query_params.lists()), doseq=True)
+    # El host entra en la clave porque la paginación devuelve URLs absolutas
+    firma = '\n'.join((request.get_host(), request.path, consulta, _perfil(request.user)))
+    resumen = hashlib.sha1(firma.encode()).hexdigest()
+    return f'respuestas:{recurso}:{_generacion(cache, recurso)}:{resumen}'
+
+
+# -------------------------------------------------------------------
+# 📦 Leer y guardar respuestas
+# -------------------------------------------------------------------
+def obtener_respuesta(recurso, request):
+    """
+    Devuelve (clave, datos) de la respuesta cacheada para esta petición;
+    datos es None si no está (y clave es None si la caché está desactivada).
+    """
+    cache = _cache()
+    if cache is None:
+        return None, None
+    clave = _clave(cache, recurso, request)
+    datos = cache.get(clave)
+    _metricas.anotar(recurso, acierto=datos is not None)
+    return clave, datos
+
+
+def guardar_respuesta(clave, datos):
+    if clave is not None:
+        _cache().set(clave, datos)
+
+
+def _nueva_generacion(recurso):
+    cache = _cache()
+    if cache is None:
+        return
+    clave = _clave_generacion(recurso)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.add(clave, time.time_ns(), timeout=None)
+
+
+def invalidar_respuestas(modelo):
+    """
+    Deja sin efecto las respuestas cacheadas del recurso de `modelo`. Se
+    invalida al momento y otra vez al confirmar la transacción: entre ambos
+    puntos otra petición aún lee los datos anteriores y podría cachearlos.
+    """
+    recurso = RECURSOS_CACHEADOS.get(modelo)
+    if recurso is None:
+        return
+    _nueva_generacion(recurso)
+    _metricas.anotar_invalidacion(recurso)
+    transaction.on_commit(lambda: _nueva_generacion(recurso))
+
+
+# -------------------------------------------------------------------
+# 📊 Aciertos y fallos (expuestos en /api/_metrics/)
+# -------------------------------------------------------------------
+class _MetricasCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._contadores = {}
+
+    def _serie(self, recurso):
+        return self._contadores.setdefault(recurso, {'aciertos': 0, 'fallos': 0, 'invalidaciones': 0})
+
+    def anotar(self, recurso, acierto):
+        with self._lock:
+            self._serie(recurso)['aciertos' if acierto else 'fallos'] += 1
+
+    def anotar_invalidacion(self, recurso):
+        with self._lock:
+            self._serie(recurso)['invalidaciones'] += 1
+
+    def copiar(self):
+        with self._lock:
+            return {recurso: dict(serie) for recurso, serie in self._contadores.items()}
+
+    def vaciar(self):
+        with self._lock:
+            self._contadores.clear()
+
+
+_metricas = _MetricasCache()
+
+
+def estadisticas_cache_respuestas():
+    """{recurso: {'aciertos', 'fallos', 'invalidaciones', 'ratio'}} de este proceso."""
+    estadisticas = _metricas.copiar()
+    for serie in estadisticas.values():
+        consultas = serie['aciertos'] + serie['fallos']
+        serie['ratio'] = serie['aciertos'] / consultas if consultas else 0.0
+    return estadisticas
+
+
+def exportar_metricas_cache():
+    """Contadores y ratio de aciertos por recurso en formato de texto de Prometheus."""
+    estadisticas = sorted(estadisticas_cache_respuestas().items())
+    lineas = []
+    for campo, tipo, descripcion in (
+        ('aciertos', 'counter', 'Respuestas servidas desde la caché'),
+        ('fallos', 'counter', 'Respuestas que no estaban en la caché'),
+        ('invalidaciones', 'counter', 'Invalidaciones por cambios en los datos'),
+        ('ratio', 'gauge', 'Fracción de aciertos sobre el total de lecturas'),
+    ):
+        nombre = f'inventario_cache_respuestas_{campo}' + ('_total' if tipo == 'counter' else '')
+        lineas += [f'# HELP {nombre} {descripcion}.', f'# TYPE {nombre} {tipo}']
+        for recurso, serie in estadisticas:
+            valor = f'{serie[campo]:.6f}' if campo == 'ratio' else serie[campo]
+            lineas.append(f'{nombre}{{recurso="{recurso}"}} {valor}')
+    return '\n'.join(lineas) + '\n'
@@ -0,0 +1,172 @@
+# inventario/servicios/cambios.py
+
+import base64
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef
+from django.utils import timezone
+
+from ..models import Cambio, Cliente, Compra, CompactacionCambios, Producto, Proveedor, Venta
+
+__all__ = [
+    'RECURSOS_CAMBIOS', 'LIMITE_CAMBIOS', 'LIMITE_MAXIMO_CAMBIOS', 'DIAS_RETENCION_BAJAS',
+    'CursorCaducadoError', 'cambios_de', 'combinar_cambios', 'anotar_cambios',
+    'codificar_cursor', 'decodificar_cursor', 'horizonte_cambios', 'leer_cambios',
+    'objetos_actuales', 'compactar_cambios',
+]
+
+# Recurso de la API -> modelo cuyas altas, modificaciones y bajas se registran
+RECURSOS_CAMBIOS = {
+    'productos': Producto,
+    'clientes': Cliente,
+    'proveedores': Proveedor,
+    'ventas': Venta,
+    'compras': Compra,
+}
+_RECURSO_DE_MODELO = {modelo: recurso for recurso, modelo in RECURSOS_CAMBIOS.items()}
+
+LIMITE_CAMBIOS = 500
+LIMITE_MAXIMO_CAMBIOS = 2000
+DIAS_RETENCION_BAJAS = 30
+TAMANO_LOTE = 500
+
+# Si un objeto cambia varias veces en la misma operación se anota una sola fila:
+# la baja manda sobre todo y el alta sobre las modificaciones posteriores
+_PRIORIDAD = {Cambio.MODIFICACION: 0, Cambio.ALTA: 1, Cambio.BAJA: 2}
+
+
+class CursorCaducadoError(Exception):
+    """El cursor es anterior a la última compactación: hay que sincronizar desde cero."""
+
+
+# -------------------------------------------------------------------
+# ✍️ Anotar cambios (desde versiones.marcar_cambio)
+# -------------------------------------------------------------------
+def cambios_de(modelo, ids, operacion):
+    """{(recurso, id): operacion} de `ids`; vacío si `modelo` no está en el registro."""
+    recurso = _RECURSO_DE_MODELO.get(modelo)
+    if recurso is None:
+        return {}
+    return {(recurso, pk): operacion for pk in ids}
+
+
+def combinar_cambios(destino, nuevos):
+    """Añade `nuevos` a `destino` quedándose, por objeto, con la operación que manda."""
+    for clave, operacion in nuevos.items():
+        previa = destino.get(clave)
+        if previa is None or _PRIORIDAD[operacion] > _PRIORIDAD[previa]:
+            destino[clave] = operacion
+
+
+def anotar_cambios(cambios):
+    """Un INSERT con todas las filas de `cambios` ({(recurso, id): operacion})."""
+    if not cambios:
+        return
+    ahora = timezone.now()
+    Cambio.objects.bulk_create(
+        [
+            Cambio(recurso=recurso, objeto_id=pk, operacion=operacion, fecha=ahora)
+            for (recurso, pk), operacion in sorted(cambios.items())
+        ],
+        batch_size=TAMANO_LOTE,
+    )
+
+
+# -------------------------------------------------------------------
+# 🔑 Cursor opaco: el id del último cambio entregado
+# -------------------------------------------------------------------
+def codificar_cursor(ultimo_id):
+    crudo = json.dumps({'c': ultimo_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Id del último cambio visto; 0 si no hay cursor. ValueError si no es válido."""
+    if not cursor:
+        return 0
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ultimo_id = json.loads(crudo)['c']
+    except (TypeError, ValueError, KeyError, UnicodeDecodeError) as exc:
+        raise ValueError('Cursor no válido') from exc
+    if not isinstance(ultimo_id, int) or isinstance(ultimo_id, bool) or ultimo_id < 0:
+        raise ValueError('Cursor no válido')
+    return ultimo_id
+
+
+# -------------------------------------------------------------------
+# 📖 Leer el registro
+# -------------------------------------------------------------------
+def horizonte_cambios():
+    """Id hasta el que se han purgado bajas: los cursores anteriores ya no sirven."""
+    return CompactacionCambios.objects.order_by('-id').values_list('horizonte', flat=True).first() or 0
+
+
+def leer_cambios(desde=0, limite=LIMITE_CAMBIOS, recursos=None):
+    """
+    Cambios con id posterior a `desde`, en orden. Devuelve
+    ([(recurso, objeto_id, operacion), ...], último id leído, hay_mas).
+
+    Dentro de la página cada objeto aparece una sola vez, con su última
+    operación. Como la compactación deja sólo la última fila de cada objeto,
+    un alta o modificación puede llegar para algo que el cliente no tiene:
+    ambas se tratan como "insertar o sustituir". Los ids crecen en el orden
+    en que se confirman las transacciones porque SQLite sólo admite un
+    escritor a la vez, así que un cursor nunca se salta un cambio.
+    """
+    if desde and desde < horizonte_cambios():
+        raise CursorCaducadoError
+    filas = Cambio.objects.filter(id__gt=desde).order_by('id')
+    if recursos:
+        filas = filas.filter(recurso__in=recursos)
+    filas = list(filas.values_list('id', 'recurso', 'objeto_id', 'operacion')[:limite + 1])
+    hay_mas = len(filas) > limite
+    filas = filas[:limite]
+
+    ultimos = {}
+    for _, recurso, objeto_id, operacion in filas:
+        ultimos.pop((recurso, objeto_id), None)  # Se reordena a su última aparición
+        ultimos[(recurso, objeto_id)] = operacion
+    cambios = [(recurso, objeto_id, operacion) for (recurso, objeto_id), operacion in ultimos.items()]
+    return cambios, filas[-1][0] if filas else desde, hay_mas
+
+
+def objetos_actuales(recurso, ids):
+    """Queryset con el estado actual de `ids`, listo para el serializer del recurso."""
+    modelo = RECURSOS_CAMBIOS[recurso]
+    queryset = modelo.objects.con_detalles() if modelo in (Venta, Compra) else modelo.objects.all()
+    return queryset.filter(pk__in=ids)
+
+
+# -------------------------------------------------------------------
+# 🧹 Compactar (pensado para ejecutarse con cron)
+# -------------------------------------------------------------------
+def compactar_cambios(dias=DIAS_RETENCION_BAJAS, lote=5000):
+    """
+    Borra las filas superadas por otra posterior del mismo objeto y las bajas
+    con más de `dias` días, en transacciones de `lote` ids para no retener el
+    bloqueo de escritura. Anota la pasada en CompactacionCambios; su
+    horizonte (el id de la última baja purgada) invalida los cursores
+    anteriores. Devuelve cuántas filas se borraron.
+    """
+    ultimo = Cambio.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0
+    posterior = Cambio.objects.filter(
+        recurso=OuterRef('recurso'), objeto_id=OuterRef('objeto_id'), id__gt=OuterRef('id'),
+    )
+    limite_fecha = timezone.now() - timedelta(days=dias)
+    borrados, horizonte = 0, horizonte_cambios()
+
+    for inicio in range(0, ultimo, lote):
+        with transaction.atomic():
+            tramo = Cambio.objects.filter(id__gt=inicio, id__lte=inicio + lote)
+            borrados += tramo.filter(Exists(posterior))._raw_delete(Cambio.objects.db)
+            bajas = tramo.filter(operacion=Cambio.BAJA, fecha__lt=limite_fecha)
+            purgada = bajas.aggregate(ultima=Max('id'))['ultima']
+            if purgada is not None:
+                horizonte = max(horizonte, purgada)
+                borrados += bajas._raw_delete(Cambio.objects.db)
+
+    CompactacionCambios.objects.create(horizonte=horizonte, borrados=borrados)
+    return borrados
@@ -0,0 +1,179 @@
+# inventario/servicios/catalogo.py
+
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from ..models import Cambio, MovimientoStock, Producto, normalizar_nombre
+from .autocompletar import invalidar_autocompletar
+from .historico import anotar_movimientos
+from .stock import bloquear_productos
+from .versiones import agrupar_cambios, marcar_cambio
+
+__all__ = ['FILAS_POR_LOTE', 'ResultadoCatalogo', 'sincronizar_catalogo']
+
+FILAS_POR_LOTE = 2000  # Filas validadas y guardadas en cada transacción
+TAMANO_LOTE = 500      # Filas por INSERT ... ON CONFLICT
+MAX_ERRORES = 1000
+
+# Columnas que, si no vienen en la fila, conservan su valor en los productos existentes
+OPCIONALES = ('descripcion', 'stock')
+
+PRECIO_MAXIMO = Decimal('1e8')  # DecimalField(max_digits=10, decimal_places=2)
+STOCK_MAXIMO = 2147483647       # PositiveIntegerField
+
+
+class ResultadoCatalogo:
+    """Filas insertadas, actualizadas y rechazadas (con su número de fila)."""
+    __slots__ = ('insertados', 'actualizados', 'rechazados', 'errores')
+
+    def __init__(self):
+        self.insertados = 0
+        self.actualizados = 0
+        self.rechazados = 0
+        self.errores = []
+
+    def rechazar(self, numero, errores):
+        self.rechazados += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'fila': numero, 'errores': errores})
+
+    def como_dict(self):
+        return {
+            'insertados': self.insertados, 'actualizados': self.actualizados,
+            'rechazados': self.rechazados, 'errores': self.errores,
+        }
+
+
+# -------------------------------------------------------------------
+# ✅ Validación con las reglas de ProductoSerializer
+# -------------------------------------------------------------------
+def _validar(fila):
+    """Devuelve (valores limpios, errores) de una fila {sku, nombre, precio, [descripcion], [stock]}."""
+    if not isinstance(fila, dict):
+        return None, {'fila': "Debe ser un objeto"}
+    errores, valores = {}, {}
+
+    sku = str(fila.get('sku') or '').strip()
+    if not sku or len(sku) > 50:
+        errores['sku'] = "Obligatorio, de 50 caracteres como máximo"
+    valores['sku'] = sku
+
+    nombre = str(fila.get('nombre') or '').strip()
+    if not nombre or len(nombre) > 100:
+        errores['nombre'] = 'Debe ingresar un nombre válido'
+    valores['nombre'] = nombre
+
+    try:
+        precio = Decimal(str(fila.get('precio')).strip())
+        if not precio.is_finite():
+            raise InvalidOperation
+    except (InvalidOperation, ValueError):
+        errores['precio'] = 'Debe ser un número'
+    else:
+        if not 0 < precio < PRECIO_MAXIMO:
+            errores['precio'] = 'El precio debe ser mayor a 0'
+        else:
+            valores['precio'] = precio.quantize(Decimal('0.01'))
+
+    if fila.get('stock') not in (None, ''):
+        try:
+            stock = int(str(fila['stock']).strip())
+        except ValueError:
+            errores['stock'] = 'Debe ser un número entero'
+        else:
+            if not 0 <= stock <= STOCK_MAXIMO:
+                errores['stock'] = 'El stock no puede ser negativo'
+            valores['stock'] = stock
+
+    if fila.get('descripcion') is not None:
+        valores['descripcion'] = str(fila['descripcion'])
+    return valores, errores
+
+
+# -------------------------------------------------------------------
+# 💾 Upsert por lotes
+# -------------------------------------------------------------------
+def _leer_existentes(skus):
+    """{sku: (id, stock, reservado)} de los SKU que ya existen, con sus filas bloqueadas."""
+    productos = bloquear_productos(Producto.objects.filter(sku__in=skus))
+    return {
+        sku: (pk, stock, reservado)
+        for sku, pk, stock, reservado in productos.values_list('sku', 'id', 'stock', 'reservado')
+    }
+
+
+def _sincronizar_lote(trozo, resultado):
+    validas = {}  # sku -> (número de fila, valores)
+    for numero, fila in trozo:
+        valores, errores = _validar(fila)
+        if not errores and valores['sku'] in validas:
+            errores = {'sku': f"Repetido en la fila {validas[valores['sku']][0]}"}
+        if errores:
+            resultado.rechazar(numero, errores)
+        else:
+            validas[valores['sku']] = (numero, valores)
+    if not validas:
+        return
+
+    movimientos, altas, modificados = [], [], []
+    with transaction.atomic(), agrupar_cambios():
+        # Stock y reservado se leen ya con el bloqueo tomado: ninguna venta
+        # puede moverlos hasta el COMMIT, así que el ajuste anotado y la
+        # comprobación contra lo reservado usan el valor que se sustituye
+        existentes = _leer_existentes(list(validas))
+
+        # Un INSERT ... ON CONFLICT(sku) DO UPDATE por combinación de columnas presentes
+        grupos = defaultdict(list)
+        for sku, (numero, valores) in validas.items():
+            actual = existentes.get(sku)
+            if actual and 'stock' in valores and valores['stock'] < actual[2]:
+                resultado.rechazar(numero, {'stock': 'El stock no puede quedar por debajo de lo reservado'})
+                continue
+            presentes = tuple(campo for campo in OPCIONALES if campo in valores)
+            producto = Producto(nombre_normalizado=normalizar_nombre(valores['nombre']), **valores)
+            grupos[presentes].append(producto)
+
+        for presentes, productos in grupos.items():
+            Producto.objects.bulk_create(
+                productos, batch_size=TAMANO_LOTE,
+                update_conflicts=True, unique_fields=['sku'],
+                update_fields=['nombre', 'nombre_normalizado', 'precio', *presentes],
+            )
+            for producto in productos:
+                actual = existentes.get(producto.sku)
+                if actual is None:
+                    resultado.insertados += 1
+                    altas.append(producto.pk)
+                    movimientos.append((producto.pk, producto.stock, MovimientoStock.INICIAL))
+                else:
+                    resultado.actualizados += 1
+                    modificados.append(actual[0])
+                    if 'stock' in presentes:
+                        movimientos.append((actual[0], producto.stock - actual[1], MovimientoStock.AJUSTE))
+        # Como al editar el stock a mano: alta como stock inicial y cambios como ajuste
+        anotar_movimientos(movimientos)
+        marcar_cambio(Producto, altas, Cambio.ALTA)
+        marcar_cambio(Producto, modificados)
+
+
+def sincronizar_catalogo(filas, lote=FILAS_POR_LOTE):
+    """
+    Da de alta o actualiza por SKU los productos de `filas` (dicts con sku,
+    nombre, precio y, opcionalmente, descripcion y stock) en transacciones de
+    `lote` filas. El precio, el nombre y lo que venga de descripción y stock
+    sustituyen a los actuales; lo que no venga se conserva. Las filas no
+    válidas se rechazan sin afectar al resto.
+    """
+    resultado = ResultadoCatalogo()
+    filas = enumerate(filas, start=1)
+    while True:
+        trozo = list(islice(filas, lote))
+        if not trozo:
+            break
+        _sincronizar_lote(trozo, resultado)
+    # bulk_create no dispara señales: se vacía a mano la caché de autocompletar
+    invalidar_autocompletar(Producto)
+    return resultado
@@ -0,0 +1,165 @@
+# inventario/servicios/eventos.py
+
+import asyncio
+import threading
+from collections import defaultdict, deque
+
+from django.db import transaction
+
+from ..models import Cambio, Compra, Producto, Venta
+
+__all__ = [
+    'MAX_PRODUCTOS_PENDIENTES', 'MAX_PEDIDOS_PENDIENTES',
+    'Suscripcion', 'BusEventos', 'bus_eventos', 'publicar_cambios',
+]
+
+# Lo que puede acumular una conexión que no lee antes de descartarlo y pedir
+# al cliente que recargue (evento 'reinicio')
+MAX_PRODUCTOS_PENDIENTES = 5000
+MAX_PEDIDOS_PENDIENTES = 200
+
+# Recurso del registro de cambios -> (evento, modelo, tercero)
+_PEDIDOS = {
+    'ventas': ('venta', Venta, 'cliente'),
+    'compras': ('compra', Compra, 'proveedor'),
+}
+
+
+# -------------------------------------------------------------------
+# 📬 Buzón de una conexión
+# -------------------------------------------------------------------
+class Suscripcion:
+    """
+    Eventos pendientes de una conexión de /api/eventos/. Sólo se toca desde
+    el bucle de eventos de la conexión (el bus le entrega con
+    call_soon_threadsafe). El stock se fusiona por producto: si cambia diez
+    veces antes de que la conexión lea, sólo se envía el último valor. Los
+    pedidos nuevos se encolan; si la conexión se queda atrás y supera los
+    máximos, se descarta lo pendiente y se le manda un 'reinicio'.
+    """
+    __slots__ = ('loop', '_stock', '_pedidos', '_desbordada', '_aviso')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._stock = {}
+        self._pedidos = deque()
+        self._desbordada = False
+        self._aviso = asyncio.Event()
+
+    def entregar(self, stock, pedidos):
+        self._stock.update(stock)
+        self._pedidos.extend(pedidos)
+        if len(self._stock) > MAX_PRODUCTOS_PENDIENTES or len(self._pedidos) > MAX_PEDIDOS_PENDIENTES:
+            self._stock.clear()
+            self._pedidos.clear()
+            self._desbordada = True
+        self._aviso.set()
+
+    async def siguientes(self, espera):
+        """
+        [(evento, datos), ...] pendientes, esperando como mucho `espera`
+        segundos a que llegue algo; [] si no llega nada.
+        """
+        if not (self._stock or self._pedidos or self._desbordada):
+            try:
+                await asyncio.wait_for(self._aviso.wait(), espera)
+            except TimeoutError:
+                return []
+        self._aviso.clear()
+        if self._desbordada:
+            self._desbordada = False
+            return [('reinicio', {})]
+        eventos = [('stock', datos) for datos in self._stock.values()]
+        eventos += self._pedidos
+        self._stock.clear()
+        self._pedidos.clear()
+        return eventos
+
+
+# -------------------------------------------------------------------
+# 📡 Bus en memoria del proceso
+# -------------------------------------------------------------------
+class BusEventos:
+    """
+    Pub/sub en memoria: publicar() se llama desde cualquier hilo (el de la
+    petición que escribe) y reparte a las suscripciones con una sola llamada
+    por bucle de eventos, no por conexión. Cada proceso tiene el suyo: con
+    varios workers, cada uno avisa de lo que escribe él.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._suscripciones = set()
+
+    def __len__(self):
+        return len(self._suscripciones)
+
+    def suscribir(self):
+        """Nueva suscripción en el bucle de eventos actual (llamar desde código async)."""
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def publicar(self, stock, pedidos):
+        """`stock`: {producto_id: datos}; `pedidos`: [(evento, datos), ...]."""
+        por_bucle = defaultdict(list)
+        with self._lock:
+            for suscripcion in self._suscripciones:
+                por_bucle[suscripcion.loop].append(suscripcion)
+        for loop, suscripciones in por_bucle.items():
+            try:
+                loop.call_soon_threadsafe(_entregar, suscripciones, stock, pedidos)
+            except RuntimeError:
+                # Bucle ya cerrado: sus conexiones no van a volver a leer
+                for suscripcion in suscripciones:
+                    self.cancelar(suscripcion)
+
+
+def _entregar(suscripciones, stock, pedidos):
+    for suscripcion in suscripciones:
+        suscripcion.entregar(stock, pedidos)
+
+
+bus_eventos = BusEventos()
+
+
+# -------------------------------------------------------------------
+# 📣 Publicar los cambios de una operación (desde versiones.marcar_cambio)
+# -------------------------------------------------------------------
+def publicar_cambios(cambios):
+    """
+    Al confirmarse la transacción, publica el stock actual de los productos
+    de `cambios` ({(recurso, id): operacion}) y las ventas y compras nuevas.
+    Sin suscriptores no hace nada; con ellos, una consulta por modelo.
+    """
+    if not cambios or not len(bus_eventos):
+        return
+    productos, pedidos = [], defaultdict(list)
+    for (recurso, pk), operacion in cambios.items():
+        if recurso == 'productos' and operacion != Cambio.BAJA:
+            productos.append(pk)
+        elif recurso in _PEDIDOS and operacion == Cambio.ALTA:
+            pedidos[recurso].append(pk)
+    if productos or pedidos:
+        transaction.on_commit(lambda: _publicar(productos, pedidos), robust=True)
+
+
+def _publicar(producto_ids, pedido_ids):
+    stock = {
+        pk: {'id': pk, 'stock': existencias, 'reservado': reservado, 'disponible': existencias - reservado}
+        for pk, existencias, reservado in Producto.objects.filter(pk__in=producto_ids)
+        .values_list('id', 'stock', 'reservado')
+    }
+    pedidos = []
+    for recurso, ids in pedido_ids.items():
+        evento, modelo, tercero = _PEDIDOS[recurso]
+        pedidos += [
+            (evento, datos)
+            for datos in modelo.objects.filter(pk__in=ids).order_by('id').values('id', tercero, 'fecha', 'total')
+        ]
+    if stock or pedidos:
+        bus_eventos.publicar(stock, pedidos)
@@ -0,0 +1,129 @@
+# inventario/servicios/exportacion.py
+
+import csv
+import io
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+
+__all__ = ['FORMATOS_EXPORTACION', 'COLUMNAS_EXPORTACION', 'exportar']
+
+# Filas que se leen de la BD de cada vez y que se envían juntas al cliente
+TAMANO_LOTE = 2000
+FILAS_POR_TROZO = 500
+
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# (nombre de la columna, campo del ORM). Sólo se leen estas columnas, con
+# JOIN para los nombres: nada de instancias de modelo ni prefetch por fila.
+COLUMNAS_EXPORTACION = {
+    'ventas': [
+        ('venta', 'venta_id'),
+        ('fecha', 'venta__fecha'),
+        ('cliente_id', 'venta__cliente_id'),
+        ('cliente', 'venta__cliente__nombre'),
+        ('total_venta', 'venta__total'),
+        ('linea', 'id'),
+        ('producto_id', 'producto_id'),
+        ('producto', 'producto__nombre'),
+        ('cantidad', 'cantidad'),
+        ('precio_unitario', 'precio_unitario'),
+        ('subtotal', 'subtotal'),
+    ],
+    'compras': [
+        ('compra', 'compra_id'),
+        ('fecha', 'compra__fecha'),
+        ('proveedor_id', 'compra__proveedor_id'),
+        ('proveedor', 'compra__proveedor__nombre'),
+        ('total_compra', 'compra__total'),
+        ('linea', 'id'),
+        ('producto_id', 'producto_id'),
+        ('producto', 'producto__nombre'),
+        ('cantidad', 'cantidad'),
+        ('precio_unitario', 'precio_unitario'),
+        ('subtotal', 'subtotal'),
+    ],
+    'stock': [
+        ('producto_id', 'id'),
+        ('nombre', 'nombre'),
+        ('precio', 'precio'),
+        ('stock', 'stock'),
+        ('reservado', 'reservado'),
+        ('disponible', 'disponible'),
+        ('archivado', 'archivado'),
+    ],
+}
+
+# Orden por la FK de la cabecera y el id de la línea: lo da el índice de la
+# FK, así SQLite no tiene que leer y ordenar todo antes de devolver la primera fila
+ORDEN_EXPORTACION = {
+    'ventas': ('venta_id', 'id'),
+    'compras': ('compra_id', 'id'),
+    'stock': ('id',),
+}
+
+
+def _filas(recurso, queryset):
+    if recurso == 'stock':
+        queryset = queryset.annotate(disponible=F('stock') - F('reservado'))
+    campos = [campo for _, campo in COLUMNAS_EXPORTACION[recurso]]
+    return (
+        queryset.order_by(*ORDEN_EXPORTACION[recurso])
+        .values_list(*campos)
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+
+
+def _valor_csv(valor):
+    if valor is None:
+        return ''
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+
+def _en_csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    yield buffer.getvalue()  # La cabecera sale antes de lanzar la consulta
+    buffer.seek(0)
+    buffer.truncate()
+    for n, fila in enumerate(filas, start=1):
+        escritor.writerow([_valor_csv(v) for v in fila])
+        if n % FILAS_POR_TROZO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _en_ndjson(columnas, filas):
+    trozo = []
+    for fila in filas:
+        trozo.append(json.dumps(dict(zip(columnas, fila)), cls=DjangoJSONEncoder, ensure_ascii=False))
+        if len(trozo) == FILAS_POR_TROZO:
+            yield '\n'.join(trozo) + '\n'
+            trozo = []
+    if trozo:
+        yield '\n'.join(trozo) + '\n'
+
+
+def exportar(recurso, queryset, formato='csv'):
+    """
+    Generador con el contenido de la exportación de `recurso` ('ventas' o
+    'compras' reciben un queryset de líneas, 'stock' uno de productos), en
+    trozos de texto para un StreamingHttpResponse. La consulta se lee con
+    un cursor por lotes de TAMANO_LOTE, así que la memoria no crece con el
+    tamaño de la exportación.
+    """
+    columnas = [nombre for nombre, _ in COLUMNAS_EXPORTACION[recurso]]
+    filas = _filas(recurso, queryset)
+    if formato == 'ndjson':
+        return _en_ndjson(columnas, filas)
+    return _en_csv(columnas, filas)
@@ -0,0 +1,101 @@
+# inventario/servicios/historico.py
+
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.db.models import DateTimeField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ..models import MovimientoStock, Producto, SnapshotStock
+
+__all__ = ['interpretar_fecha', 'anotar_movimientos', 'crear_snapshots', 'productos_con_stock_en_fecha', 'stock_en_fecha']
+
+TAMANO_LOTE = 2000
+_ORIGEN_DE_LOS_TIEMPOS = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+# -------------------------------------------------------------------
+# ✍️ Escribir en el histórico
+# -------------------------------------------------------------------
+def anotar_movimientos(movimientos, fecha=None):
+    """
+    Inserta en un solo INSERT los movimientos [(producto_id, cantidad, origen), ...].
+    Los de cantidad 0 no se guardan.
+    """
+    fecha = fecha or timezone.now()
+    filas = [
+        MovimientoStock(producto_id=producto_id, cantidad=cantidad, origen=origen, fecha=fecha)
+        for producto_id, cantidad, origen in movimientos if cantidad
+    ]
+    if filas:
+        MovimientoStock.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+
+
+def crear_snapshots(fecha=None, lote=TAMANO_LOTE):
+    """
+    Guarda el stock actual de todos los productos como foto en `fecha`.
+    Pensado para ejecutarse periódicamente (manage.py snapshot_stock).
+    """
+    fecha = fecha or timezone.now()
+    creadas, filas = 0, []
+    for producto_id, stock in Producto.objects.values_list('id', 'stock').iterator(chunk_size=lote):
+        filas.append(SnapshotStock(producto_id=producto_id, fecha=fecha, stock=stock))
+        if len(filas) >= lote:
+            SnapshotStock.objects.bulk_create(filas)
+            creadas, filas = creadas + len(filas), []
+    SnapshotStock.objects.bulk_create(filas)
+    return creadas + len(filas)
+
+
+# -------------------------------------------------------------------
+# 🕰️ Stock en una fecha: foto más cercana + movimientos posteriores
+# -------------------------------------------------------------------
+def productos_con_stock_en_fecha(fecha, productos=None):
+    """
+    Anota en cada producto `stock_en_fecha`: el stock de la última foto anterior
+    a `fecha` más la suma de los movimientos entre esa foto y `fecha`.
+    Ambas subconsultas usan los índices (producto, fecha), así que el coste
+    depende de la frecuencia de las fotos y no del tamaño del histórico.
+    """
+    productos = Producto.objects.all() if productos is None else productos
+    ultima_foto = SnapshotStock.objects.filter(
+        producto=OuterRef('pk'), fecha__lte=fecha
+    ).order_by('-fecha')
+
+    productos = productos.annotate(
+        foto_fecha=Subquery(ultima_foto.values('fecha')[:1]),
+        foto_stock=Subquery(ultima_foto.values('stock')[:1]),
+    )
+    desde = Coalesce(OuterRef('foto_fecha'), Value(_ORIGEN_DE_LOS_TIEMPOS), output_field=DateTimeField())
+    deltas = (
+        MovimientoStock.objects
+        .filter(producto=OuterRef('pk'), fecha__gt=desde, fecha__lte=fecha)
+        .values('producto')
+        .annotate(suma=Sum('cantidad'))
+        .values('suma')
+    )
+    return productos.annotate(
+        stock_en_fecha=Coalesce('foto_stock', Value(0)) + Coalesce(Subquery(deltas), Value(0), output_field=IntegerField())
+    )
+
+
+def stock_en_fecha(producto_id, fecha):
+    fila = productos_con_stock_en_fecha(fecha, Producto.objects.filter(pk=producto_id)).values('stock_en_fecha').first()
+    return fila['stock_en_fecha'] if fila else None
+
+
+def interpretar_fecha(valor):
+    """
+    Acepta 'AAAA-MM-DD' (se toma el final de ese día) o una fecha ISO con hora.
+    Devuelve None si el texto no es una fecha válida.
+    """
+    fecha = parse_datetime(valor or '')
+    if fecha is None:
+        dia = parse_date(valor or '')
+        if dia is None:
+            return None
+        fecha = datetime.combine(dia, time.max)
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    return fecha
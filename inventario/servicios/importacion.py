@@ -0,0 +1,314 @@
+# inventario/servicios/importacion.py
+
+import csv
+import json
+import re
+import time
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from ..models import (
+    Cambio, Cliente, Compra, DetalleCompra, DetalleVenta, MovimientoStock, Producto, Proveedor, Venta,
+)
+from .reservas import liberar_caducadas
+from .stock import StockInsuficienteError
+from .unidad_trabajo import diferir_recalculos, registrar_movimiento
+from .versiones import marcar_cambio
+
+__all__ = [
+    'FORMATOS_IMPORTACION', 'ResultadoImportacion', 'leer_registros',
+    'importar_ventas', 'importar_compras',
+]
+
+REGISTROS_POR_LOTE = 1000  # Pedidos validados y guardados en cada transacción
+TAMANO_LOTE = 500          # Filas por INSERT
+MAX_ERRORES = 1000         # Errores que se detallan; del resto sólo se cuentan
+
+FORMATOS_IMPORTACION = ('ndjson', 'csv')
+PRECIO_MAXIMO = Decimal('1e8')  # DecimalField(max_digits=10, decimal_places=2)
+
+
+class _Tipo:
+    __slots__ = ('cabecera', 'linea', 'campo_cabecera', 'tercero', 'modelo_tercero', 'signo', 'origen')
+
+    def __init__(self, cabecera, linea, campo_cabecera, tercero, modelo_tercero, signo, origen):
+        self.cabecera = cabecera
+        self.linea = linea
+        self.campo_cabecera = campo_cabecera
+        self.tercero = tercero
+        self.modelo_tercero = modelo_tercero
+        self.signo = signo
+        self.origen = origen
+
+
+VENTAS = _Tipo(Venta, DetalleVenta, 'venta', 'cliente', Cliente, -1, MovimientoStock.VENTA)
+COMPRAS = _Tipo(Compra, DetalleCompra, 'compra', 'proveedor', Proveedor, +1, MovimientoStock.COMPRA)
+
+
+class ResultadoImportacion:
+    """Pedidos y líneas creados y errores por registro (número de línea del fichero)."""
+    __slots__ = ('creados', 'lineas', 'errores', 'total_errores', 'segundos')
+
+    def __init__(self):
+        self.creados = 0
+        self.lineas = 0
+        self.errores = []
+        self.total_errores = 0
+        self.segundos = 0.0
+
+    def anotar_error(self, numero, errores):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES:
+            self.errores.append({'registro': numero, 'errores': errores})
+
+    def como_dict(self):
+        return {
+            'creados': self.creados, 'lineas': self.lineas,
+            'total_errores': self.total_errores, 'errores': self.errores,
+            'segundos': round(self.segundos, 3),
+        }
+
+
+# -------------------------------------------------------------------
+# 📖 Lectura incremental del fichero
+# -------------------------------------------------------------------
+def leer_registros(lineas, formato, tercero):
+    """
+    Genera (número de línea, registro o None, error o None) leyendo `lineas`
+    (cualquier iterable de str, p. ej. un fichero abierto) sin cargarlo entero.
+
+    - ndjson: un pedido por línea, como en la API:
+        {"cliente": 3, "detalles": [{"producto": 1, "cantidad": 2, "precio_unitario": "3.50"}]}
+    - csv: una línea de pedido por fila con las columnas pedido, <tercero>,
+      producto, cantidad y precio_unitario. Las filas seguidas con el mismo
+      'pedido' forman un solo pedido (sin esa columna, cada fila es uno).
+    """
+    if formato == 'ndjson':
+        for numero, linea in enumerate(lineas, start=1):
+            if not linea.strip():
+                continue
+            try:
+                registro = json.loads(linea)
+            except ValueError as exc:
+                yield numero, None, {'registro': f"JSON no válido: {exc}"}
+                continue
+            if not isinstance(registro, dict):
+                yield numero, None, {'registro': "Debe ser un objeto JSON"}
+                continue
+            yield numero, registro, None
+        return
+
+    lector = csv.DictReader(lineas)
+    actual, clave, numero = None, None, 0
+    for fila in lector:
+        linea = {campo: fila.get(campo) for campo in ('producto', 'cantidad', 'precio_unitario')}
+        pedido = fila.get('pedido') or None
+        if actual is not None and pedido is not None and pedido == clave:
+            actual['detalles'].append(linea)
+            continue
+        if actual is not None:
+            yield numero, actual, None
+        actual, clave, numero = {tercero: fila.get(tercero), 'detalles': [linea]}, pedido, lector.line_num
+    if actual is not None:
+        yield numero, actual, None
+
+
+# -------------------------------------------------------------------
+# ✅ Validación de un registro con los datos precargados del lote
+# -------------------------------------------------------------------
+_ENTERO = re.compile(r'[+-]?[0-9]+')
+
+
+def _entero(valor):
+    """
+    Un int de JSON o un texto con un entero ('12' en CSV); None para todo lo
+    demás. int() truncaría 2.7 a 2 y convertiría true en 1, que
+    VentaSerializer rechaza.
+    """
+    if isinstance(valor, bool):
+        return None
+    if isinstance(valor, int):
+        return valor
+    if isinstance(valor, str) and _ENTERO.fullmatch(valor.strip()):
+        return int(valor)
+    return None
+
+
+def _validar(registro, tipo, terceros, productos):
+    """Devuelve (tercero_id, [(producto_id, cantidad, precio_unitario), ...], errores)."""
+    errores = {}
+    tercero_id = _entero(registro.get(tipo.tercero))
+    if tercero_id not in terceros:
+        errores[tipo.tercero] = "No existe"
+
+    detalles = registro.get('detalles')
+    if not isinstance(detalles, list) or not detalles:
+        errores['detalles'] = "Debe incluir al menos una línea"
+        return tercero_id, [], errores
+
+    lineas = []
+    for i, detalle in enumerate(detalles):
+        if not isinstance(detalle, dict):
+            errores[f'detalles[{i}]'] = "Debe ser un objeto"
+            continue
+        producto_id = _entero(detalle.get('producto'))
+        cantidad = _entero(detalle.get('cantidad'))
+        try:
+            precio = Decimal(str(detalle.get('precio_unitario')))
+        except (InvalidOperation, ValueError):
+            precio = None
+        if producto_id not in productos:
+            errores[f'detalles[{i}].producto'] = "No existe"
+        if cantidad is None or cantidad <= 0:
+            errores[f'detalles[{i}].cantidad'] = "Debe ser un entero positivo"
+        if precio is None or not precio.is_finite() or not 0 <= precio < PRECIO_MAXIMO:
+            errores[f'detalles[{i}].precio_unitario'] = "Debe ser un número no negativo"
+        else:
+            precio = precio.quantize(Decimal('0.01'))
+        lineas.append((producto_id, cantidad, precio))
+
+    if 'total' in registro and not errores:
+        total = sum(cantidad * precio for _, cantidad, precio in lineas)
+        try:
+            if round(Decimal(str(registro['total'])), 2) != round(total, 2):
+                errores['total'] = f"No coincide con la suma de los subtotales ({total:.2f})"
+        except (InvalidOperation, ValueError, OverflowError):
+            errores['total'] = "Debe ser un número"
+    return tercero_id, lineas, errores
+
+
+# -------------------------------------------------------------------
+# 💾 Guardar un lote: INSERT en bloque y un UPDATE de stock por producto
+# -------------------------------------------------------------------
+def _validar_lote(tipo, trozo):
+    """([(número, errores)], [(número, tercero_id, líneas)]) con el stock leído ahora."""
+    ids_terceros, ids_productos = set(), set()
+    for _, registro, _ in trozo:
+        if registro is None:
+            continue
+        ids_terceros.add(_entero(registro.get(tipo.tercero)))
+        detalles = registro.get('detalles')
+        if isinstance(detalles, list):
+            ids_productos.update(_entero(d.get('producto')) for d in detalles if isinstance(d, dict))
+    ids_terceros.discard(None)
+    ids_productos.discard(None)
+
+    # Una consulta por modelo para todo el lote, sólo con las columnas necesarias
+    terceros = set(tipo.modelo_tercero.objects.filter(pk__in=ids_terceros).values_list('id', flat=True))
+    productos = {
+        pk: stock - reservado
+        for pk, stock, reservado in Producto.objects.filter(pk__in=ids_productos).values_list('id', 'stock', 'reservado')
+    }
+
+    rechazados, validos = [], []
+    for numero, registro, error in trozo:
+        if error:
+            rechazados.append((numero, error))
+            continue
+        tercero_id, lineas, errores = _validar(registro, tipo, terceros, productos)
+        if not errores and tipo.signo < 0:
+            # Las ventas se aceptan en orden mientras quede stock disponible
+            pedidas = defaultdict(int)
+            for producto_id, cantidad, _ in lineas:
+                pedidas[producto_id] += cantidad
+            sin_stock = [pk for pk, cantidad in pedidas.items() if productos[pk] < cantidad]
+            if sin_stock:
+                errores['detalles'] = f"No hay suficiente stock del producto #{sin_stock[0]}"
+            else:
+                for producto_id, cantidad in pedidas.items():
+                    productos[producto_id] -= cantidad
+        if errores:
+            rechazados.append((numero, errores))
+        else:
+            validos.append((numero, tercero_id, lineas))
+    return rechazados, validos
+
+
+def _guardar_lote(tipo, validos):
+    """(pedidos, líneas) creados; StockInsuficienteError deshace todo el lote."""
+    with diferir_recalculos():
+        cabeceras = [
+            tipo.cabecera(**{f'{tipo.tercero}_id': tercero_id},
+                          total=sum(cantidad * precio for _, cantidad, precio in lineas))
+            for _, tercero_id, lineas in validos
+        ]
+        tipo.cabecera.objects.bulk_create(cabeceras, batch_size=TAMANO_LOTE)
+
+        filas, deltas = [], defaultdict(int)
+        for cabecera, (_, _, lineas) in zip(cabeceras, validos):
+            for producto_id, cantidad, precio in lineas:
+                filas.append(tipo.linea(
+                    **{f'{tipo.campo_cabecera}_id': cabecera.pk},
+                    producto_id=producto_id, cantidad=cantidad,
+                    precio_unitario=precio, subtotal=cantidad * precio,
+                ))
+                deltas[producto_id] += tipo.signo * cantidad
+        tipo.linea.objects.bulk_create(filas, batch_size=TAMANO_LOTE)
+        marcar_cambio(tipo.cabecera, [cabecera.pk for cabecera in cabeceras], Cambio.ALTA)
+        marcar_cambio(tipo.linea)
+
+        # Se aplican al salir del bloque: un UPDATE por producto y un INSERT en el histórico
+        for producto_id, delta in deltas.items():
+            registrar_movimiento(producto_id, delta, tipo.origen)
+    return len(cabeceras), len(filas)
+
+
+def _importar_lote(tipo, trozo, resultado, reintentar=True):
+    rechazados, validos = _validar_lote(tipo, trozo)
+    creados = lineas = 0
+    if validos:
+        try:
+            creados, lineas = _guardar_lote(tipo, validos)
+        except StockInsuficienteError:
+            if reintentar:
+                # Otra venta se ha llevado el stock entre la lectura y el UPDATE:
+                # se vuelve a validar el lote con el stock de ahora, una sola vez
+                return _importar_lote(tipo, trozo, resultado, reintentar=False)
+            # Si vuelve a pasar, registro a registro: sólo se rechazan los que no tienen stock
+            for valido in validos:
+                try:
+                    uno, filas = _guardar_lote(tipo, [valido])
+                except StockInsuficienteError as exc:
+                    rechazados.append((valido[0], {'detalles': str(exc)}))
+                else:
+                    creados, lineas = creados + uno, lineas + filas
+
+    for numero, errores in sorted(rechazados, key=lambda par: par[0]):
+        resultado.anotar_error(numero, errores)
+    resultado.creados += creados
+    resultado.lineas += lineas
+
+
+def _importar(tipo, lineas, formato, lote):
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+    if tipo.signo < 0:
+        liberar_caducadas()  # Para no rechazar ventas por reservas que ya no retienen nada
+    registros = leer_registros(lineas, formato, tipo.tercero)
+    while True:
+        trozo = list(islice(registros, lote))
+        if not trozo:
+            break
+        _importar_lote(tipo, trozo, resultado)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+# -------------------------------------------------------------------
+# 📥 Puntos de entrada
+# -------------------------------------------------------------------
+def importar_ventas(lineas, formato='ndjson', lote=REGISTROS_POR_LOTE):
+    """
+    Da de alta las ventas de `lineas` (ver leer_registros) en transacciones
+    de `lote` ventas. Los registros con errores se saltan y se anotan en el
+    resultado sin deshacer el resto. Como en la API, el stock se descuenta
+    y queda anotado en el histórico; el total de cada venta es la suma de
+    sus líneas.
+    """
+    return _importar(VENTAS, lineas, formato, lote)
+
+
+def importar_compras(lineas, formato='ndjson', lote=REGISTROS_POR_LOTE):
+    """Como importar_ventas(), pero da de alta compras y suma el stock."""
+    return _importar(COMPRAS, lineas, formato, lote)
@@ -0,0 +1,127 @@
+# inventario/servicios/lineas.py
+
+from collections import defaultdict
+
+from ..models import DetalleCompra, DetalleVenta, MovimientoStock
+from .stock import deltas_de_linea
+from .unidad_trabajo import (
+    diferir_recalculos, registrar_movimiento,
+    marcar_total_compra, marcar_total_venta,
+)
+from .versiones import marcar_cambio
+
+__all__ = [
+    'crear_lineas_compra_en_bloque', 'crear_lineas_venta_en_bloque',
+    'sincronizar_lineas_compra', 'sincronizar_lineas_venta',
+]
+
+TAMANO_LOTE = 500
+_ORIGENES = {DetalleCompra: MovimientoStock.COMPRA, DetalleVenta: MovimientoStock.VENTA}
+
+
+def _crear_lineas_en_bloque(modelo, campo_cabecera, cabecera, detalles_data, signo, marcar_total):
+    """
+    Inserta todas las líneas con bulk_create (sin señales por fila) y aplica
+    lo mismo que harían las señales: subtotal de cada línea, un movimiento de
+    stock por producto y un único recálculo del total de la cabecera.
+    """
+    origen = _ORIGENES[modelo]
+    lineas = []
+    deltas = defaultdict(int)
+    for detalle in detalles_data:
+        linea = modelo(**{campo_cabecera: cabecera}, **detalle)
+        linea.subtotal = linea.cantidad * linea.precio_unitario
+        lineas.append(linea)
+        deltas[linea.producto_id] += signo * linea.cantidad
+
+    with diferir_recalculos():
+        modelo.objects.bulk_create(lineas, batch_size=TAMANO_LOTE)
+        marcar_cambio(modelo)
+        for producto_id, delta in deltas.items():
+            registrar_movimiento(producto_id, delta, origen)
+        marcar_total(cabecera.pk)
+
+    for linea in lineas:
+        linea.recordar_stock()
+    return lineas
+
+
+def crear_lineas_compra_en_bloque(compra, detalles_data):
+    return _crear_lineas_en_bloque(DetalleCompra, 'compra', compra, detalles_data, +1, marcar_total_compra)
+
+
+def crear_lineas_venta_en_bloque(venta, detalles_data):
+    return _crear_lineas_en_bloque(DetalleVenta, 'venta', venta, detalles_data, -1, marcar_total_venta)
+
+
+# -------------------------------------------------------------------
+# 🔀 Sincronizar las líneas de una cabecera aplicando sólo el diff
+# -------------------------------------------------------------------
+CAMPOS_LINEA = ['producto', 'cantidad', 'precio_unitario', 'subtotal']
+
+
+def _sincronizar_lineas(modelo, campo_cabecera, cabecera, detalles_data, signo, marcar_total):
+    """
+    Compara las líneas enviadas con las guardadas y aplica sólo las diferencias:
+    - una línea con 'id' de esta cabecera (o, sin 'id', la primera pendiente del
+      mismo producto) se actualiza si ha cambiado,
+    - las que no casan con ninguna guardada se insertan,
+    - las guardadas que no aparecen se borran.
+    El stock se mueve por el neto de cada producto y el total se recalcula una vez.
+    """
+    origen = _ORIGENES[modelo]
+    existentes = list(modelo.objects.filter(**{campo_cabecera: cabecera}).order_by('id'))
+    pendientes = {linea.id: linea for linea in existentes}
+
+    a_crear, a_actualizar = [], []
+    deltas = defaultdict(int)
+    for detalle in detalles_data:
+        detalle = dict(detalle)
+        linea_id = detalle.pop('id', None)
+        linea = pendientes.pop(linea_id, None) if linea_id is not None else None
+        if linea is None and linea_id is None:
+            linea = next((l for l in pendientes.values() if l.producto_id == detalle['producto'].id), None)
+            if linea is not None:
+                del pendientes[linea.id]
+
+        if linea is None:
+            linea = modelo(**{campo_cabecera: cabecera}, **detalle)
+            linea.subtotal = linea.cantidad * linea.precio_unitario
+            a_crear.append(linea)
+            deltas[linea.producto_id] += signo * linea.cantidad
+            continue
+
+        if (linea.producto_id, linea.cantidad, linea.precio_unitario) == (
+                detalle['producto'].id, detalle['cantidad'], detalle['precio_unitario']):
+            continue
+        for campo, valor in detalle.items():
+            setattr(linea, campo, valor)
+        linea.subtotal = linea.cantidad * linea.precio_unitario
+        a_actualizar.append(linea)
+        for producto_id, delta in deltas_de_linea(linea, signo):
+            deltas[producto_id] += delta
+
+    with diferir_recalculos():
+        if a_actualizar:
+            modelo.objects.bulk_update(a_actualizar, CAMPOS_LINEA, batch_size=TAMANO_LOTE)
+        if a_crear:
+            modelo.objects.bulk_create(a_crear, batch_size=TAMANO_LOTE)
+        if a_actualizar or a_crear:
+            marcar_cambio(modelo)  # bulk_update/bulk_create no disparan señales
+        if pendientes:
+            # Las señales post_delete devuelven el stock de las líneas borradas
+            modelo.objects.filter(pk__in=list(pendientes)).delete()
+        for producto_id, delta in deltas.items():
+            registrar_movimiento(producto_id, delta, origen)
+        marcar_total(cabecera.pk)
+
+    for linea in a_crear + a_actualizar:
+        linea.recordar_stock()
+
+
+def sincronizar_lineas_compra(compra, detalles_data):
+    _sincronizar_lineas(DetalleCompra, 'compra', compra, detalles_data, +1, marcar_total_compra)
+
+
+def sincronizar_lineas_venta(venta, detalles_data):
+    _sincronizar_lineas(DetalleVenta, 'venta', venta, detalles_data, -1, marcar_total_venta)
@@ -0,0 +1,126 @@
+# inventario/servicios/reconciliacion.py
+
+from django.db import transaction
+from django.db.models import Exists, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from ..models import DetalleCompra, DetalleVenta, MovimientoStock, Producto
+from .historico import anotar_movimientos
+from .stock import bloquear_productos
+from .versiones import marcar_cambio
+
+__all__ = ['Discrepancia', 'buscar_discrepancias', 'corregir_discrepancias']
+
+TAMANO_LOTE = 5000
+
+
+class Discrepancia:
+    __slots__ = ('producto_id', 'nombre', 'actual', 'esperado', 'reservado', 'con_inicial')
+
+    def __init__(self, producto_id, nombre, actual, esperado, reservado, con_inicial):
+        self.producto_id = producto_id
+        self.nombre = nombre
+        self.actual = actual
+        self.esperado = esperado
+        self.reservado = reservado
+        # Los productos dados de alta antes del histórico no tienen stock inicial
+        # anotado, así que su valor esperado no es fiable
+        self.con_inicial = con_inicial
+
+    @property
+    def diferencia(self):
+        return self.esperado - self.actual
+
+    @property
+    def corregible(self):
+        # No se puede dejar el stock en negativo ni por debajo de lo reservado
+        return self.esperado >= max(self.reservado, 0)
+
+
+def _suma(queryset, campo='cantidad'):
+    suma = queryset.filter(producto=OuterRef('pk')).values('producto').annotate(s=Sum(campo)).values('s')
+    return Coalesce(Subquery(suma), Value(0), output_field=IntegerField())
+
+
+def _stock_esperado():
+    """
+    Stock que implican las tablas de detalle:
+        stock inicial y ajustes manuales (histórico)
+      + unidades compradas (DetalleCompra)
+      - unidades vendidas (DetalleVenta)
+    Las correcciones de reconciliaciones anteriores no cuentan, porque son
+    justo la diferencia que se está midiendo.
+    """
+    base = MovimientoStock.objects.filter(origen__in=[MovimientoStock.INICIAL, MovimientoStock.AJUSTE])
+    return _suma(base) + _suma(DetalleCompra.objects) - _suma(DetalleVenta.objects)
+
+
+# -------------------------------------------------------------------
+# 🔍 Buscar productos cuyo stock no cuadra, por lotes de ids
+# -------------------------------------------------------------------
+def buscar_discrepancias(lote=TAMANO_LOTE):
+    """
+    Recorre los productos por rangos de id (paginación por clave, sin OFFSET)
+    y devuelve, lote a lote, la lista de Discrepancia. Cada lote es una sola
+    consulta con subconsultas agrupadas que usan los índices por producto, así
+    que la memoria no depende del número de líneas de compra y venta.
+    """
+    ultimo_id = 0
+    while True:
+        filas = list(
+            Producto.objects.filter(pk__gt=ultimo_id).order_by('pk')
+            .annotate(
+                esperado=_stock_esperado(),
+                con_inicial=Exists(MovimientoStock.objects.filter(
+                    producto=OuterRef('pk'), origen=MovimientoStock.INICIAL
+                )),
+            )
+            .values_list('pk', 'nombre', 'stock', 'esperado', 'reservado', 'con_inicial')[:lote]
+        )
+        if not filas:
+            return
+        ultimo_id = filas[-1][0]
+        yield [Discrepancia(*fila) for fila in filas if fila[2] != fila[3]]
+
+
+# -------------------------------------------------------------------
+# 🛠️ Corregir un lote con un único UPDATE
+# -------------------------------------------------------------------
+def corregir_discrepancias(discrepancias, incluir_sin_inicial=False):
+    """
+    Deja el stock de cada producto en su valor esperado con un solo bulk_update
+    y anota la corrección en el histórico. Los productos sin stock inicial en
+    el histórico sólo se corrigen si se pide. Antes se bloquean y se vuelven a
+    leer: los que se han movido desde buscar_discrepancias() no se tocan (el
+    valor esperado ya no vale). Devuelve (corregidos, lista de los que cambiaron).
+    """
+    corregibles = [
+        d for d in discrepancias
+        if d.corregible and (d.con_inicial or incluir_sin_inicial)
+    ]
+    if not corregibles:
+        return 0, []
+    with transaction.atomic():
+        actuales = {
+            pk: (stock, reservado)
+            for pk, stock, reservado in bloquear_productos(
+                Producto.objects.filter(pk__in=[d.producto_id for d in corregibles])
+            ).values_list('pk', 'stock', 'reservado')
+        }
+        vigentes, cambiadas = [], []
+        for d in corregibles:
+            stock, reservado = actuales.get(d.producto_id, (None, None))
+            if stock == d.actual and d.esperado >= reservado:
+                vigentes.append(d)
+            else:
+                cambiadas.append(d)
+        if vigentes:
+            Producto.objects.bulk_update(
+                [Producto(pk=d.producto_id, stock=d.esperado) for d in vigentes],
+                ['stock'], batch_size=TAMANO_LOTE,
+            )
+            anotar_movimientos(
+                (d.producto_id, d.diferencia, MovimientoStock.RECONCILIACION) for d in vigentes
+            )
+            marcar_cambio(Producto, [d.producto_id for d in vigentes])  # bulk_update no dispara señales
+    return len(vigentes), cambiadas
@@ -0,0 +1,140 @@
+# inventario/servicios/reservas.py
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Producto, Reserva, Venta
+from .lineas import crear_lineas_venta_en_bloque
+from .stock import StockInsuficienteError
+from .unidad_trabajo import diferir_recalculos
+from .versiones import marcar_cambio
+
+__all__ = [
+    'MINUTOS_POR_DEFECTO', 'MINUTOS_MAXIMOS', 'ReservaNoValidaError',
+    'reservar', 'liberar', 'liberar_caducadas', 'confirmar_reservas',
+]
+
+MINUTOS_POR_DEFECTO = 15
+MINUTOS_MAXIMOS = 24 * 60
+TAMANO_LOTE = 1000
+
+
+class ReservaNoValidaError(Exception):
+    pass
+
+
+def _retener(producto_id, cantidad):
+    # UPDATE producto SET reservado = reservado + n WHERE id = ... AND stock >= reservado + n
+    retenidas = (
+        Producto.objects
+        .filter(pk=producto_id, stock__gte=F('reservado') + cantidad)
+        .update(reservado=F('reservado') + cantidad)
+    )
+    if retenidas:
+        marcar_cambio(Producto, [producto_id])  # Cambia el stock disponible que devuelve la API
+    return retenidas
+
+
+def _soltar(cantidades_por_producto):
+    for producto_id in sorted(cantidades_por_producto):
+        Producto.objects.filter(pk=producto_id).update(
+            reservado=F('reservado') - cantidades_por_producto[producto_id]
+        )
+    if cantidades_por_producto:
+        marcar_cambio(Producto, list(cantidades_por_producto))
+
+
+# -------------------------------------------------------------------
+# 🔒 Crear y liberar reservas
+# -------------------------------------------------------------------
+def reservar(producto_id, cantidad, minutos=MINUTOS_POR_DEFECTO, usuario=None):
+    """
+    Retiene `cantidad` unidades del producto durante `minutos` con un UPDATE
+    condicional sobre Producto.reservado; si no hay disponibilidad se liberan
+    las reservas caducadas de ese producto y se reintenta una vez.
+    """
+    with transaction.atomic():
+        if not _retener(producto_id, cantidad):
+            if not (liberar_caducadas(producto_id=producto_id) and _retener(producto_id, cantidad)):
+                raise StockInsuficienteError(producto_id, cantidad)
+        return Reserva.objects.create(
+            producto_id=producto_id, cantidad=cantidad, usuario=usuario,
+            expira=timezone.now() + timedelta(minutes=minutos),
+        )
+
+
+def liberar(reserva):
+    with transaction.atomic():
+        # Si ya la había liberado otro proceso (p. ej. el barrido) no se descuenta dos veces
+        if Reserva.objects.filter(pk=reserva.pk).delete()[0]:
+            _soltar({reserva.producto_id: reserva.cantidad})
+
+
+def liberar_caducadas(producto_id=None, lote=TAMANO_LOTE):
+    """
+    Borra las reservas caducadas por lotes (usando el índice sobre 'expira')
+    y descuenta de cada producto lo que tenía retenido. Devuelve cuántas se liberaron.
+    """
+    liberadas = 0
+    ahora = timezone.now()
+    caducadas = Reserva.objects.filter(expira__lte=ahora)
+    if producto_id is not None:
+        caducadas = caducadas.filter(producto_id=producto_id)
+
+    while True:
+        with transaction.atomic():
+            filas = list(caducadas.order_by('expira').values_list('id', 'producto_id', 'cantidad')[:lote])
+            if not filas:
+                return liberadas
+            ids = [fila[0] for fila in filas]
+            borradas = Reserva.objects.filter(id__in=ids).delete()[0]
+            if borradas != len(ids):
+                # Otro proceso ha liberado parte del lote: reintentamos con lo que quede
+                transaction.set_rollback(True)
+                continue
+            cantidades = defaultdict(int)
+            for _, prod_id, cantidad in filas:
+                cantidades[prod_id] += cantidad
+            _soltar(cantidades)
+            liberadas += borradas
+
+
+# -------------------------------------------------------------------
+# 🧾 Convertir reservas en una venta
+# -------------------------------------------------------------------
+def confirmar_reservas(reservas_ids, cliente, usuario=None):
+    """
+    Convierte reservas vivas en una Venta (una línea por reserva al precio
+    actual del producto) dentro de una única transacción: se libera lo
+    retenido y se descuenta el stock con el mismo UPDATE condicional de siempre.
+    """
+    with diferir_recalculos():
+        reservas = list(
+            Reserva.objects.select_related('producto')
+            .filter(id__in=reservas_ids, expira__gt=timezone.now())
+        )
+        if usuario is not None:
+            reservas = [r for r in reservas if r.usuario_id == usuario.id]
+        if not reservas or len(reservas) != len(set(reservas_ids)):
+            raise ReservaNoValidaError("Alguna reserva no existe, ha caducado o no es tuya")
+
+        # Si el barrido u otra confirmación la ha borrado tras leerla, su
+        # retención ya se soltó: no se descuenta dos veces (se deshace todo)
+        if Reserva.objects.filter(id__in=[r.id for r in reservas]).delete()[0] != len(reservas):
+            raise ReservaNoValidaError("Alguna reserva ya se ha liberado o confirmado")
+        cantidades = defaultdict(int)
+        for reserva in reservas:
+            cantidades[reserva.producto_id] += reserva.cantidad
+        _soltar(cantidades)
+
+        venta = Venta.objects.create(cliente=cliente)
+        crear_lineas_venta_en_bloque(venta, [
+            {'producto': r.producto, 'cantidad': r.cantidad, 'precio_unitario': r.producto.precio}
+            for r in reservas
+        ])
+    venta.refresh_from_db(fields=['total'])
+    return venta
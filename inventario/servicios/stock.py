@@ -0,0 +1,169 @@
+# inventario/servicios/stock.py
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from ..models import MovimientoStock, Producto
+from .historico import anotar_movimientos
+from .versiones import marcar_cambio
+
+__all__ = [
+    'StockInsuficienteError',
+    'mover_stock', 'aplicar_delta', 'aplicar_deltas', 'entrada_stock', 'salida_stock',
+    'deltas_de_linea', 'es_borrado_de_producto', 'bloquear_productos',
+]
+
+
+# -------------------------------------------------------------------
+# ❌ Error cuando una salida dejaría el stock en negativo
+# -------------------------------------------------------------------
+class StockInsuficienteError(Exception):
+    def __init__(self, producto_id, cantidad):
+        self.producto_id = producto_id
+        self.cantidad = cantidad
+        super().__init__(
+            f"No hay suficiente stock del producto #{producto_id} "
+            f"para retirar {cantidad} unidades"
+        )
+
+
+# -------------------------------------------------------------------
+# 🔁 Movimiento de stock en un único UPDATE condicional
+# -------------------------------------------------------------------
+def mover_stock(producto_id, delta, origen=MovimientoStock.AJUSTE):
+    """
+    Suma `delta` (positivo o negativo) al stock del producto y lo anota en
+    el histórico (MovimientoStock). Ver aplicar_delta().
+    """
+    aplicar_delta(producto_id, delta)
+    anotar_movimientos([(producto_id, delta, origen)])
+
+
+def aplicar_delta(producto_id, delta):
+    """
+    Aplica el delta con:
+        UPDATE producto SET stock = stock + delta
+        WHERE id = producto_id [AND stock >= reservado - delta]
+    No se lee el producto ni se reescribe la fila entera, así que dos ventas
+    simultáneas del mismo producto no se pisan. Si la salida dejaría el stock
+    en negativo el UPDATE no afecta a ninguna fila y se lanza
+    StockInsuficienteError (en lugar de dejar el stock a 0).
+    """
+    if not delta:
+        return
+    if _actualizar_stock(producto_id, delta):
+        return
+    # Puede que lo impidan reservas ya caducadas que aún no se han liberado
+    from .reservas import liberar_caducadas
+    if delta < 0 and liberar_caducadas(producto_id=producto_id) and _actualizar_stock(producto_id, delta):
+        return
+    raise StockInsuficienteError(producto_id, -delta)
+
+
+def aplicar_deltas(deltas, lote=500):
+    """
+    Aplica {producto_id: delta} con un UPDATE por cada `lote` productos:
+        UPDATE producto SET stock = stock + CASE id WHEN 1 THEN -2 WHEN 7 THEN 5 ... END
+        WHERE id IN (...) AND stock >= reservado - CASE ... END
+    Si alguna fila no cumple la condición el UPDATE se deshace (savepoint) y
+    ese lote se aplica producto a producto con aplicar_delta(), que libera
+    reservas caducadas y lanza StockInsuficienteError con el producto concreto.
+    El SQL se escribe a mano: con cientos de When() el ORM tarda más en
+    compilar la consulta que SQLite en ejecutarla.
+    """
+    pendientes = sorted((pk, delta) for pk, delta in deltas.items() if delta)
+    if len(pendientes) == 1:
+        aplicar_delta(*pendientes[0])
+        return
+    for inicio in range(0, len(pendientes), lote):
+        trozo = pendientes[inicio:inicio + lote]
+        if _actualizar_stock_en_lote(trozo) == len(trozo):
+            continue
+        for producto_id, delta in trozo:
+            aplicar_delta(producto_id, delta)
+
+
+def _actualizar_stock_en_lote(trozo):
+    tabla = connection.ops.quote_name(Producto._meta.db_table)
+    caso = 'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(trozo)) + ' END'
+    valores = [v for fila in trozo for v in fila]
+    ids = [pk for pk, _ in trozo]
+    sql = (
+        f'UPDATE {tabla} SET stock = stock + {caso} '
+        f'WHERE id IN ({", ".join(["%s"] * len(ids))}) AND stock >= reservado - {caso}'
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, valores + ids + valores)
+        if cursor.rowcount != len(trozo):
+            transaction.set_rollback(True)
+        else:
+            marcar_cambio(Producto, ids)  # Un UPDATE en crudo no dispara señales
+        return cursor.rowcount
+
+
+def _actualizar_stock(producto_id, delta):
+    filas = Producto.objects.filter(pk=producto_id)
+    if delta < 0:
+        # Las unidades retenidas por reservas no se pueden vender
+        filas = filas.filter(stock__gte=F('reservado') - delta)
+    actualizadas = filas.update(stock=F('stock') + delta)
+    if actualizadas:
+        marcar_cambio(Producto, [producto_id])  # update() no dispara señales
+    return actualizadas
+
+
+def entrada_stock(producto_id, cantidad, origen=MovimientoStock.COMPRA):
+    mover_stock(producto_id, cantidad, origen)
+
+
+def salida_stock(producto_id, cantidad, origen=MovimientoStock.VENTA):
+    mover_stock(producto_id, -cantidad, origen)
+
+
+# -------------------------------------------------------------------
+# 🔐 Leer el stock para sustituirlo (dentro de una transacción)
+# -------------------------------------------------------------------
+def bloquear_productos(queryset):
+    """
+    Bloquea las filas de `queryset` y lo devuelve listo para leer. Para
+    quien escribe un stock absoluto calculado a partir del leído: hasta el
+    COMMIT nadie puede moverlo. SQLite no tiene SELECT ... FOR UPDATE: un
+    UPDATE que no cambia nada toma el bloqueo de escritura de toda la BD
+    (sólo hay un escritor).
+    """
+    if connection.vendor == 'sqlite':
+        queryset.update(stock=F('stock'))
+        return queryset
+    return queryset.select_for_update()
+
+
+# -------------------------------------------------------------------
+# 🧮 Deltas de stock que provoca guardar o borrar una línea
+# -------------------------------------------------------------------
+def deltas_de_linea(linea, signo, borrada=False):
+    """
+    Devuelve la lista de (producto_id, delta) que implica guardar o borrar
+    una línea de compra (signo=+1) o de venta (signo=-1).
+    Si la línea ya existía se compara con los valores leídos de la BD, de
+    modo que editar la cantidad o cambiar el producto mueve sólo la diferencia.
+    """
+    if borrada:
+        producto_id, cantidad = linea.stock_original or (linea.producto_id, linea.cantidad)
+        return [(producto_id, -signo * cantidad)]
+
+    if linea.stock_original is None:
+        return [(linea.producto_id, signo * linea.cantidad)]
+
+    producto_id, cantidad = linea.stock_original
+    if producto_id == linea.producto_id:
+        return [(producto_id, signo * (linea.cantidad - cantidad))]
+    return [(producto_id, -signo * cantidad), (linea.producto_id, signo * linea.cantidad)]
+
+
+def es_borrado_de_producto(origin):
+    """
+    True si el borrado en cascada viene de eliminar el propio producto:
+    en ese caso no tiene sentido mover el stock de una fila que va a desaparecer.
+    """
+    modelo = getattr(origin, 'model', None) or type(origin)
+    return modelo is Producto
@@ -0,0 +1,42 @@
+# inventario/servicios/totales.py
+
+from django.db.models import DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from ..models import Compra, DetalleCompra, Venta, DetalleVenta
+from .versiones import marcar_cambio
+
+__all__ = ['recalcular_totales_compras', 'recalcular_totales_ventas']
+
+
+def _suma_subtotales(modelo_detalle, campo_cabecera):
+    # SELECT SUM(subtotal) FROM detalle WHERE <cabecera>_id = cabecera.id
+    suma = (
+        modelo_detalle.objects
+        .filter(**{campo_cabecera: OuterRef('pk')})
+        .values(campo_cabecera)
+        .annotate(suma=Sum('subtotal'))
+        .values('suma')
+    )
+    return Coalesce(Subquery(suma), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+# -------------------------------------------------------------------
+# 🧾 Recalcular el total de varias cabeceras en un solo UPDATE
+# -------------------------------------------------------------------
+def recalcular_totales_compras(compra_ids):
+    """
+    UPDATE compra SET total = (SELECT SUM(subtotal) ...) WHERE id IN (...)
+    Las compras que ya no existan (p. ej. borradas en cascada) simplemente no se tocan.
+    """
+    compra_ids = list(compra_ids)
+    if compra_ids:
+        Compra.objects.filter(pk__in=compra_ids).update(total=_suma_subtotales(DetalleCompra, 'compra'))
+        marcar_cambio(Compra, compra_ids)
+
+
+def recalcular_totales_ventas(venta_ids):
+    venta_ids = list(venta_ids)
+    if venta_ids:
+        Venta.objects.filter(pk__in=venta_ids).update(total=_suma_subtotales(DetalleVenta, 'venta'))
+        marcar_cambio(Venta, venta_ids)
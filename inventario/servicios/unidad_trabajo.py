@@ -0,0 +1,116 @@
+# inventario/servicios/unidad_trabajo.py
+
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+
+from ..models import MovimientoStock
+from .historico import anotar_movimientos
+from .stock import aplicar_deltas, mover_stock
+from .totales import recalcular_totales_compras, recalcular_totales_ventas
+from .versiones import agrupar_cambios
+
+__all__ = [
+    'UnidadDeTrabajo', 'diferir_recalculos', 'unidad_actual',
+    'registrar_movimiento', 'marcar_total_compra', 'marcar_total_venta',
+]
+
+_unidad = ContextVar('unidad_de_trabajo', default=None)
+
+
+# -------------------------------------------------------------------
+# 📦 Cambios pendientes de aplicar al final de la operación
+# -------------------------------------------------------------------
+class UnidadDeTrabajo:
+    """
+    Acumula los deltas de stock por (producto, origen) y las cabeceras
+    (compras/ventas) cuyo total hay que recalcular, para aplicarlos todos de una vez.
+    """
+
+    def __init__(self):
+        self.stock = defaultdict(int)  # (producto_id, origen) -> delta
+        self.compras = set()
+        self.ventas = set()
+
+    def aplicar(self):
+        # Un UPDATE condicional con CASE para todos los productos tocados
+        # (por lotes, en orden de id para que dos transacciones concurrentes
+        # bloqueen las filas en el mismo orden)
+        netos = defaultdict(int)
+        for (producto_id, _), delta in self.stock.items():
+            netos[producto_id] += delta
+        aplicar_deltas(netos)
+        # Un único INSERT en el histórico con un movimiento por producto y origen
+        anotar_movimientos(
+            (producto_id, delta, origen) for (producto_id, origen), delta in self.stock.items()
+        )
+        # Un UPDATE por tipo de cabecera con el total recalculado
+        recalcular_totales_compras(self.compras)
+        recalcular_totales_ventas(self.ventas)
+        self.stock.clear()
+        self.compras.clear()
+        self.ventas.clear()
+
+
+def unidad_actual():
+    return _unidad.get()
+
+
+# -------------------------------------------------------------------
+# ⏸️ Context manager para diferir stock y totales hasta el final
+# -------------------------------------------------------------------
+@contextmanager
+def diferir_recalculos():
+    """
+    Dentro del bloque las señales no tocan la BD: sólo anotan los deltas de
+    stock y las cabeceras afectadas. Al salir se aplica un único UPDATE por
+    producto y por tipo de cabecera, dentro de la misma transacción.
+    Se puede anidar: sólo el bloque más externo aplica los cambios.
+    Las versiones de las tablas tocadas (servicios.versiones) también se
+    suben una sola vez al final.
+
+        with diferir_recalculos():
+            for detalle in detalles:
+                DetalleVenta.objects.create(venta=venta, **detalle)
+    """
+    if _unidad.get() is not None:
+        yield _unidad.get()
+        return
+
+    unidad = UnidadDeTrabajo()
+    with transaction.atomic(), agrupar_cambios():
+        token = _unidad.set(unidad)
+        try:
+            yield unidad
+        finally:
+            _unidad.reset(token)
+        unidad.aplicar()
+
+
+# -------------------------------------------------------------------
+# ✍️ Puntos de entrada usados por las señales
+# -------------------------------------------------------------------
+def registrar_movimiento(producto_id, delta, origen=MovimientoStock.AJUSTE):
+    unidad = _unidad.get()
+    if unidad is None:
+        mover_stock(producto_id, delta, origen)
+    else:
+        unidad.stock[producto_id, origen] += delta
+
+
+def marcar_total_compra(compra_id):
+    unidad = _unidad.get()
+    if unidad is None:
+        recalcular_totales_compras([compra_id])
+    else:
+        unidad.compras.add(compra_id)
+
+
+def marcar_total_venta(venta_id):
+    unidad = _unidad.get()
+    if unidad is None:
+        recalcular_totales_ventas([venta_id])
+    else:
+        unidad.ventas.add(venta_id)
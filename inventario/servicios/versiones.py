@@ -0,0 +1,137 @@
+# inventario/servicios/versiones.py
+
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from ..models import Cambio, VersionTabla
+from .cache_respuestas import invalidar_respuestas
+from .cambios import anotar_cambios, cambios_de, combinar_cambios
+from .eventos import publicar_cambios
+
+__all__ = ['marcar_cambio', 'agrupar_cambios', 'incrementar_versiones', 'versiones_de', 'etag_de', 'reclamar_versiones']
+
+_pendientes = ContextVar('versiones_pendientes', default=None)
+
+
+# -------------------------------------------------------------------
+# 🔢 Subir la versión de los modelos que han cambiado
+# -------------------------------------------------------------------
+def incrementar_versiones(modelos):
+    """
+    UPDATE version_tabla SET version = version + 1, modificado = now
+    WHERE modelo IN (...). Va en la misma transacción que el cambio, así que
+    nadie ve la versión nueva con los datos viejos ni al revés.
+    """
+    etiquetas = sorted({modelo._meta.label for modelo in modelos})
+    if not etiquetas:
+        return
+    ahora = timezone.now()
+    actualizadas = VersionTabla.objects.filter(modelo__in=etiquetas).update(version=F('version') + 1, modificado=ahora)
+    if actualizadas < len(etiquetas):
+        # Modelo sin fila todavía (la migración crea las de los modelos conocidos)
+        VersionTabla.objects.bulk_create(
+            [VersionTabla(modelo=etiqueta, version=1, modificado=ahora) for etiqueta in etiquetas],
+            ignore_conflicts=True,
+        )
+
+
+class _Pendientes:
+    __slots__ = ('modelos', 'cambios')
+
+    def __init__(self):
+        self.modelos = set()
+        self.cambios = {}
+
+
+@contextmanager
+def agrupar_cambios():
+    """
+    Dentro del bloque marcar_cambio() sólo anota los modelos y los objetos;
+    al salir sin errores se suben todas las versiones con un único UPDATE,
+    se escribe el registro de cambios con un único INSERT y se publica una
+    sola vez a /api/eventos/. Lo usa diferir_recalculos().
+    """
+    if _pendientes.get() is not None:
+        yield
+        return
+    pendientes = _Pendientes()
+    token = _pendientes.set(pendientes)
+    try:
+        yield
+    finally:
+        _pendientes.reset(token)
+    incrementar_versiones(pendientes.modelos)
+    anotar_cambios(pendientes.cambios)
+    publicar_cambios(pendientes.cambios)
+
+
+def marcar_cambio(modelo, ids=(), operacion=Cambio.MODIFICACION):
+    """
+    Punto único para avisar de que han cambiado filas de `modelo`: sube su
+    versión (ETag de la API), invalida las respuestas cacheadas y, si es un
+    recurso de /api/cambios/, anota `operacion` para cada id de `ids` y lo
+    publica a los suscriptores de /api/eventos/. Lo llaman las señales y los
+    servicios que escriben sin ellas (update, bulk_create, borrados en crudo).
+    """
+    invalidar_respuestas(modelo)
+    cambios = cambios_de(modelo, ids, operacion)
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        incrementar_versiones([modelo])
+        anotar_cambios(cambios)
+        publicar_cambios(cambios)
+    else:
+        pendientes.modelos.add(modelo)
+        combinar_cambios(pendientes.cambios, cambios)
+
+
+# -------------------------------------------------------------------
+# 🔎 Leer versiones
+# -------------------------------------------------------------------
+def versiones_de(modelos):
+    """
+    {etiqueta: (version, modificado)} de `modelos` en una sola consulta por
+    clave primaria sobre una tabla de pocas filas. Los que no tengan fila
+    aparecen como (0, None).
+    """
+    etiquetas = [modelo._meta.label for modelo in modelos]
+    versiones = dict.fromkeys(etiquetas, (0, None))
+    for etiqueta, version, modificado in (
+        VersionTabla.objects.filter(modelo__in=etiquetas).values_list('modelo', 'version', 'modificado')
+    ):
+        versiones[etiqueta] = (version, modificado)
+    return versiones
+
+
+def etag_de(versiones, *partes):
+    """
+    (ETag fuerte, última modificación) de una respuesta construida con las
+    tablas de `versiones` (ver versiones_de). `partes` distingue
+    representaciones del mismo recurso (ruta, parámetros, formato); el ETag
+    cambia en cuanto se modifica cualquier fila de esas tablas.
+    """
+    firma = '\n'.join([*map(str, partes), *(f'{e}={v}' for e, (v, _) in sorted(versiones.items()))])
+    fechas = [modificado for _, modificado in versiones.values() if modificado is not None]
+    return quote_etag(hashlib.sha1(firma.encode()).hexdigest()), max(fechas, default=None)
+
+
+def reclamar_versiones(versiones):
+    """
+    Para escrituras con If-Match, dentro de su transacción: sube la versión
+    de cada tabla sólo si sigue siendo la leída en `versiones`. Si otra
+    escritura se ha adelantado devuelve False. Además, al ser la primera
+    escritura de la transacción, SQLite toma aquí el bloqueo de escritura y
+    nadie más puede cambiar los datos entre la comprobación y el guardado.
+    """
+    condicion = Q()
+    for etiqueta, (version, _) in versiones.items():
+        condicion |= Q(modelo=etiqueta, version=version)
+    actualizadas = VersionTabla.objects.filter(condicion).update(
+        version=F('version') + 1, modificado=timezone.now()
+    )
+    return actualizadas == len(versiones)
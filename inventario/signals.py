@@ -1,72 +1,138 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Sum
-from .models import DetalleCompra, DetalleVenta, Producto, Compra, Venta
+from .perfilado import cronometrado
+from .models import Cambio, Cliente, Compra, DetalleCompra, DetalleVenta, MovimientoStock, Producto, Proveedor, Venta
+from .servicios.autocompletar import invalidar_autocompletar
+from .servicios.historico import anotar_movimientos
+from .servicios.stock import deltas_de_linea, es_borrado_de_producto
+from .servicios.unidad_trabajo import registrar_movimiento, marcar_total_compra, marcar_total_venta
+from .servicios.versiones import marcar_cambio
 
 # -------------------------
 # ACTUALIZACIÓN DE STOCK
 # -------------------------
 
-# Cuando se crea un DetalleCompra, aumenta el stock del producto
+# Todas las variaciones pasan por servicios.stock, que aplica cada cambio
+# con un UPDATE condicional (stock = stock ± n) y rechaza dejarlo en negativo.
+# Dentro de diferir_recalculos() sólo se anotan y se aplican al final.
+# Todos los receptores suman su duración al tramo 'senales' del perfilado.
+
+def _mover(deltas, origen):
+    for producto_id, delta in deltas:
+        registrar_movimiento(producto_id, delta, origen)
+
+# Cuando se crea o edita un DetalleCompra, aumenta el stock del producto
 @receiver(post_save, sender=DetalleCompra)
+@cronometrado('senales')
 def aumentar_stock_al_comprar(sender, instance, created, **kwargs):
-    if created:
-        producto = instance.producto
-        producto.stock += instance.cantidad
-        producto.save()
+    _mover(deltas_de_linea(instance, signo=+1), MovimientoStock.COMPRA)
 
 # Si se elimina un DetalleCompra, se resta el stock del producto
 @receiver(post_delete, sender=DetalleCompra)
-def restar_stock_al_eliminar_compra(sender, instance, **kwargs):
-    producto = instance.producto
-    producto.stock -= instance.cantidad
-    if producto.stock < 0:
-        producto.stock = 0
-    producto.save()
-
-# Cuando se crea un DetalleVenta, se descuenta el stock del producto
+@cronometrado('senales')
+def restar_stock_al_eliminar_compra(sender, instance, origin=None, **kwargs):
+    if es_borrado_de_producto(origin):
+        return
+    _mover(deltas_de_linea(instance, signo=+1, borrada=True), MovimientoStock.COMPRA)
+
+# Cuando se crea o edita un DetalleVenta, se descuenta el stock del producto
 @receiver(post_save, sender=DetalleVenta)
+@cronometrado('senales')
 def restar_stock_al_vender(sender, instance, created, **kwargs):
-    if created:
-        producto = instance.producto
-        producto.stock -= instance.cantidad
-        if producto.stock < 0:
-            producto.stock = 0
-        producto.save()
+    _mover(deltas_de_linea(instance, signo=-1), MovimientoStock.VENTA)
 
 # Si se elimina un DetalleVenta, se devuelve el stock al producto
 @receiver(post_delete, sender=DetalleVenta)
-def devolver_stock_al_cancelar_venta(sender, instance, **kwargs):
-    producto = instance.producto
-    producto.stock += instance.cantidad
-    producto.save()
+@cronometrado('senales')
+def devolver_stock_al_cancelar_venta(sender, instance, origin=None, **kwargs):
+    if es_borrado_de_producto(origin):
+        return
+    _mover(deltas_de_linea(instance, signo=-1, borrada=True), MovimientoStock.VENTA)
+
+# Alta de un producto o edición manual de su stock (formulario, API, admin):
+# se anota en el histórico como stock inicial o como ajuste
+@receiver(post_save, sender=Producto)
+@cronometrado('senales')
+def anotar_stock_de_producto(sender, instance, created, **kwargs):
+    if created:
+        anotar_movimientos([(instance.pk, instance.stock, MovimientoStock.INICIAL)])
+    elif instance.stock_leido is not None:
+        anotar_movimientos([(instance.pk, instance.stock - instance.stock_leido, MovimientoStock.AJUSTE)])
+    instance.stock_leido = instance.stock
 
 # -------------------------
 # ACTUALIZACIÓN DE TOTALES
 # -------------------------
 
-def actualizar_total_compra(compra):
-    total = DetalleCompra.objects.filter(compra=compra).aggregate(suma=Sum('subtotal'))['suma'] or 0
-    compra.total = total
-    compra.save()
-
-def actualizar_total_venta(venta):
-    total = DetalleVenta.objects.filter(venta=venta).aggregate(suma=Sum('subtotal'))['suma'] or 0
-    venta.total = total
-    venta.save()
+# Cada cambio en una línea marca su cabecera; el total se recalcula con un
+# UPDATE ... SET total = (SELECT SUM(subtotal) ...), al momento o al final
+# del bloque diferir_recalculos() si lo hay.
 
 @receiver(post_save, sender=DetalleCompra)
+@cronometrado('senales')
 def actualizar_total_compra_al_guardar(sender, instance, **kwargs):
-    actualizar_total_compra(instance.compra)
+    marcar_total_compra(instance.compra_id)
 
 @receiver(post_delete, sender=DetalleCompra)
+@cronometrado('senales')
 def actualizar_total_compra_al_eliminar(sender, instance, **kwargs):
-    actualizar_total_compra(instance.compra)
+    marcar_total_compra(instance.compra_id)
 
 @receiver(post_save, sender=DetalleVenta)
+@cronometrado('senales')
 def actualizar_total_venta_al_guardar(sender, instance, **kwargs):
-    actualizar_total_venta(instance.venta)
+    marcar_total_venta(instance.venta_id)
 
 @receiver(post_delete, sender=DetalleVenta)
+@cronometrado('senales')
 def actualizar_total_venta_al_eliminar(sender, instance, **kwargs):
-    actualizar_total_venta(instance.venta)
+    marcar_total_venta(instance.venta_id)
+
+# -------------------------
+# AUTOCOMPLETAR
+# -------------------------
+
+# Altas, cambios de nombre, archivados y borrados vacían lo cacheado de su recurso
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Proveedor)
+@cronometrado('senales')
+def invalidar_cache_autocompletar(sender, **kwargs):
+    invalidar_autocompletar(sender)
+
+# -------------------------
+# VERSIONES DE TABLA, CACHÉ DE RESPUESTAS Y REGISTRO DE CAMBIOS
+# -------------------------
+
+# Guardar o borrar una fila sube la versión de su tabla (ETag de la API),
+# invalida las respuestas cacheadas de su recurso y anota el alta,
+# modificación o baja en el registro de /api/cambios/. Los cambios de stock,
+# reservado y totales se hacen con UPDATE, que no dispara señales: los marcan
+# servicios.stock, servicios.reservas y servicios.totales al aplicarlos, y
+# los servicios de altas y borrados en bloque hacen lo mismo.
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Proveedor)
+@receiver(post_save, sender=Compra)
+@receiver(post_save, sender=DetalleCompra)
+@receiver(post_save, sender=Venta)
+@receiver(post_save, sender=DetalleVenta)
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Proveedor)
+@receiver(post_delete, sender=Compra)
+@receiver(post_delete, sender=DetalleCompra)
+@receiver(post_delete, sender=Venta)
+@receiver(post_delete, sender=DetalleVenta)
+@cronometrado('senales')
+def marcar_cambio_de_tabla(sender, instance, signal, created=False, **kwargs):
+    if signal is post_delete:
+        operacion = Cambio.BAJA
+    else:
+        operacion = Cambio.ALTA if created else Cambio.MODIFICACION
+    marcar_cambio(sender, [instance.pk], operacion)
@@ -0,0 +1,62 @@
+// inventario/static/inventario/js/autocompletar.js
+//
+// Convierte cada <select data-autocompletar="/api/autocompletar/<recurso>/">
+// en un buscador: al escribir se piden las opciones que empiezan por el
+// texto (hasta 20) y se sustituyen las del desplegable. El servidor sólo
+// pinta la opción elegida (ver inventario/widgets.py).
+(function () {
+  "use strict";
+
+  function debounce(fn, ms) {
+    let temporizador;
+    return function (...args) {
+      clearTimeout(temporizador);
+      temporizador = setTimeout(() => fn.apply(this, args), ms);
+    };
+  }
+
+  function activar(select) {
+    if (select.dataset.autocompletarActivo) return;
+    select.dataset.autocompletarActivo = "1";
+
+    const buscador = document.createElement("input");
+    buscador.type = "search";
+    buscador.placeholder = "Buscar…";
+    buscador.autocomplete = "off";
+    buscador.className = "form-control form-control-sm mb-1";
+    select.parentNode.insertBefore(buscador, select);
+
+    let peticion = null;
+    buscador.addEventListener("input", debounce(async function () {
+      const texto = buscador.value.trim();
+      if (!texto) return;
+      if (peticion) peticion.abort();
+      peticion = new AbortController();
+      try {
+        const url = select.dataset.autocompletar + "?q=" + encodeURIComponent(texto);
+        const respuesta = await fetch(url, { credentials: "same-origin", signal: peticion.signal });
+        if (!respuesta.ok) return;
+        const datos = await respuesta.json();
+        const elegido = select.value;
+        // Conservamos la opción vacía y la elegida; el resto se reemplaza
+        Array.from(select.options).forEach((opcion) => {
+          if (opcion.value && opcion.value !== elegido) opcion.remove();
+        });
+        datos.results.forEach((fila) => {
+          if (String(fila.id) !== elegido) select.add(new Option(fila.text, fila.id));
+        });
+        if (datos.results.length && !elegido) select.size = Math.min(datos.results.length + 1, 8);
+      } catch (error) {
+        if (error.name !== "AbortError") console.error(error);
+      }
+    }, 200));
+
+    select.addEventListener("change", () => { select.size = 0; });
+  }
+
+  function activarTodos(raiz) {
+    raiz.querySelectorAll("select[data-autocompletar]").forEach(activar);
+  }
+
+  document.addEventListener("DOMContentLoaded", () => activarTodos(document));
+})();
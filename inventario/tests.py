@@ -85,3 +85,2122 @@ class ClienteAPITest(APITestCase):
 
         # Verificamos que ahora hay 2 clientes en la DB
         self.assertEqual(Cliente.objects.count(), 2)
+
+# ----------------------------
+# Test movimientos de stock (servicios.stock + señales)
+# ----------------------------
+from decimal import Decimal
+from inventario.models import Producto, Proveedor, Compra, DetalleCompra, Venta, DetalleVenta
+from inventario.servicios.stock import StockInsuficienteError, mover_stock
+
+
+class MovimientoStockTest(TestCase):
+    def setUp(self):
+        """
+        Producto con 10 unidades, un cliente y un proveedor de prueba.
+        """
+        self.producto = Producto.objects.create(nombre="Teclado", precio=Decimal('20.00'), stock=10)
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.proveedor = Proveedor.objects.create(nombre="Distribuciones Sur")
+
+    def test_venta_y_compra_mueven_stock(self):
+        """
+        Una venta descuenta stock y una compra lo aumenta.
+        """
+        venta = Venta.objects.create(cliente=self.cliente)
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=4, precio_unitario=Decimal('20.00'))
+        compra = Compra.objects.create(proveedor=self.proveedor)
+        DetalleCompra.objects.create(compra=compra, producto=self.producto, cantidad=5, precio_unitario=Decimal('15.00'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 11)
+
+    def test_sobreventa_rechazada(self):
+        """
+        Vender más de lo disponible lanza StockInsuficienteError en vez de dejar el stock a 0.
+        """
+        with self.assertRaises(StockInsuficienteError):
+            mover_stock(self.producto.id, -11)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+
+    def test_editar_linea_mueve_solo_la_diferencia(self):
+        """
+        Editar la cantidad de una línea ya guardada mueve sólo la diferencia.
+        """
+        venta = Venta.objects.create(cliente=self.cliente)
+        detalle = DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=3, precio_unitario=Decimal('20.00'))
+        detalle = DetalleVenta.objects.get(pk=detalle.pk)
+        detalle.cantidad = 5
+        detalle.save()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+
+        venta.delete()
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 10)
+
+    def test_borrar_producto_no_mueve_stock(self):
+        """
+        Borrar un producto con compras no falla aunque su stock ya se haya vendido.
+        """
+        compra = Compra.objects.create(proveedor=self.proveedor)
+        DetalleCompra.objects.create(compra=compra, producto=self.producto, cantidad=2, precio_unitario=Decimal('15.00'))
+        Producto.objects.filter(pk=self.producto.pk).update(stock=0)
+        self.producto.delete()
+        self.assertFalse(DetalleCompra.objects.exists())
+
+
+class VentaAPIStockTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='vendedor', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.producto = Producto.objects.create(nombre="Ratón", precio=Decimal('10.00'), stock=3)
+        self.cliente = Cliente.objects.create(nombre="Luis", email="luis@example.com")
+
+    def test_venta_sin_stock_devuelve_400(self):
+        """
+        POST /api/ventas/ con más unidades de las disponibles devuelve 400
+        y no deja ni la venta ni sus líneas a medias.
+        """
+        data = {
+            "cliente": self.cliente.id,
+            "total": "40.00",
+            "detalles": [{"producto": self.producto.id, "cantidad": 4, "precio_unitario": "10.00"}],
+        }
+        response = self.client.post(reverse('api-venta-list-create'), data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Venta.objects.exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 3)
+
+    def test_linea_de_compra_ya_vendida_devuelve_400(self):
+        """
+        Borrar o rebajar una línea de compra cuyo stock ya se ha vendido
+        devuelve 400 y deja la línea y el stock como estaban.
+        """
+        proveedor = Proveedor.objects.create(nombre="Periféricos SL")
+        compra = Compra.objects.create(proveedor=proveedor)
+        linea = DetalleCompra.objects.create(compra=compra, producto=self.producto, cantidad=5, precio_unitario=8)
+        venta = Venta.objects.create(cliente=self.cliente)
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=7, precio_unitario=10)
+
+        url = reverse('api-detalles-compra-detail', args=[linea.id])
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(self.client.patch(url, {"cantidad": 1}, format='json').status_code, 400)
+        self.assertTrue(DetalleCompra.objects.filter(pk=linea.pk, cantidad=5).exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+
+
+# ----------------------------
+# Test recálculo diferido de stock y totales
+# ----------------------------
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from inventario.servicios.unidad_trabajo import diferir_recalculos
+
+
+class DiferirRecalculosTest(TestCase):
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f"Producto {i}", precio=Decimal('5.00'), stock=100)
+            for i in range(3)
+        ]
+        self.cliente = Cliente.objects.create(nombre="Eva", email="eva@example.com")
+
+    def test_un_update_por_producto_y_cabecera(self):
+        """
+        Con 30 líneas sobre 3 productos se hacen 30 INSERT, 1 UPDATE de stock
+        para los 3 productos y 1 UPDATE del total, en vez de un agregado y un
+        guardado por línea.
+        """
+        venta = Venta.objects.create(cliente=self.cliente)
+        with CaptureQueriesContext(connection) as ctx:
+            with diferir_recalculos():
+                for i in range(30):
+                    DetalleVenta.objects.create(
+                        venta=venta, producto=self.productos[i % 3],
+                        cantidad=1, precio_unitario=Decimal('5.00'),
+                    )
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 3)  # Stock, total y versiones de tabla
+
+        venta.refresh_from_db()
+        self.assertEqual(venta.total, Decimal('150.00'))
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 90)
+
+    def test_sobreventa_deshace_todo_el_bloque(self):
+        """
+        Si el neto de un producto deja el stock en negativo se deshace todo el bloque.
+        """
+        venta = Venta.objects.create(cliente=self.cliente)
+        with self.assertRaises(StockInsuficienteError):
+            with diferir_recalculos():
+                DetalleVenta.objects.create(venta=venta, producto=self.productos[0], cantidad=60, precio_unitario=1)
+                DetalleVenta.objects.create(venta=venta, producto=self.productos[0], cantidad=60, precio_unitario=1)
+        self.assertFalse(DetalleVenta.objects.exists())
+        self.productos[0].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 100)
+
+
+# ----------------------------
+# Test escritura en bloque de líneas anidadas
+# ----------------------------
+from inventario.serializers import VentaSerializer
+
+
+class EscrituraEnBloqueTest(TestCase):
+    def setUp(self):
+        self.productos = [
+            Producto.objects.create(nombre=f"Cable {i}", precio=Decimal('2.50'), stock=50)
+            for i in range(4)
+        ]
+        self.cliente = Cliente.objects.create(nombre="Rosa", email="rosa@example.com")
+
+    def _crear_venta(self, en_bloque):
+        detalles = [
+            {"producto": self.productos[i % 4].id, "cantidad": 2, "precio_unitario": "2.50"}
+            for i in range(20)
+        ]
+        serializer = VentaSerializer(data={"cliente": self.cliente.id, "total": "100.00", "detalles": detalles})
+        serializer.escritura_en_bloque = en_bloque
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_mismo_resultado_que_fila_a_fila(self):
+        """
+        La escritura en bloque deja el mismo stock, subtotales y total que el camino con señales.
+        """
+        fila = self._crear_venta(en_bloque=False)
+        bloque = self._crear_venta(en_bloque=True)
+        fila.refresh_from_db()
+        bloque.refresh_from_db()
+        self.assertEqual(fila.total, bloque.total)
+        self.assertEqual(
+            list(fila.detalles.order_by('id').values_list('producto', 'cantidad', 'subtotal')),
+            list(bloque.detalles.order_by('id').values_list('producto', 'cantidad', 'subtotal')),
+        )
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 30)
+
+    def test_consultas_acotadas(self):
+        """
+        El número de consultas no crece con el número de líneas.
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            self._crear_venta(en_bloque=True)
+        self.assertLessEqual(len(ctx.captured_queries), 15)
+
+
+# ----------------------------
+# Test edición de ventas por diff de líneas
+# ----------------------------
+class VentaUpdateDiffTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='editor', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Marta", email="marta@example.com")
+        self.productos = [
+            Producto.objects.create(nombre=f"Monitor {i}", precio=Decimal('100.00'), stock=100)
+            for i in range(50)
+        ]
+        detalles = [{"producto": p.id, "cantidad": 1, "precio_unitario": "100.00"} for p in self.productos]
+        serializer = VentaSerializer(data={"cliente": self.cliente.id, "total": "5000.00", "detalles": detalles})
+        serializer.is_valid(raise_exception=True)
+        self.venta = serializer.save()
+
+    def test_cambiar_una_cantidad(self):
+        """
+        PUT cambiando la cantidad de una sola línea mueve sólo su stock,
+        conserva los ids de las demás y cuesta pocas consultas.
+        """
+        url = reverse('api-venta-detail', args=[self.venta.id])
+        detalles = self.client.get(url).data['detalles']
+        ids_antes = [d['id'] for d in detalles]
+        detalles[0]['cantidad'] = 3
+        data = {"cliente": self.cliente.id, "total": "5200.00", "detalles": detalles}
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.put(url, data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        escrituras = [q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        # cabecera, línea, stock, total, el movimiento en el histórico, las
+        # versiones de tabla y el registro de cambios
+        self.assertLessEqual(len(escrituras), 7)
+
+        self.assertEqual(list(self.venta.detalles.order_by('id').values_list('id', flat=True)), ids_antes)
+        self.productos[0].refresh_from_db()
+        self.productos[1].refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 97)
+        self.assertEqual(self.productos[1].stock, 99)
+        self.venta.refresh_from_db()
+        self.assertEqual(self.venta.total, Decimal('5200.00'))
+
+    def test_quitar_y_anadir_lineas(self):
+        """
+        Las líneas que desaparecen devuelven su stock y las nuevas lo descuentan.
+        """
+        url = reverse('api-venta-detail', args=[self.venta.id])
+        detalles = self.client.get(url).data['detalles'][1:]
+        nuevo = Producto.objects.create(nombre="Webcam", precio=Decimal('30.00'), stock=5)
+        detalles.append({"producto": nuevo.id, "cantidad": 2, "precio_unitario": "30.00"})
+        response = self.client.put(url, {"cliente": self.cliente.id, "total": "4960.00", "detalles": detalles}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.productos[0].refresh_from_db()
+        nuevo.refresh_from_db()
+        self.assertEqual(self.productos[0].stock, 100)
+        self.assertEqual(nuevo.stock, 3)
+        self.assertEqual(self.venta.detalles.count(), 50)
+
+    def test_respuesta_con_el_total_recalculado(self):
+        """
+        El total lo recalcula la BD: la respuesta de POST y PUT/PATCH trae el
+        valor guardado, no el que tenía la instancia en memoria.
+        """
+        linea = {"producto": self.productos[0].id, "cantidad": 2, "precio_unitario": "25.00"}
+        response = self.client.post(reverse('api-venta-list-create'),
+                                    {"cliente": self.cliente.id, "detalles": [linea]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], '50.00')
+
+        url = reverse('api-venta-detail', args=[response.data['id']])
+        linea = dict(response.data['detalles'][0], cantidad=3)
+        response = self.client.patch(url, {"detalles": [linea]}, format='json')
+        self.assertEqual(response.data['total'], '75.00')
+
+        proveedor = Proveedor.objects.create(nombre="Pantallas SA")
+        response = self.client.post(reverse('api-compra-list-create'), {
+            "proveedor": proveedor.id, "detalles": [{"producto": self.productos[0].id, "cantidad": 4, "precio_unitario": "25.00"}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['total'], '100.00')
+
+    def test_formularios_html_de_compra_guardan_el_total(self):
+        """
+        Alta y edición de una compra desde las vistas HTML: el total que
+        recalcula la BD no se pisa con el de la instancia en memoria.
+        """
+        self.client.force_login(self.user)
+        proveedor = Proveedor.objects.create(nombre="Pantallas SA")
+
+        def datos(lineas, iniciales=0):
+            datos = {'proveedor': proveedor.id, 'detalles-TOTAL_FORMS': len(lineas),
+                     'detalles-INITIAL_FORMS': iniciales, 'detalles-MIN_NUM_FORMS': 0,
+                     'detalles-MAX_NUM_FORMS': 1000}
+            for i, linea in enumerate(lineas):
+                datos.update({f'detalles-{i}-{campo}': valor for campo, valor in linea.items()})
+            return datos
+
+        lineas = [{'producto': p.id, 'cantidad': 3, 'precio_unitario': '2.00'} for p in self.productos[:3]]
+        response = self.client.post(reverse('crear_compra'), datos(lineas))
+        self.assertEqual(response.status_code, 302)
+        compra = Compra.objects.get(proveedor=proveedor)
+        self.assertEqual(compra.total, Decimal('18.00'))
+
+        lineas = [dict(id=d.id, compra=compra.id, producto=d.producto_id, cantidad=5, precio_unitario='2.00')
+                  for d in compra.detalles.order_by('id')]
+        response = self.client.post(reverse('editar_compra', args=[compra.id]), datos(lineas, iniciales=3))
+        self.assertEqual(response.status_code, 302)
+        compra.refresh_from_db()
+        self.assertEqual(compra.total, Decimal('30.00'))
+
+
+# ----------------------------
+# Test reservas de stock
+# ----------------------------
+from datetime import timedelta
+from django.utils import timezone
+from inventario.models import Reserva
+from unittest.mock import patch
+from inventario.servicios import reservas as servicio_reservas
+from inventario.servicios.reservas import ReservaNoValidaError, confirmar_reservas, liberar, liberar_caducadas, reservar
+
+
+class ReservaTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='comercial', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.producto = Producto.objects.create(nombre="Portátil", precio=Decimal('800.00'), stock=5)
+        self.cliente = Cliente.objects.create(nombre="Pablo", email="pablo@example.com")
+
+    def test_reserva_reduce_disponible_y_bloquea_ventas(self):
+        """
+        Una reserva resta del stock disponible y una venta normal no puede usar esas unidades.
+        """
+        response = self.client.post(reverse('api-reserva-list-create'),
+                                    {"producto": self.producto.id, "cantidad": 4}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        producto = self.client.get(reverse('api-producto-detail', args=[self.producto.id])).data
+        self.assertEqual(producto['stock_disponible'], 1)
+
+        with self.assertRaises(StockInsuficienteError):
+            mover_stock(self.producto.id, -2)
+        response = self.client.post(reverse('api-reserva-list-create'),
+                                    {"producto": self.producto.id, "cantidad": 2}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_confirmar_reservas_crea_venta(self):
+        """
+        Confirmar reservas crea la venta, descuenta stock y libera lo retenido.
+        """
+        reserva = reservar(self.producto.id, 2, usuario=self.user)
+        response = self.client.post(reverse('api-reserva-confirmar'),
+                                    {"cliente": self.cliente.id, "reservas": [reserva.id]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Decimal(response.data['total']), Decimal('1600.00'))
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.reservado), (3, 0))
+        self.assertFalse(Reserva.objects.exists())
+
+    def test_caducadas_se_liberan(self):
+        """
+        Las reservas caducadas se liberan por lotes y, si hace falta, al vender.
+        """
+        reserva = reservar(self.producto.id, 5, usuario=self.user)
+        Reserva.objects.filter(pk=reserva.pk).update(expira=timezone.now() - timedelta(minutes=1))
+        mover_stock(self.producto.id, -5)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.stock, self.producto.reservado), (0, 0))
+        self.assertEqual(liberar_caducadas(), 0)
+
+    def test_borrar_usuario_no_deja_stock_retenido(self):
+        """
+        Al borrar un usuario sus reservas quedan huérfanas (no se borran sin
+        soltar lo retenido) y el barrido las libera al caducar.
+        """
+        usuario = User.objects.create_user(username='temporal', password='testpass')
+        reserva = reservar(self.producto.id, 3, usuario=usuario)
+        usuario.delete()
+        reserva.refresh_from_db()
+        self.assertIsNone(reserva.usuario_id)
+
+        Reserva.objects.filter(pk=reserva.pk).update(expira=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(liberar_caducadas(), 1)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.reservado, 0)
+
+    def test_confirmar_reserva_liberada_a_la_vez_no_suelta_dos_veces(self):
+        """
+        Si el barrido libera la reserva entre la lectura y el borrado de
+        confirmar_reservas(), la confirmación falla sin volver a soltar lo retenido.
+        """
+        reserva = reservar(self.producto.id, 2, usuario=self.user)
+        leer = Reserva.objects.select_related
+
+        def leer_y_barrer(*args):
+            class Lectura:
+                def filter(self, *args_filtro, **kwargs_filtro):
+                    leidas = list(leer(*args).filter(*args_filtro, **kwargs_filtro))
+                    liberar(reserva)
+                    return leidas
+            return Lectura()
+
+        with patch.object(servicio_reservas.Reserva.objects, 'select_related', side_effect=leer_y_barrer):
+            with self.assertRaises(ReservaNoValidaError):
+                confirmar_reservas([reserva.id], self.cliente, usuario=self.user)
+        # Sin la comprobación, reservado quedaría en -2 y saltaría el CHECK de la columna
+        self.assertFalse(Venta.objects.exists())
+
+
+# ----------------------------
+# Test histórico de stock y stock en una fecha
+# ----------------------------
+from inventario.models import MovimientoStock, SnapshotStock
+from inventario.servicios.historico import crear_snapshots, productos_con_stock_en_fecha, stock_en_fecha
+
+
+class HistoricoStockTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='contable', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.producto = Producto.objects.create(nombre="Impresora", precio=Decimal('150.00'), stock=10)
+        self.cliente = Cliente.objects.create(nombre="Jorge", email="jorge@example.com")
+
+    def _vender(self, cantidad, fecha):
+        venta = Venta.objects.create(cliente=self.cliente)
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=cantidad, precio_unitario=1)
+        MovimientoStock.objects.filter(fecha__gt=fecha).update(fecha=fecha)
+
+    def test_stock_en_fecha_desde_foto(self):
+        """
+        El stock en una fecha parte de la última foto anterior y suma sólo los movimientos posteriores.
+        """
+        inicio = timezone.now() - timedelta(days=10)
+        MovimientoStock.objects.update(fecha=inicio)
+        self._vender(2, inicio + timedelta(days=1))
+        crear_snapshots(fecha=inicio + timedelta(days=2))
+        self._vender(3, inicio + timedelta(days=3))
+
+        self.assertEqual(stock_en_fecha(self.producto.id, inicio), 10)
+        self.assertEqual(stock_en_fecha(self.producto.id, inicio + timedelta(days=2)), 8)
+        self.assertEqual(stock_en_fecha(self.producto.id, inicio + timedelta(days=4)), 5)
+        self.assertEqual(stock_en_fecha(self.producto.id, inicio - timedelta(days=1)), 0)
+
+        # Una foto falsa demuestra que los movimientos anteriores a ella no se vuelven a sumar
+        SnapshotStock.objects.filter(producto=self.producto).update(stock=100)
+        self.assertEqual(stock_en_fecha(self.producto.id, inicio + timedelta(days=4)), 97)
+
+    def test_ajuste_manual_se_anota(self):
+        """
+        Editar el stock de un producto anota la diferencia como ajuste.
+        """
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock = 7
+        producto.save()
+        ajuste = MovimientoStock.objects.get(origen=MovimientoStock.AJUSTE)
+        self.assertEqual(ajuste.cantidad, -3)
+        self.assertEqual(productos_con_stock_en_fecha(timezone.now()).get().stock_en_fecha, 7)
+
+    def test_api_stock_historico(self):
+        """
+        GET /api/stock-historico/?fecha= devuelve el stock de cada producto en esa fecha.
+        """
+        response = self.client.get(reverse('api-stock-historico'), {'fecha': timezone.now().isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['stock'], 10)
+        response = self.client.get(reverse('api-stock-historico'))
+        self.assertEqual(response.status_code, 400)
+
+
+# ----------------------------
+# Test reconciliación de stock
+# ----------------------------
+from django.core.management import call_command
+from io import StringIO
+from inventario.servicios.reconciliacion import buscar_discrepancias, corregir_discrepancias
+
+
+class ReconciliarStockTest(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre="Iván", email="ivan@example.com")
+        self.proveedor = Proveedor.objects.create(nombre="Mayorista Norte")
+        self.producto = Producto.objects.create(nombre="Disco SSD", precio=Decimal('60.00'), stock=5)
+        compra = Compra.objects.create(proveedor=self.proveedor)
+        DetalleCompra.objects.create(compra=compra, producto=self.producto, cantidad=10, precio_unitario=50)
+        venta = Venta.objects.create(cliente=self.cliente)
+        DetalleVenta.objects.create(venta=venta, producto=self.producto, cantidad=4, precio_unitario=60)
+        self.cuadrado = Producto.objects.create(nombre="Memoria RAM", precio=Decimal('40.00'), stock=3)
+
+    def test_detecta_y_corrige_deriva(self):
+        """
+        Un stock tocado por fuera de los servicios se detecta y se corrige a 5 + 10 - 4.
+        """
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+        salida = StringIO()
+        call_command('reconciliar_stock', lote=1, stdout=salida)
+        self.assertIn('esperado 11', salida.getvalue())
+        self.assertIn('descuadrados: 1', salida.getvalue())
+
+        call_command('reconciliar_stock', corregir=True, stdout=StringIO())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 11)
+        self.assertTrue(MovimientoStock.objects.filter(origen=MovimientoStock.RECONCILIACION, cantidad=9).exists())
+
+        salida = StringIO()
+        call_command('reconciliar_stock', stdout=salida)
+        self.assertIn('descuadrados: 0', salida.getvalue())
+
+    def test_no_pisa_movimientos_posteriores_a_la_revision(self):
+        """
+        Si el stock se mueve entre la búsqueda y la corrección, ese producto
+        no se corrige con el valor esperado ya desfasado y se informa de él.
+        """
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+        discrepancias = [d for lote in buscar_discrepancias() for d in lote]
+        self.assertEqual([d.producto_id for d in discrepancias], [self.producto.id])
+        mover_stock(self.producto.id, -1, MovimientoStock.VENTA)
+
+        corregidos, cambiadas = corregir_discrepancias(discrepancias)
+        self.assertEqual((corregidos, cambiadas), (0, discrepancias))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertFalse(MovimientoStock.objects.filter(origen=MovimientoStock.RECONCILIACION).exists())
+
+
+# ----------------------------
+# Test borrado en bloque y archivado
+# ----------------------------
+from inventario.servicios.borrado import eliminar_clientes, eliminar_productos, eliminar_proveedores
+
+
+class BorradoEnBloqueTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin2', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Grande SA", email="grande@example.com")
+        self.productos = [
+            Producto.objects.create(nombre=f"Tóner {i}", precio=Decimal('30.00'), stock=1000)
+            for i in range(5)
+        ]
+        for _ in range(12):
+            venta = Venta.objects.create(cliente=self.cliente)
+            for producto in self.productos:
+                DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=2, precio_unitario=30)
+
+    def test_borrar_cliente_devuelve_stock_sin_cascada_por_fila(self):
+        """
+        DELETE /api/clientes/<pk>/ devuelve el stock vendido con un UPDATE por producto
+        y no recalcula totales de ventas que se borran.
+        """
+        url = reverse('api-cliente-detail', args=[self.cliente.id])
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(DetalleVenta.objects.exists())
+        for producto in self.productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, 1000)
+        updates_venta = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "inventario_venta"')]
+        self.assertEqual(updates_venta, [])
+        self.assertLess(len(ctx.captured_queries), 30)
+
+    def test_borrar_producto_recalcula_totales(self):
+        """
+        Borrar un producto quita sus líneas y recalcula el total de las ventas afectadas.
+        """
+        eliminar_productos([self.productos[0].id], lote=5)
+        self.assertEqual(set(Venta.objects.values_list('total', flat=True)), {Decimal('240.00')})
+
+    def test_borrado_rechazado_no_deja_lotes_a_medias(self):
+        """
+        Si un lote posterior no puede retirar el stock comprado, tampoco se
+        borran los lotes anteriores.
+        """
+        proveedor = Proveedor.objects.create(nombre="Tintas SL")
+        producto = Producto.objects.create(nombre="Tinta", precio=Decimal('5.00'), stock=0)
+        for _ in range(3):
+            compra = Compra.objects.create(proveedor=proveedor)
+            DetalleCompra.objects.create(compra=compra, producto=producto, cantidad=10, precio_unitario=5)
+        venta = Venta.objects.create(cliente=self.cliente)
+        DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=15, precio_unitario=5)
+
+        with self.assertRaises(StockInsuficienteError):
+            eliminar_proveedores([proveedor.id], lote=1)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 15)
+        self.assertEqual(Compra.objects.filter(proveedor=proveedor).count(), 3)
+        self.assertTrue(Proveedor.objects.filter(pk=proveedor.pk).exists())
+
+    def test_archivar_oculta_del_listado(self):
+        """
+        Un cliente archivado no aparece en el listado salvo con ?archivados=1, y conserva sus ventas.
+        """
+        url = reverse('api-cliente-detail', args=[self.cliente.id])
+        self.assertEqual(self.client.patch(url, {"archivado": True}, format='json').status_code, 200)
+        listado = self.client.get(reverse('api-cliente-list-create')).data
+        self.assertEqual(listado['count'], 0)
+        listado = self.client.get(reverse('api-cliente-list-create'), {'archivados': 1}).data
+        self.assertEqual(listado['count'], 1)
+        self.assertEqual(Venta.objects.count(), 12)
+
+
+# ----------------------------
+# Test paginación por cursor (keyset)
+# ----------------------------
+class PaginacionKeysetTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin3', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Paginado SL", email="paginado@example.com")
+        self.ventas = [Venta.objects.create(cliente=self.cliente) for _ in range(7)]
+        # Misma fecha para todas: el id tiene que desempatar
+        Venta.objects.update(fecha=timezone.now())
+
+    def test_recorre_todas_las_ventas_sin_repetir(self):
+        """
+        Siguiendo 'next' con ?page_size=3 se recorren las 7 ventas en orden (fecha, id)
+        y 'previous' vuelve a la página anterior.
+        """
+        url = reverse('api-venta-list-create') + '?page_size=3'
+        vistos, paginas = [], []
+        while url:
+            data = self.client.get(url).data
+            self.assertNotIn('count', data)
+            paginas.append(data)
+            vistos += [v['id'] for v in data['results']]
+            url = data['next']
+        self.assertEqual(vistos, [v.id for v in self.ventas])
+        self.assertEqual(len(paginas), 3)
+        anterior = self.client.get(paginas[2]['previous']).data
+        self.assertEqual(anterior['results'], paginas[1]['results'])
+
+    def test_no_usa_offset_ni_count(self):
+        """
+        La segunda página se pide con un rango sobre (fecha, id), sin OFFSET ni COUNT(*).
+        """
+        primera = self.client.get(reverse('api-venta-list-create'), {'page_size': 2}).data
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(primera['next'])
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries if 'inventario_venta' in q['sql'])
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+
+    def test_cursor_no_valido(self):
+        response = self.client.get(reverse('api-venta-list-create'), {'cursor': 'basura'})
+        self.assertEqual(response.status_code, 404)
+
+
+# ----------------------------
+# Test consultas constantes en listados de pedidos (sin N+1)
+# ----------------------------
+class ListadoPedidosSinNMas1Test(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin4', password='testpass')
+        self.cliente = Cliente.objects.create(nombre="Muchas Líneas SA", email="lineas@example.com")
+        self.productos = [
+            Producto.objects.create(nombre=f"Folio {i}", precio=Decimal('2.00'), stock=10000)
+            for i in range(6)
+        ]
+
+    def _crear_ventas(self, lineas_por_venta):
+        for _ in range(5):
+            venta = Venta.objects.create(cliente=self.cliente)
+            for producto in self.productos[:lineas_por_venta]:
+                DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=1, precio_unitario=2)
+
+    def _consultas(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_api_ventas_no_crece_con_las_lineas(self):
+        """
+        GET /api/ventas/ hace las mismas consultas con 1 línea por venta que con 6.
+        """
+        self.client.force_authenticate(self.user)
+        url = reverse('api-venta-list-create')
+        self._crear_ventas(1)
+        pocas = self._consultas(url)
+        self._crear_ventas(6)
+        self.assertEqual(self._consultas(url + '?page_size=10'), pocas)
+
+    def test_lista_ventas_html_paginada_y_constante(self):
+        """
+        La lista HTML de ventas se pagina y su número de consultas no depende de las líneas.
+        """
+        self.client.force_login(self.user)
+        url = reverse('lista_ventas')
+        self._crear_ventas(1)
+        pocas = self._consultas(url)
+        self._crear_ventas(6)
+        self.assertEqual(self._consultas(url), pocas)
+        for _ in range(4):
+            self._crear_ventas(1)
+        response = self.client.get(url)
+        self.assertTrue(response.context['is_paginated'])
+        self.assertEqual(len(response.context['ventas']), 20)
+
+
+# ----------------------------
+# Presupuesto de consultas SQL por ruta
+# ----------------------------
+import json
+import os
+from django.db import transaction
+from inventario import api_urls, urls as html_urls
+from inventario.servicios.lineas import crear_lineas_compra_en_bloque, crear_lineas_venta_en_bloque
+
+
+class PresupuestoConsultasTest(APITestCase):
+    """
+    Recorre todas las rutas de api_urls.py y urls.py sobre pedidos con muchas
+    líneas y comprueba que ninguna supera su máximo de consultas ni de
+    escrituras (INSERT/UPDATE/DELETE). Los máximos no dependen del tamaño de
+    los datos: un N+1 nuevo los rompe.
+
+    Con INFORME_CONSULTAS=<ruta.json> se escribe además un informe con las
+    cifras reales de cada ruta para seguir su evolución.
+    """
+    LINEAS_POR_PEDIDO = 15
+    RUTAS_HTML = {p.name for p in html_urls.urlpatterns if p.name}
+    informe = []
+
+    # (nombre de la ruta, método, máximo de consultas, máximo de escrituras)
+    # Los pedidos del fixture tienen 15 líneas de 15 productos distintos: borrar
+    # o reemplazar sus líneas hace un único UPDATE de stock para todos ellos.
+    # Guardar clientes y proveedores cuenta además el SAVEPOINT/RELEASE que
+    # protege el índice único del nombre (fuera de los tests es BEGIN/COMMIT).
+    PRESUPUESTOS = [
+        ('api-producto-list-create', 'get', 3, 0),
+        ('api-producto-list-create', 'post', 4, 4),
+        ('api-producto-buscar', 'get', 1, 0),
+        ('api-producto-detail', 'get', 2, 0),
+        ('api-producto-detail', 'patch', 5, 4),
+        ('api-producto-detail', 'delete', 14, 6),
+        ('api-cliente-list-create', 'get', 3, 0),
+        ('api-cliente-list-create', 'post', 7, 3),
+        ('api-cliente-detail', 'get', 2, 0),
+        ('api-cliente-detail', 'patch', 6, 3),
+        ('api-cliente-detail', 'delete', 9, 3),
+        ('api-proveedor-list-create', 'get', 3, 0),
+        ('api-proveedor-list-create', 'post', 6, 3),
+        ('api-proveedor-detail', 'get', 2, 0),
+        ('api-proveedor-detail', 'patch', 6, 3),
+        ('api-proveedor-detail', 'delete', 9, 3),
+        ('api-compra-list-create', 'get', 3, 0),
+        ('api-compra-list-create', 'post', 15, 7),
+        ('api-compra-detail', 'get', 3, 0),
+        ('api-compra-detail', 'put', 20, 8),
+        ('api-compra-detail', 'delete', 14, 7),
+        ('api-detalles-compra-list-create', 'get', 2, 0),
+        ('api-detalles-compra-list-create', 'post', 10, 6),
+        ('api-detalles-compra-detail', 'get', 2, 0),
+        ('api-detalles-compra-detail', 'patch', 9, 6),
+        ('api-detalles-compra-detail', 'delete', 9, 6),
+        ('api-venta-list-create', 'get', 3, 0),
+        ('api-venta-list-create', 'post', 15, 7),
+        ('api-venta-detail', 'get', 3, 0),
+        ('api-venta-detail', 'put', 20, 8),
+        ('api-venta-detail', 'delete', 14, 7),
+        ('api-detalles-venta-list-create', 'get', 2, 0),
+        ('api-detalles-venta-list-create', 'post', 10, 6),
+        ('api-detalles-venta-detail', 'get', 2, 0),
+        ('api-detalles-venta-detail', 'patch', 9, 6),
+        ('api-detalles-venta-detail', 'delete', 9, 6),
+        ('api-reserva-list-create', 'get', 2, 0),
+        ('api-reserva-list-create', 'post', 7, 4),
+        ('api-reserva-confirmar', 'post', 15, 9),
+        ('api-reserva-detail', 'get', 1, 0),
+        ('api-reserva-detail', 'delete', 7, 4),
+        ('api-stock-historico', 'get', 2, 0),
+        ('api-autocompletar', 'get', 1, 0),
+        ('api-exportar', 'get', 1, 0),
+        ('api-importar', 'post', 15, 6),
+        ('api-producto-bulk', 'post', 8, 5),
+        ('api-cambios', 'get', 4, 0),
+        ('api-eventos', 'get', 2, 0),
+        ('api-async-producto-list', 'get', 4, 0),
+        ('api-async-producto-detail', 'get', 3, 0),
+        ('api-async-stock', 'get', 3, 0),
+        ('api-async-cliente-buscar', 'get', 3, 0),
+        ('api-async-venta-detail', 'get', 4, 0),
+        ('api-async-compra-detail', 'get', 4, 0),
+        ('api-metricas', 'get', 2, 0),
+        ('inicio', 'get', 2, 0),
+        ('producto-list', 'get', 3, 0),
+        ('producto-create', 'post', 9, 5),
+        ('producto-update', 'post', 10, 5),
+        ('producto-delete', 'post', 19, 7),
+        ('cliente-list', 'get', 3, 0),
+        ('cliente-create', 'post', 13, 4),
+        ('cliente-update', 'post', 14, 4),
+        ('cliente-delete', 'post', 14, 4),
+        ('proveedor-list', 'get', 3, 0),
+        ('proveedor-create', 'post', 12, 4),
+        ('proveedor-update', 'post', 13, 4),
+        ('proveedor-delete', 'post', 14, 4),
+        ('lista_compras', 'get', 5, 0),
+        ('crear_compra', 'post', 29, 13),
+        ('editar_compra', 'get', 6, 0),
+        ('editar_compra', 'post', 31, 13),
+        ('eliminar_compra', 'post', 15, 7),
+        ('lista_ventas', 'get', 5, 0),
+        ('crear_venta', 'post', 26, 10),
+        ('editar_venta', 'get', 6, 0),
+        ('editar_venta', 'post', 28, 10),
+        ('eliminar_venta', 'post', 15, 7),
+        ('login', 'get', 2, 0),
+        ('logout', 'post', 4, 1),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='presupuesto', password='testpass')
+        cls.productos = [
+            Producto.objects.create(nombre=f"Artículo {i:02d}", precio=Decimal('4.00'), stock=100000)
+            for i in range(40)
+        ]
+        cls.clientes = [Cliente.objects.create(nombre=f"Cliente {i}", email=f"c{i}@example.com") for i in range(3)]
+        cls.proveedores = [Proveedor.objects.create(nombre=f"Proveedor {i}", email=f"p{i}@example.com") for i in range(3)]
+        for i in range(12):
+            lineas = [
+                {'producto': p, 'cantidad': 2, 'precio_unitario': Decimal('4.00')}
+                for p in cls.productos[i:i + cls.LINEAS_POR_PEDIDO]
+            ]
+            with diferir_recalculos():
+                crear_lineas_venta_en_bloque(Venta.objects.create(cliente=cls.clientes[i % 3]), lineas)
+                crear_lineas_compra_en_bloque(Compra.objects.create(proveedor=cls.proveedores[i % 3]), lineas)
+        for producto in cls.productos[:5]:
+            reservar(producto.id, 1, usuario=cls.user)
+
+    @classmethod
+    def tearDownClass(cls):
+        destino = os.environ.get('INFORME_CONSULTAS')
+        if destino and cls.informe:
+            with open(destino, 'w', encoding='utf-8') as fichero:
+                json.dump(cls.informe, fichero, indent=2, ensure_ascii=False)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.client.force_authenticate(self.user)
+
+    # --- datos de cada petición ----------------------------------------
+
+    def _lineas(self, n=3):
+        return [
+            {'producto': p.id, 'cantidad': 1, 'precio_unitario': '4.00'}
+            for p in self.productos[20:20 + n]
+        ]
+
+    def _formset(self, prefijo, lineas):
+        datos = {
+            f'{prefijo}-TOTAL_FORMS': len(lineas), f'{prefijo}-INITIAL_FORMS': 0,
+            f'{prefijo}-MIN_NUM_FORMS': 0, f'{prefijo}-MAX_NUM_FORMS': 1000,
+        }
+        for i, linea in enumerate(lineas):
+            datos.update({f'{prefijo}-{i}-{campo}': valor for campo, valor in linea.items()})
+        return datos
+
+    def _peticion(self, nombre, metodo):
+        """Devuelve (args de la URL, datos, estado esperado) para cada caso."""
+        venta, compra = Venta.objects.order_by('id').first(), Compra.objects.order_by('id').first()
+        detalle_venta = venta.detalles.order_by('id').first()
+        detalle_compra = compra.detalles.order_by('id').first()
+        reserva = Reserva.objects.order_by('id').first()
+        producto_libre = Producto.objects.create(nombre="Sin movimientos", precio=1, stock=0)
+        cliente_libre = Cliente.objects.create(nombre="Sin ventas", email="libre@example.com")
+        proveedor_libre = Proveedor.objects.create(nombre="Sin compras", email="libre@example.com")
+        lineas = self._lineas()
+        total = str(sum(Decimal(l['precio_unitario']) * l['cantidad'] for l in lineas))
+        ok = {'get': 200, 'post': 201, 'put': 200, 'patch': 200, 'delete': 204}[metodo]
+        casos = {
+            'api-producto-list-create': ([], {'nombre': 'Nuevo', 'precio': '1.00', 'stock': 5}),
+            'api-producto-buscar': ([], {'q': 'artic'}),
+            'api-producto-detail': ([producto_libre.id], {'stock': 7}),
+            'api-cliente-list-create': ([], {'nombre': 'Nuevo', 'email': 'n@example.com'}),
+            'api-cliente-detail': ([cliente_libre.id], {'telefono': '600000000'}),
+            'api-proveedor-list-create': ([], {'nombre': 'Nuevo', 'email': 'n@example.com'}),
+            'api-proveedor-detail': ([proveedor_libre.id], {'telefono': '600000000'}),
+            'api-compra-list-create': ([], {'proveedor': self.proveedores[0].id, 'total': total, 'detalles': lineas}),
+            'api-compra-detail': ([compra.id], {'proveedor': self.proveedores[1].id, 'detalles': lineas}),
+            'api-detalles-compra-list-create': ([], dict(lineas[0], compra=compra.id)),
+            'api-detalles-compra-detail': ([detalle_compra.id], {'cantidad': 3}),
+            'api-venta-list-create': ([], {'cliente': self.clientes[0].id, 'total': total, 'detalles': lineas}),
+            'api-venta-detail': ([venta.id], {'cliente': self.clientes[1].id, 'detalles': lineas}),
+            'api-detalles-venta-list-create': ([], dict(lineas[0], venta=venta.id)),
+            'api-detalles-venta-detail': ([detalle_venta.id], {'cantidad': 3}),
+            'api-reserva-list-create': ([], {'producto': self.productos[30].id, 'cantidad': 2}),
+            'api-reserva-confirmar': ([], {'cliente': self.clientes[0].id, 'reservas': [reserva.id]}),
+            'api-reserva-detail': ([reserva.id], {}),
+            'api-stock-historico': ([], {'fecha': timezone.now().isoformat()}),
+            'api-autocompletar': (['productos'], {'q': 'art'}),
+            'api-exportar': (['ventas'], {'formato': 'ndjson', 'cliente': self.clientes[0].id}),
+            'api-importar': (['ventas'], '\n'.join(
+                json.dumps({'cliente': self.clientes[0].id, 'detalles': lineas}) for _ in range(50)
+            )),
+            'api-producto-bulk': ([], [
+                {'sku': f'SKU-{i}', 'nombre': f'Catálogo {i}', 'precio': '2.50', 'stock': 10} for i in range(50)
+            ]),
+            'api-cambios': ([], {'recursos': 'productos,ventas', 'limite': 100}),
+            'api-eventos': ([], {}),
+            'api-async-producto-list': ([], {'page': 2}),
+            'api-async-producto-detail': ([producto_libre.id], {}),
+            'api-async-stock': ([], {'ids': ','.join(str(p.id) for p in self.productos)}),
+            'api-async-cliente-buscar': ([], {'q': 'clie'}),
+            'api-async-venta-detail': ([venta.id], {}),
+            'api-async-compra-detail': ([compra.id], {}),
+            'api-metricas': ([], {}),
+            'inicio': ([], {}),
+            'producto-list': ([], {}),
+            'producto-create': ([], {'nombre': 'Nuevo', 'precio': '1.00', 'stock': 5}),
+            'producto-update': ([producto_libre.id], {'nombre': 'Otro', 'precio': '1.00', 'stock': 5}),
+            'producto-delete': ([producto_libre.id], {}),
+            'cliente-list': ([], {}),
+            'cliente-create': ([], {'nombre': 'Nuevo', 'email': 'n@example.com'}),
+            'cliente-update': ([cliente_libre.id], {'nombre': 'Otro', 'email': 'n@example.com'}),
+            'cliente-delete': ([cliente_libre.id], {}),
+            'proveedor-list': ([], {}),
+            'proveedor-create': ([], {'nombre': 'Nuevo', 'email': 'n@example.com'}),
+            'proveedor-update': ([proveedor_libre.id], {'nombre': 'Otro', 'email': 'n@example.com'}),
+            'proveedor-delete': ([proveedor_libre.id], {}),
+            'lista_compras': ([], {}),
+            'crear_compra': ([], dict(self._formset('detalles', lineas), proveedor=self.proveedores[0].id)),
+            'editar_compra': ([compra.id], dict(self._formset('detalles', lineas), proveedor=self.proveedores[1].id)),
+            'eliminar_compra': ([compra.id], {}),
+            'lista_ventas': ([], {}),
+            'crear_venta': ([], dict(self._formset('detalles', lineas), cliente=self.clientes[0].id)),
+            'editar_venta': ([venta.id], dict(self._formset('detalles', lineas), cliente=self.clientes[1].id)),
+            'eliminar_venta': ([venta.id], {}),
+            'login': ([], {}),
+            'logout': ([], {}),
+        }
+        args, datos = casos[nombre]
+        if metodo == 'get' and nombre not in ('api-stock-historico', 'api-producto-buscar', 'api-autocompletar', 'api-exportar', 'api-cambios',
+                                              'api-async-producto-list', 'api-async-stock', 'api-async-cliente-buscar'):
+            datos = {}
+        if nombre in self.RUTAS_HTML and metodo == 'post':
+            ok = 302
+        if nombre in ('api-importar', 'api-producto-bulk'):
+            ok = 200  # Responde con el informe de la importación
+        if nombre == 'api-eventos':
+            ok = 501  # El stream sólo se sirve bajo ASGI (ver EventosTest)
+        if nombre == 'api-metricas':
+            ok = 403  # Sólo staff o con token (ver PerfiladoTest)
+        return args, datos, ok
+
+    def _medir(self, nombre, metodo):
+        args, datos, esperado = self._peticion(nombre, metodo)
+        url = reverse(nombre, args=args)
+        formato = {} if nombre in self.RUTAS_HTML else {'format': 'json'}
+        if nombre == 'api-importar':
+            formato = {'content_type': 'application/x-ndjson'}
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, metodo)(url, datos, **formato)
+            if response.streaming:
+                b''.join(response.streaming_content)  # Las consultas se lanzan al leerla
+        self.assertEqual(response.status_code, esperado, f"{metodo.upper()} {url}: {getattr(response, 'data', '')}")
+        sentencias = [q['sql'].lstrip().split(' ', 1)[0].upper() for q in ctx.captured_queries]
+        escrituras = sum(s in ('INSERT', 'UPDATE', 'DELETE') for s in sentencias)
+        return len(sentencias), escrituras
+
+    def test_todas_las_rutas_tienen_presupuesto(self):
+        """
+        Cada ruta con nombre de api_urls.py y urls.py aparece en PRESUPUESTOS.
+        """
+        con_presupuesto = {nombre for nombre, *_ in self.PRESUPUESTOS}
+        todas = {p.name for p in api_urls.urlpatterns + html_urls.urlpatterns if p.name}
+        self.assertEqual(todas - con_presupuesto, set())
+
+    def test_presupuesto_por_ruta(self):
+        """
+        Ninguna ruta supera su máximo de consultas ni de escrituras.
+        """
+        for nombre, metodo, max_consultas, max_escrituras in self.PRESUPUESTOS:
+            with self.subTest(ruta=nombre, metodo=metodo):
+                with transaction.atomic():
+                    consultas, escrituras = self._medir(nombre, metodo)
+                    transaction.set_rollback(True)
+                self.informe.append({
+                    'ruta': nombre, 'metodo': metodo.upper(),
+                    'consultas': consultas, 'max_consultas': max_consultas,
+                    'escrituras': escrituras, 'max_escrituras': max_escrituras,
+                })
+                self.assertLessEqual(consultas, max_consultas)
+                self.assertLessEqual(escrituras, max_escrituras)
+
+
+
+# ----------------------------
+# Test perfilado de peticiones y métricas
+# ----------------------------
+from django.test import override_settings
+from inventario.perfilado import registro
+
+
+class PerfiladoTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin5', password='testpass')
+        self.client.force_authenticate(self.user)
+        registro.vaciar()
+
+    def test_server_timing_y_metricas_por_ruta(self):
+        """
+        Cada respuesta muestreada lleva Server-Timing y suma una observación al
+        histograma de su ruta, visible en /api/_metrics/.
+        """
+        Producto.objects.create(nombre="Grapadora", precio=Decimal('8.00'), stock=3)
+        response = self.client.get(reverse('api-producto-list-create'))
+        cabecera = response['Server-Timing']
+        for tramo in ('total;dur=', 'bd;dur=', 'serializador;dur=', 'senales;dur='):
+            self.assertIn(tramo, cabecera)
+        self.assertIn('consultas"', cabecera)
+
+        self.client.force_login(User.objects.create_user(username='staff5', password='testpass', is_staff=True))
+        texto = self.client.get(reverse('api-metricas')).content.decode()
+        self.assertIn('# TYPE inventario_peticion_segundos histogram', texto)
+        self.assertIn(
+            'inventario_peticion_segundos_count{ruta="api/productos/",metodo="GET",estado="200"} 1', texto
+        )
+        self.assertIn('inventario_consultas_total{ruta="api/productos/",metodo="GET",estado="200"}', texto)
+
+    @override_settings(PERFILADO_MUESTREO=0)
+    def test_sin_muestreo_no_se_mide(self):
+        response = self.client.get(reverse('api-producto-list-create'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('api/productos/', registro.exportar())
+
+    @override_settings(PERFILADO_METRICAS_TOKEN='secreto')
+    def test_metricas_con_token(self):
+        self.assertEqual(self.client.get(reverse('api-metricas')).status_code, 403)
+        response = self.client.get(reverse('api-metricas'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('api-metricas'), HTTP_AUTHORIZATION='Bearer otro')
+        self.assertEqual(response.status_code, 403)
+
+    def test_metricas_cerradas_por_defecto(self):
+        """
+        Sin token configurado sólo las ve un usuario staff, salvo que se abran expresamente.
+        """
+        self.client.force_authenticate(None)
+        url = reverse('api-metricas')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username='staff6', password='testpass', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.logout()
+        with self.settings(PERFILADO_METRICAS_PUBLICAS=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+
+# ----------------------------
+# Test registro de consultas lentas
+# ----------------------------
+import tempfile
+from inventario.consultas_lentas import leer_registros, normalizar_sql
+
+
+class ConsultasLentasTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin6', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.carpeta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.carpeta.cleanup)
+        self.fichero = os.path.join(self.carpeta.name, 'lentas.log')
+
+    def test_registra_vista_plan_y_pila(self):
+        """
+        Con umbral 0 cada consulta de la petición queda en el log con la vista
+        de origen y su EXPLAIN QUERY PLAN; slow_queries las agrupa por forma.
+        """
+        with self.settings(CONSULTAS_LENTAS_UMBRAL_MS=0, CONSULTAS_LENTAS_FICHERO=self.fichero):
+            self.client.post(reverse('api-cliente-list-create'), {"nombre": "Lento SL", "email": "l@example.com"}, format='json')
+        registros = list(leer_registros(self.fichero))
+        validacion = [r for r in registros if 'nombre_normalizado' in r['sql'] and r['sql'].startswith('SELECT')]
+        self.assertTrue(validacion)
+        self.assertEqual(validacion[0]['vista'], 'POST /api/clientes/ (api-cliente-list-create)')
+        self.assertTrue(any('USING COVERING INDEX' in paso or 'USING INDEX' in paso for paso in validacion[0]['plan']))
+        self.assertTrue(any('serializers.py' in marco for marco in validacion[0]['pila']))
+
+        salida = StringIO()
+        call_command('slow_queries', fichero=self.fichero, stdout=salida)
+        self.assertIn('Formas distintas:', salida.getvalue())
+        self.assertIn('vista: POST /api/clientes/', salida.getvalue())
+
+    def test_sin_umbral_no_registra(self):
+        with self.settings(CONSULTAS_LENTAS_UMBRAL_MS=None, CONSULTAS_LENTAS_FICHERO=self.fichero):
+            self.client.get(reverse('api-cliente-list-create'))
+        self.assertFalse(os.path.exists(self.fichero))
+
+    def test_normalizar_sql(self):
+        self.assertEqual(
+            normalizar_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 'a'  LIMIT 21"),
+            normalizar_sql("SELECT * FROM t WHERE id IN (%s) AND x = 'b' LIMIT 5"),
+        )
+
+
+# ----------------------------
+# Test filtros de la API y uso de índices
+# ----------------------------
+from datetime import date
+from inventario.filters import CompraFilter, DetalleVentaFilter, VentaFilter
+
+
+class FiltrosIndicesTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin7', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.clientes = [Cliente.objects.create(nombre=f"Filtro {i}", email=f"f{i}@example.com") for i in range(2)]
+        self.proveedor = Proveedor.objects.create(nombre="Prov Filtro", email="pf@example.com")
+        self.productos = [
+            Producto.objects.create(nombre=f"Clip {i}", precio=Decimal('1.00'), stock=100) for i in range(2)
+        ]
+        for cliente, producto in zip(self.clientes, self.productos):
+            venta = Venta.objects.create(cliente=cliente)
+            DetalleVenta.objects.create(venta=venta, producto=producto, cantidad=2, precio_unitario=5)
+        self.antigua = Venta.objects.create(cliente=self.clientes[0])
+        Venta.objects.filter(pk=self.antigua.pk).update(fecha=timezone.now() - timedelta(days=40))
+
+    def _ids(self, url, **params):
+        return sorted(v['id'] for v in self.client.get(reverse(url), params).data['results'])
+
+    def test_filtros_de_ventas(self):
+        """
+        /api/ventas/ filtra por cliente, rango de días, producto y total.
+        """
+        hoy = timezone.localdate()
+        todas = self._ids('api-venta-list-create', cliente=self.clientes[0].id)
+        self.assertEqual(len(todas), 2)
+        recientes = self._ids('api-venta-list-create', cliente=self.clientes[0].id,
+                              fecha_desde=(hoy - timedelta(days=30)).isoformat(), fecha_hasta=hoy.isoformat())
+        self.assertNotIn(self.antigua.id, recientes)
+        self.assertEqual(len(recientes), 1)
+        self.assertEqual(len(self._ids('api-venta-list-create', producto=self.productos[1].id)), 1)
+        self.assertEqual(len(self._ids('api-venta-list-create', total_min=5)), 2)
+        self.assertEqual(len(self._ids('api-detalles-venta-list-create', cliente=self.clientes[1].id)), 1)
+
+    def _plan(self, filterset, orden):
+        return filterset.qs.order_by(*orden).explain()
+
+    def test_los_filtros_usan_indices(self):
+        """
+        El plan de SQLite (EXPLAIN QUERY PLAN) de cada filtro usa el índice compuesto previsto.
+        """
+        hoy = date.today()
+        plan = self._plan(VentaFilter({'cliente': self.clientes[0].id, 'fecha_desde': hoy.isoformat()},
+                                      queryset=Venta.objects.all()), ('fecha', 'id'))
+        self.assertIn('venta_cliente_fecha_idx', plan)
+        plan = self._plan(CompraFilter({'proveedor': self.proveedor.id}, queryset=Compra.objects.all()),
+                          ('fecha', 'id'))
+        self.assertIn('compra_proveedor_fecha_idx', plan)
+        plan = self._plan(VentaFilter({'producto': self.productos[0].id}, queryset=Venta.objects.all()),
+                          ('fecha', 'id'))
+        self.assertIn('detventa_producto_venta_idx', plan)
+        plan = self._plan(DetalleVentaFilter({'producto': self.productos[0].id},
+                                             queryset=DetalleVenta.objects.all()), ('id',))
+        self.assertIn('detventa_producto_venta_idx', plan)
+        plan = self._plan(VentaFilter({'fecha_desde': hoy.isoformat()}, queryset=Venta.objects.all()),
+                          ('fecha', 'id'))
+        self.assertIn('venta_fecha_id_idx', plan)
+
+
+# ----------------------------
+# Test búsqueda de productos (FTS5)
+# ----------------------------
+from inventario.servicios.busqueda import buscar_productos, consulta_fts
+
+
+class BusquedaProductosTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin8', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.toner = Producto.objects.create(nombre="Cartucho de tóner HP", descripcion="Negro, 2000 páginas",
+                                             precio=Decimal('45.00'), stock=5)
+        self.papel = Producto.objects.create(nombre="Papel A4", descripcion="Apto para impresora de tóner",
+                                             precio=Decimal('5.00'), stock=50)
+
+    def _nombres(self, texto):
+        return [p.nombre for p in buscar_productos(texto)]
+
+    def test_prefijo_tildes_y_ranking(self):
+        """
+        "toner" encuentra "tóner", "cart ton" busca por prefijo y lo que coincide
+        en el nombre sale antes que lo que coincide sólo en la descripción.
+        """
+        self.assertEqual(self._nombres("toner"), ["Cartucho de tóner HP", "Papel A4"])
+        self.assertEqual(self._nombres("cart ton"), ["Cartucho de tóner HP"])
+        self.assertEqual(self._nombres("PÁGINAS"), ["Cartucho de tóner HP"])
+        self.assertEqual(self._nombres('" OR *'), [])
+
+    def test_indice_al_dia_al_guardar_y_borrar(self):
+        self.papel.nombre = "Folios reciclados"
+        self.papel.save()
+        self.assertEqual(self._nombres("folios"), ["Folios reciclados"])
+        self.assertEqual(self._nombres("papel"), [])
+        self.toner.delete()
+        self.assertEqual(self._nombres("cartucho"), [])
+
+    def test_endpoint_y_reconstruccion(self):
+        """
+        /api/productos/buscar/?q= responde con los productos encontrados, y el
+        índice se puede regenerar con reconstruir_busqueda.
+        """
+        response = self.client.get(reverse('api-producto-buscar'), {'q': 'hp'})
+        self.assertEqual([p['id'] for p in response.data], [self.toner.id])
+        salida = StringIO()
+        call_command('reconstruir_busqueda', stdout=salida)
+        self.assertIn('2 productos', salida.getvalue())
+        self.assertEqual(self._nombres("cartucho"), ["Cartucho de tóner HP"])
+
+    def test_ranking_entre_todas_las_coincidencias(self):
+        """
+        Con más coincidencias que un posible corte, el mejor resultado sale
+        primero aunque sea el último por rowid, y los archivados no cuentan.
+        """
+        Producto.objects.bulk_create([
+            Producto(nombre=f"Artículo {i}", descripcion="Caja con papel de regalo", precio=1)
+            for i in range(1200)
+        ])
+        archivado = Producto.objects.create(nombre="Papel papel kraft", precio=1, archivado=True)
+        mejor = Producto.objects.create(nombre="Papel kraft", precio=1)
+        resultados = buscar_productos("papel", limite=3)
+        self.assertEqual(resultados[0].id, mejor.id)
+        self.assertNotIn(archivado.id, [p.id for p in resultados])
+        self.assertEqual(buscar_productos("papel", limite=1, incluir_archivados=True)[0].id, archivado.id)
+
+    def test_consulta_fts_escapa_operadores(self):
+        self.assertEqual(consulta_fts('tóner NEAR(x)'), '"tóner"* "NEAR"* "x"*')
+
+
+# ----------------------------
+# Test autocompletar por prefijo
+# ----------------------------
+from inventario.servicios.autocompletar import autocompletar, invalidar_autocompletar
+
+
+class AutocompletarTest(APITestCase):
+    def setUp(self):
+        invalidar_autocompletar()
+        self.user = User.objects.create_user(username='admin9', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.alvarez = Cliente.objects.create(nombre="Álvarez  Ruiz", email="a@example.com")
+        self.alonso = Cliente.objects.create(nombre="alonso", email="b@example.com")
+        Cliente.objects.create(nombre="Archivado Al", email="c@example.com", archivado=True)
+        Cliente.objects.create(nombre="Beltrán", email="d@example.com")
+
+    def test_prefijo_sin_tildes_ni_archivados(self):
+        self.assertEqual(self.alvarez.nombre_normalizado, "alvarez ruiz")
+        self.assertEqual(
+            [o['text'] for o in autocompletar('clientes', 'AL')], ["alonso", "Álvarez  Ruiz"]
+        )
+        self.assertEqual([o['id'] for o in autocompletar('clientes', 'álv')], [self.alvarez.id])
+        self.assertEqual(autocompletar('clientes', 'zz'), [])
+
+    def test_cache_se_invalida_al_guardar(self):
+        self.assertEqual(len(autocompletar('clientes', 'al')), 2)
+        with self.assertNumQueries(0):
+            autocompletar('clientes', 'al')
+        self.alonso.nombre = "Zamora"
+        self.alonso.save()
+        self.assertEqual([o['text'] for o in autocompletar('clientes', 'al')], ["Álvarez  Ruiz"])
+
+    def test_endpoint(self):
+        url = reverse('api-autocompletar', args=['clientes'])
+        response = self.client.get(url, {'q': 'alv'})
+        self.assertEqual(response.data, {'results': [{'id': self.alvarez.id, 'text': "Álvarez  Ruiz"}]})
+        self.assertEqual(self.client.get(url, {'q': ''}).data, {'results': []})
+        self.assertEqual(self.client.get(reverse('api-autocompletar', args=['usuarios']), {'q': 'a'}).status_code, 404)
+
+    def test_formulario_solo_muestra_lo_seleccionado(self):
+        """
+        El desplegable de cliente del formulario de venta no lista todos los
+        clientes: sólo el vacío y el elegido, y carga el resto al escribir.
+        """
+        venta = Venta.objects.create(cliente=self.alonso)
+        self.client.force_login(self.user)
+        html = self.client.get(reverse('editar_venta', args=[venta.id])).content.decode()
+        self.assertIn('data-autocompletar="%s"' % reverse('api-autocompletar', args=['clientes']), html)
+        self.assertIn('inventario/js/autocompletar.js', html)
+        self.assertIn('selected>alonso</option>', html)
+        self.assertNotIn('Beltrán', html)
+
+
+# ----------------------------
+# Test nombre único de clientes y proveedores
+# ----------------------------
+from rest_framework.exceptions import ValidationError as DRFValidationError
+from inventario.forms import ClienteForm, ProveedorForm
+from inventario.serializers import ClienteSerializer
+
+
+class NombreUnicoTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin10', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.perez = Cliente.objects.create(nombre="Papelería Pérez", email="perez@example.com")
+
+    def test_api_rechaza_sin_tildes_ni_mayusculas(self):
+        url = reverse('api-cliente-list-create')
+        response = self.client.post(url, {"nombre": " PAPELERIA  perez", "email": "otro@example.com"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('nombre', response.data)
+        response = self.client.patch(reverse('api-cliente-detail', args=[self.perez.id]),
+                                     {"nombre": "papelería pérez"}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_carrera_en_la_api_responde_400(self):
+        """
+        Si otro alta gana entre la validación y el INSERT, el índice único lo
+        impide y el serializador lo convierte en error de 'nombre'.
+        """
+        serializer = ClienteSerializer(data={"nombre": "Nuevo SL", "email": "nuevo@example.com"})
+        self.assertTrue(serializer.is_valid())
+        Cliente.objects.create(nombre="NUEVO SL", email="gana@example.com")
+        with self.assertRaises(DRFValidationError) as ctx:
+            serializer.save()
+        self.assertIn('nombre', ctx.exception.detail)
+        self.assertEqual(Cliente.objects.filter(nombre_normalizado="nuevo sl").count(), 1)
+
+    def test_formularios(self):
+        form = ProveedorForm(data={"nombre": "Sur", "email": "sur@example.com"})
+        self.assertTrue(form.is_valid())
+        Proveedor.objects.create(nombre="sur ", email="otro@example.com")
+        self.assertIsNone(form.guardar())
+        self.assertIn('nombre', form.errors)
+
+        form = ClienteForm(data={"nombre": "Papeleria Perez", "email": "x@example.com"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['nombre'], ["Ya existe un cliente con este nombre."])
+        form = ClienteForm(data={"nombre": "PAPELERÍA PÉREZ", "email": "perez@example.com"}, instance=self.perez)
+        self.assertTrue(form.is_valid())
+
+    def test_duplicado_antiguo_se_puede_editar(self):
+        """
+        Un duplicado anterior al índice único (clave con " #<id>", migración
+        0010) se edita sin perder su clave mientras no cambie de nombre.
+        """
+        antiguo = Cliente.objects.create(nombre="Papelería Perez B", email="b@example.com")
+        Cliente.objects.filter(pk=antiguo.pk).update(
+            nombre="Papelería Perez", nombre_normalizado=f"papeleria perez #{antiguo.pk}"
+        )
+        url = reverse('api-cliente-detail', args=[antiguo.id])
+        response = self.client.patch(url, {"telefono": "600000000"}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        response = self.client.put(url, {"nombre": "Papelería Perez", "email": "b@example.com"}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+
+        antiguo.refresh_from_db()
+        form = ClienteForm(data={"nombre": antiguo.nombre, "email": "c@example.com"}, instance=antiguo)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.guardar()
+        antiguo.refresh_from_db()
+        self.assertEqual(antiguo.nombre_normalizado, f"papeleria perez #{antiguo.pk}")
+
+        response = self.client.patch(url, {"nombre": "Papelería Norte"}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        antiguo.refresh_from_db()
+        self.assertEqual(antiguo.nombre_normalizado, "papeleria norte")
+
+
+# ----------------------------
+# Test exportación en streaming
+# ----------------------------
+import csv as csv_modulo
+from unittest.mock import patch
+from inventario.servicios import exportacion
+
+
+class ExportacionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin11', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.luis = Cliente.objects.create(nombre="Luis", email="luis@example.com")
+        self.producto = Producto.objects.create(nombre="Grapadora", precio=Decimal('3.50'), stock=1000)
+        for cliente in (self.ana, self.luis, self.ana):
+            crear_lineas_venta_en_bloque(Venta.objects.create(cliente=cliente), [
+                {'producto': self.producto, 'cantidad': 2, 'precio_unitario': Decimal('3.50')},
+                {'producto': self.producto, 'cantidad': 1, 'precio_unitario': Decimal('3.50')},
+            ])
+
+    def _descargar(self, recurso, **params):
+        response = self.client.get(reverse('api-exportar', args=[recurso]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_de_ventas_con_filtro_de_cliente(self):
+        response, contenido = self._descargar('ventas', cliente=self.ana.id)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="ventas-', response['Content-Disposition'])
+        filas = list(csv_modulo.DictReader(contenido.splitlines()))
+        self.assertEqual(len(filas), 4)
+        self.assertEqual({f['cliente'] for f in filas}, {"Ana"})
+        self.assertEqual(filas[0]['subtotal'], '7.00')
+
+    def test_ndjson_por_trozos_y_fechas(self):
+        """
+        Con trozos de 1 fila cada línea llega por separado; un rango de fechas
+        vacío devuelve una exportación vacía, no un error.
+        """
+        with patch.object(exportacion, 'FILAS_POR_TROZO', 1):
+            response = self.client.get(reverse('api-exportar', args=['ventas']), {'formato': 'ndjson'})
+            trozos = list(response.streaming_content)
+        self.assertEqual(len(trozos), 6)
+        self.assertEqual(json.loads(trozos[0])['producto'], "Grapadora")
+        _, contenido = self._descargar('ventas', formato='ndjson', fecha_hasta='2000-01-01')
+        self.assertEqual(contenido, '')
+
+    def test_stock_y_parametros_no_validos(self):
+        Producto.objects.create(nombre="Viejo", precio=1, stock=0, archivado=True)
+        _, contenido = self._descargar('stock')
+        self.assertEqual(contenido.splitlines(), [
+            'producto_id,nombre,precio,stock,reservado,disponible,archivado',
+            f'{self.producto.id},Grapadora,3.50,991,0,991,False',
+        ])
+        self.assertEqual(self.client.get(reverse('api-exportar', args=['ventas']), {'formato': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-exportar', args=['ventas']), {'fecha_desde': 'ayer'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-exportar', args=['clientes'])).status_code, 404)
+
+
+# ----------------------------
+# Test importación masiva de ventas y compras
+# ----------------------------
+from django.core.files.uploadedfile import SimpleUploadedFile
+from inventario.servicios.importacion import importar_compras, importar_ventas
+from inventario.servicios.stock import aplicar_deltas
+
+
+class ImportacionTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin12', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Tienda Centro", email="centro@example.com")
+        self.proveedor = Proveedor.objects.create(nombre="Mayorista Sur")
+        self.boli = Producto.objects.create(nombre="Bolígrafo", precio=Decimal('0.50'), stock=10)
+        self.goma = Producto.objects.create(nombre="Goma", precio=Decimal('0.30'), stock=100)
+
+    def _venta(self, *lineas, **extra):
+        detalles = [{'producto': p.id, 'cantidad': c, 'precio_unitario': '0.50'} for p, c in lineas]
+        return json.dumps(dict({'cliente': self.cliente.id, 'detalles': detalles}, **extra))
+
+    def test_errores_por_registro_sin_abortar(self):
+        """
+        Los registros válidos se guardan (con total, stock e histórico) aunque
+        otros del mismo fichero no existan, no cuadren o agoten el stock.
+        """
+        fichero = [
+            self._venta((self.boli, 4), (self.goma, 10)),
+            '{no es json',
+            json.dumps({'cliente': 999, 'detalles': []}),
+            self._venta((self.boli, 4), total='1.00'),
+            self._venta((self.boli, 4)),
+            self._venta((self.boli, 4)),  # Ya sólo quedan 2 bolígrafos
+        ]
+        resultado = importar_ventas(fichero, lote=2)
+        self.assertEqual((resultado.creados, resultado.lineas, resultado.total_errores), (2, 3, 4))
+        self.assertEqual([e['registro'] for e in resultado.errores], [2, 3, 4, 6])
+        self.assertIn('cliente', resultado.errores[1]['errores'])
+        self.assertIn('total', resultado.errores[2]['errores'])
+        self.assertIn('stock', resultado.errores[3]['errores']['detalles'])
+
+        self.boli.refresh_from_db()
+        self.goma.refresh_from_db()
+        self.assertEqual((self.boli.stock, self.goma.stock), (2, 90))
+        self.assertEqual(sorted(Venta.objects.values_list('total', flat=True)), [Decimal('2.00'), Decimal('7.00')])
+        self.assertEqual(
+            MovimientoStock.objects.filter(origen=MovimientoStock.VENTA, producto=self.boli).count(), 2
+        )
+
+    def test_cantidades_no_enteras_son_error(self):
+        """
+        2.7 o true no se truncan a 2 o 1: como en la API, son un error del registro.
+        """
+        fichero = [self._venta((self.boli, 2.7)), self._venta((self.boli, True)), self._venta((self.boli, ' 3 '))]
+        resultado = importar_ventas(fichero)
+        self.assertEqual((resultado.creados, resultado.total_errores), (1, 2))
+        for error in resultado.errores:
+            self.assertIn('detalles[0].cantidad', error['errores'])
+        self.boli.refresh_from_db()
+        self.assertEqual(self.boli.stock, 7)
+
+    def test_un_update_de_stock_por_lote(self):
+        fichero = [self._venta((self.boli, 1), (self.goma, 1)) for _ in range(5)]
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = importar_ventas(fichero)
+        self.assertEqual(resultado.creados, 5)
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "inventario_producto"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_venta_concurrente_solo_rechaza_lo_que_no_tiene_stock(self):
+        """
+        Si otra venta se lleva stock entre la validación y el UPDATE, el lote se
+        vuelve a validar con el stock de ahora: sólo falla la venta que ya no cabe.
+        """
+        from inventario.servicios import importacion
+        guardar = importacion._guardar_lote
+        llamadas = []
+
+        def guardar_tras_venta_ajena(tipo, validos):
+            if not llamadas:
+                Producto.objects.filter(pk=self.boli.pk).update(stock=5)
+            llamadas.append(len(validos))
+            return guardar(tipo, validos)
+
+        fichero = [self._venta((self.boli, 4)), self._venta((self.goma, 5)), self._venta((self.boli, 4))]
+        with patch.object(importacion, '_guardar_lote', guardar_tras_venta_ajena):
+            resultado = importar_ventas(fichero)
+        self.assertEqual(llamadas, [3, 2])
+        self.assertEqual((resultado.creados, resultado.total_errores), (2, 1))
+        self.assertEqual(resultado.errores[0]['registro'], 3)
+        self.assertIn('stock', resultado.errores[0]['errores']['detalles'])
+        self.boli.refresh_from_db()
+        self.goma.refresh_from_db()
+        self.assertEqual((self.boli.stock, self.goma.stock), (1, 95))
+
+    def test_comando_csv_agrupa_por_pedido(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write("pedido,proveedor,producto,cantidad,precio_unitario\n")
+            f.write(f"A,{self.proveedor.id},{self.boli.id},5,0.20\n")
+            f.write(f"A,{self.proveedor.id},{self.goma.id},5,0.10\n")
+            f.write(f"B,{self.proveedor.id},{self.goma.id},x,0.10\n")
+        self.addCleanup(os.remove, f.name)
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_compras', f.name, stdout=salida, stderr=errores)
+        self.assertIn('Compras creadas: 1 (2 líneas', salida.getvalue())
+        self.assertIn('Registro 4', errores.getvalue())
+        compra = Compra.objects.get()
+        self.assertEqual((compra.total, compra.detalles.count()), (Decimal('1.50'), 2))
+        self.boli.refresh_from_db()
+        self.assertEqual(self.boli.stock, 15)
+
+    def test_endpoint_cuerpo_y_multipart(self):
+        url = reverse('api-importar', args=['ventas'])
+        response = self.client.post(url, self._venta((self.goma, 1)), content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.data['creados']), (200, 1))
+        fichero = SimpleUploadedFile('c.ndjson', json.dumps(
+            {'proveedor': self.proveedor.id, 'detalles': [{'producto': self.goma.id, 'cantidad': 3, 'precio_unitario': '0.1'}]}
+        ).encode())
+        response = self.client.post(reverse('api-importar', args=['compras']), {'fichero': fichero}, format='multipart')
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual(self.client.post(url + '?formato=xml', '', content_type='text/csv').status_code, 400)
+
+    def test_aplicar_deltas_deshace_el_lote(self):
+        """Si un producto no tiene stock, no se aplica ninguno de los deltas del lote."""
+        with self.assertRaises(StockInsuficienteError):
+            with transaction.atomic():
+                aplicar_deltas({self.goma.id: -5, self.boli.id: -50})
+        self.goma.refresh_from_db()
+        self.assertEqual(self.goma.stock, 100)
+        aplicar_deltas({self.goma.id: -5, self.boli.id: 3})
+        self.assertEqual(
+            dict(Producto.objects.values_list('id', 'stock')), {self.boli.id: 13, self.goma.id: 95}
+        )
+
+
+# ----------------------------
+# Test alta y actualización masiva del catálogo por SKU
+# ----------------------------
+from inventario.servicios.busqueda import buscar_productos
+from inventario.servicios.catalogo import sincronizar_catalogo
+
+
+class CatalogoTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin13', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.toner = Producto.objects.create(nombre="Tóner negro", sku='TN-1', precio=Decimal('40.00'), stock=5)
+
+    def test_inserta_y_actualiza_por_sku(self):
+        resultado = sincronizar_catalogo([
+            {'sku': 'TN-1', 'nombre': 'Tóner negro XL', 'precio': '45.5', 'stock': 8},
+            {'sku': 'PP-1', 'nombre': 'Papel A4', 'precio': '3.20', 'stock': 100, 'descripcion': '500 hojas'},
+            {'sku': 'PP-2', 'nombre': 'Papel A3', 'precio': '6'},
+        ], lote=2)
+        self.assertEqual((resultado.insertados, resultado.actualizados, resultado.rechazados), (2, 1, 0))
+        self.toner.refresh_from_db()
+        self.assertEqual((self.toner.nombre, self.toner.precio, self.toner.stock), ('Tóner negro XL', Decimal('45.50'), 8))
+        papel = Producto.objects.get(sku='PP-1')
+        self.assertEqual((papel.stock, papel.descripcion, papel.nombre_normalizado), (100, '500 hojas', 'papel a4'))
+        self.assertEqual(Producto.objects.get(sku='PP-2').stock, 0)
+
+        # Como al editar a mano: alta como stock inicial y cambios como ajuste
+        movimientos = dict(
+            MovimientoStock.objects.filter(producto__sku__in=['TN-1', 'PP-1']).values_list('producto__sku', 'cantidad')
+            .exclude(origen=MovimientoStock.INICIAL, producto__sku='TN-1')
+        )
+        self.assertEqual(movimientos, {'TN-1': 3, 'PP-1': 100})
+        # El índice de búsqueda sigue al día tras el upsert
+        self.assertEqual([p.sku for p in buscar_productos('xl')], ['TN-1'])
+
+    def test_sin_stock_conserva_el_actual(self):
+        resultado = sincronizar_catalogo([{'sku': 'TN-1', 'nombre': 'Tóner', 'precio': '39.99'}])
+        self.assertEqual(resultado.actualizados, 1)
+        self.toner.refresh_from_db()
+        self.assertEqual((self.toner.stock, self.toner.precio), (5, Decimal('39.99')))
+
+    def test_filas_rechazadas_sin_afectar_al_resto(self):
+        Producto.objects.filter(pk=self.toner.pk).update(reservado=4)
+        resultado = sincronizar_catalogo([
+            {'sku': 'A', 'nombre': 'Uno', 'precio': '0'},
+            {'sku': 'B', 'nombre': 'Dos', 'precio': '1', 'stock': -1},
+            {'sku': 'C', 'nombre': 'Tres', 'precio': '1'},
+            {'sku': 'C', 'nombre': 'Tres bis', 'precio': '1'},
+            {'sku': 'TN-1', 'nombre': 'Tóner', 'precio': '40', 'stock': 3},
+            {'nombre': 'Sin SKU', 'precio': '1'},
+            'no es un objeto',
+        ])
+        self.assertEqual((resultado.insertados, resultado.rechazados), (1, 6))
+        self.assertEqual([e['fila'] for e in resultado.errores], [1, 2, 4, 6, 7, 5])
+        self.assertIn('reservado', resultado.errores[-1]['errores']['stock'])
+        self.assertEqual(Producto.objects.get(sku='C').nombre, 'Tres')
+
+    def test_stock_se_lee_con_el_bloqueo_tomado(self):
+        """
+        El stock que se sustituye (y con el que se calcula el ajuste) se lee
+        dentro de la transacción del upsert y después de tomar el bloqueo.
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            sincronizar_catalogo([{'sku': 'TN-1', 'nombre': 'Tóner', 'precio': '40', 'stock': 8}])
+        sql = [q['sql'] for q in ctx.captured_queries]
+        bloqueo = next(i for i, q in enumerate(sql) if q.startswith('UPDATE "inventario_producto"'))
+        lectura = next(i for i, q in enumerate(sql) if q.startswith('SELECT') and '"reservado"' in q)
+        self.assertLess(bloqueo, lectura)
+        self.assertTrue(MovimientoStock.objects.filter(
+            producto=self.toner, origen=MovimientoStock.AJUSTE, cantidad=3).exists())
+
+    def test_endpoint(self):
+        url = reverse('api-producto-bulk')
+        response = self.client.post(url, {'productos': [{'sku': 'X-1', 'nombre': 'Grapas', 'precio': '1.10'}]}, format='json')
+        self.assertEqual((response.status_code, response.data['insertados']), (200, 1))
+        self.assertEqual(self.client.post(url, {'productos': 'x'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(url + '?lote=x', [], format='json').status_code, 400)
+
+    def test_comando_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as f:
+            f.write("sku,nombre,precio,stock\n")
+            f.write("TN-1,Tóner negro,41.00,\n")
+            f.write("CL-1,Clips,0.90,200\n")
+            f.write("CL-2,Clips grandes,gratis,1\n")
+        self.addCleanup(os.remove, f.name)
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_catalogo', f.name, stdout=salida, stderr=errores)
+        self.assertIn('insertados: 1, actualizados: 1. Filas rechazadas: 1', salida.getvalue())
+        self.assertIn('Fila 3', errores.getvalue())
+        self.toner.refresh_from_db()
+        self.assertEqual((self.toner.precio, self.toner.stock), (Decimal('41.00'), 5))
+
+
+# ----------------------------
+# Test caché de respuestas de productos, clientes y proveedores
+# ----------------------------
+from django.core.cache import caches
+from inventario.servicios.cache_respuestas import estadisticas_cache_respuestas, invalidar_respuestas
+
+
+class CacheRespuestasTest(APITestCase):
+    def setUp(self):
+        caches['respuestas'].clear()
+        self.user = User.objects.create_user(username='admin14', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Papelería Norte")
+        self.producto = Producto.objects.create(nombre="Cuaderno", precio=Decimal('2.00'), stock=10)
+        self.url = reverse('api-producto-detail', args=[self.producto.id])
+
+    def _get(self, url, datos=None):
+        return self.client.get(url, datos or {}, format='json')
+
+    def test_segunda_lectura_sin_leer_la_tabla(self):
+        primera = self._get(reverse('api-producto-list-create'))
+        self.assertEqual(primera['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as ctx:
+            segunda = self._get(reverse('api-producto-list-create'))
+        # Sólo se lee la versión de la tabla para el ETag
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if 'inventario_producto' in q['sql']], [])
+        self.assertEqual(segunda.data, primera.data)
+
+    def test_clave_por_consulta_y_perfil(self):
+        self._get(reverse('api-cliente-list-create'), {'page': 1, 'archivados': 1})
+        self.assertEqual(self._get(reverse('api-cliente-list-create'), {'archivados': 1, 'page': 1})['X-Cache'], 'HIT')
+        self.assertEqual(self._get(reverse('api-cliente-list-create'), {'page': 1})['X-Cache'], 'MISS')
+        staff = User.objects.create_user(username='staff14', password='testpass', is_staff=True)
+        self.client.force_authenticate(staff)
+        self.assertEqual(self._get(reverse('api-cliente-list-create'), {'page': 1})['X-Cache'], 'MISS')
+
+    def test_invalida_al_guardar_y_al_vender(self):
+        self._get(self.url)
+        self.client.patch(self.url, {'nombre': 'Cuaderno A5'}, format='json')
+        response = self._get(self.url)
+        self.assertEqual((response['X-Cache'], response.data['nombre']), ('MISS', 'Cuaderno A5'))
+
+        # La venta cambia el stock con un UPDATE, sin pasar por post_save de Producto
+        self._get(self.url)
+        self.client.post(reverse('api-venta-list-create'), {
+            'cliente': self.cliente.id, 'total': '6.00',
+            'detalles': [{'producto': self.producto.id, 'cantidad': 3, 'precio_unitario': '2.00'}],
+        }, format='json')
+        response = self._get(self.url)
+        self.assertEqual((response['X-Cache'], response.data['stock']), ('MISS', 7))
+
+        # Los demás recursos conservan lo cacheado
+        self._get(reverse('api-cliente-list-create'))
+        self.client.patch(self.url, {'precio': '2.50'}, format='json')
+        self.assertEqual(self._get(reverse('api-cliente-list-create'))['X-Cache'], 'HIT')
+
+    def test_invalida_tras_upsert_del_catalogo(self):
+        self._get(reverse('api-producto-list-create'))
+        sincronizar_catalogo([{'sku': 'CU-1', 'nombre': 'Cuaderno A4', 'precio': '3'}])
+        response = self._get(reverse('api-producto-list-create'))
+        self.assertEqual((response['X-Cache'], response.data['count']), ('MISS', 2))
+
+    def test_vuelve_a_invalidar_al_confirmar(self):
+        """Otra petición puede cachear los datos anteriores hasta el COMMIT."""
+        self._get(self.url)
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidar_respuestas(Producto)
+            self._get(self.url)  # Lectura entre el cambio y el COMMIT
+        self.assertEqual(self._get(self.url)['X-Cache'], 'HIT')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self._get(self.url)['X-Cache'], 'MISS')
+
+    def test_metricas(self):
+        antes = estadisticas_cache_respuestas().get('proveedores', {'aciertos': 0, 'fallos': 0})
+        for _ in range(3):
+            self._get(reverse('api-proveedor-list-create'))
+        despues = estadisticas_cache_respuestas()['proveedores']
+        self.assertEqual(
+            (despues['aciertos'] - antes['aciertos'], despues['fallos'] - antes['fallos']), (2, 1)
+        )
+        self.client.force_login(User.objects.create_user(username='staff14', password='testpass', is_staff=True))
+        texto = self.client.get(reverse('api-metricas')).content.decode()
+        self.assertIn('inventario_cache_respuestas_aciertos_total{recurso="proveedores"}', texto)
+        self.assertIn('inventario_cache_respuestas_ratio{recurso="proveedores"}', texto)
+
+
+# ----------------------------
+# Test ETag, GET condicional e If-Match
+# ----------------------------
+from inventario.models import VersionTabla
+
+
+class ETagTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin15', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Oficinas Este")
+        self.producto = Producto.objects.create(nombre="Carpeta", precio=Decimal('1.50'), stock=20)
+        self.url = reverse('api-producto-detail', args=[self.producto.id])
+
+    def _vender(self, cantidad):
+        return self.client.post(reverse('api-venta-list-create'), {
+            'cliente': self.cliente.id, 'total': f'{cantidad * 1.5:.2f}',
+            'detalles': [{'producto': self.producto.id, 'cantidad': cantidad, 'precio_unitario': '1.50'}],
+        }, format='json')
+
+    def test_304_sin_leer_la_tabla(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"') and response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content, response['ETag']), (304, b'', etag))
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if 'inventario_producto' in q['sql']], [])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"otro", W/{etag}').status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304
+        )
+
+    def test_etag_cambia_con_la_venta_y_por_consulta(self):
+        etag = self.client.get(self.url)['ETag']
+        listado = self.client.get(reverse('api-producto-list-create'))['ETag']
+        self.assertNotEqual(self.client.get(reverse('api-producto-list-create'), {'page': 1})['ETag'], listado)
+
+        self._vender(2)  # El stock cambia con un UPDATE, sin post_save de Producto
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data['stock']), (200, 18))
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_una_subida_de_version_por_escritura(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self._vender(1)
+        versiones = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "inventario_versiontabla"')]
+        self.assertEqual(len(versiones), 1)
+        self.assertLessEqual(
+            {'inventario.Producto', 'inventario.Venta', 'inventario.DetalleVenta'},
+            set(VersionTabla.objects.filter(version__gt=0).values_list('modelo', flat=True)),
+        )
+
+    def test_if_match_en_producto(self):
+        etag = self.client.get(self.url)['ETag']
+        self._vender(1)  # Otro cliente cambia el producto entre la lectura y la edición
+        response = self.client.patch(self.url, {'precio': '9.99'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.precio, Decimal('1.50'))
+
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'precio': '9.99'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # El ETag devuelto sirve para la siguiente edición, y coincide con el de un GET
+        self.assertEqual(response['ETag'], self.client.get(self.url)['ETag'])
+        response = self.client.patch(self.url, {'precio': '8.00'}, format='json', HTTP_IF_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.patch(self.url, {'precio': '7.00'}, format='json', HTTP_IF_MATCH='*').status_code, 200)
+
+    def test_if_match_en_venta(self):
+        venta_id = self._vender(1).data['id']
+        url = reverse('api-venta-detail', args=[venta_id])
+        leida = self.client.get(url)
+        datos = {'cliente': self.cliente.id, 'detalles': leida.data['detalles']}
+        # Otra edición de una línea de esa venta deja obsoleto el ETag
+        self.client.patch(reverse('api-detalles-venta-detail', args=[leida.data['detalles'][0]['id']]),
+                          {'cantidad': 2}, format='json')
+        response = self.client.put(url, datos, format='json', HTTP_IF_MATCH=leida['ETag'])
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.client.get(url).data['detalles'][0]['cantidad'], 2)
+
+    def test_importacion_cambia_el_etag_de_ventas(self):
+        etag = self.client.get(reverse('api-venta-list-create'))['ETag']
+        importar_ventas([json.dumps({'cliente': self.cliente.id, 'detalles': [
+            {'producto': self.producto.id, 'cantidad': 1, 'precio_unitario': '1.50'}]})])
+        self.assertEqual(
+            self.client.get(reverse('api-venta-list-create'), HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+
+# ----------------------------
+# Test registro de cambios para sincronización incremental
+# ----------------------------
+from inventario.models import Cambio, CompactacionCambios
+from inventario.servicios.cambios import codificar_cursor, compactar_cambios
+
+
+class CambiosTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin16', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Papelería Sur")
+        self.producto = Producto.objects.create(nombre="Cinta adhesiva", precio=Decimal('2.00'), stock=30)
+        self.cursor = self._leer()['cursor']
+
+    def _leer(self, desde=None, **params):
+        if desde is not None:
+            params['desde'] = desde
+        response = self.client.get(reverse('api-cambios'), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def _resumen(self, datos):
+        return [(c['recurso'], c['id'], c['operacion']) for c in datos['cambios']]
+
+    def test_carga_inicial_y_nada_nuevo(self):
+        datos = self._leer()
+        self.assertIn(('clientes', self.cliente.id, 'alta'), self._resumen(datos))
+        self.assertFalse(datos['mas'])
+        self.assertEqual(self._leer(self.cursor)['cambios'], [])
+
+    def test_alta_modificacion_y_baja(self):
+        nuevo = self.client.post(reverse('api-proveedor-list-create'), {'nombre': 'Distribuciones Norte'}).data['id']
+        self.client.patch(reverse('api-producto-detail', args=[self.producto.id]), {'precio': '2.50'}, format='json')
+        self.client.delete(reverse('api-cliente-detail', args=[self.cliente.id]))
+
+        datos = self._leer(self.cursor)
+        self.assertEqual(self._resumen(datos), [
+            ('proveedores', nuevo, 'alta'),
+            ('productos', self.producto.id, 'modificacion'),
+            ('clientes', self.cliente.id, 'baja'),
+        ])
+        self.assertEqual(datos['cambios'][1]['datos']['precio'], '2.50')
+        self.assertNotIn('datos', datos['cambios'][2])
+        self.assertEqual(self._leer(datos['cursor'])['cambios'], [])
+
+    def test_venta_anota_la_venta_y_el_stock(self):
+        venta = self.client.post(reverse('api-venta-list-create'), {
+            'cliente': self.cliente.id, 'total': '4.00',
+            'detalles': [{'producto': self.producto.id, 'cantidad': 2, 'precio_unitario': '2.00'}],
+        }, format='json').data['id']
+        # Una sola fila por objeto aunque la venta se guarde y se recalcule su total
+        self.assertEqual(Cambio.objects.filter(recurso='ventas', objeto_id=venta).count(), 1)
+
+        cambios = {(c['recurso'], c['id']): c for c in self._leer(self.cursor)['cambios']}
+        self.assertEqual(cambios[('ventas', venta)]['operacion'], 'alta')
+        self.assertEqual(len(cambios[('ventas', venta)]['datos']['detalles']), 1)
+        self.assertEqual(cambios[('productos', self.producto.id)]['datos']['stock'], 28)
+
+    def test_paginas_y_filtro_por_recurso(self):
+        for nombre in ("Uno", "Dos", "Tres"):
+            response = self.client.post(reverse('api-cliente-list-create'),
+                                        {'nombre': nombre, 'email': f'{nombre.lower()}@example.com'}, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+        self.client.patch(reverse('api-producto-detail', args=[self.producto.id]), {'stock': 5}, format='json')
+
+        pagina = self._leer(self.cursor, limite=2, recursos='clientes')
+        self.assertEqual([c['datos']['nombre'] for c in pagina['cambios']], ["Uno", "Dos"])
+        self.assertTrue(pagina['mas'])
+        pagina = self._leer(pagina['cursor'], limite=2, recursos='clientes')
+        self.assertEqual([c['datos']['nombre'] for c in pagina['cambios']], ["Tres"])
+        self.assertFalse(pagina['mas'])
+        self.assertEqual(self.client.get(reverse('api-cambios'), {'recursos': 'reservas'}).status_code, 400)
+
+    def test_importacion_y_catalogo_anotan_altas(self):
+        importar_ventas([json.dumps({'cliente': self.cliente.id, 'detalles': [
+            {'producto': self.producto.id, 'cantidad': 1, 'precio_unitario': '2.00'}]})])
+        sincronizar_catalogo([{'sku': 'CIN-1', 'nombre': 'Cinta doble cara', 'precio': '3.00'}])
+
+        resumen = self._resumen(self._leer(self.cursor))
+        venta = Venta.objects.get()
+        nuevo = Producto.objects.get(sku='CIN-1')
+        self.assertIn(('ventas', venta.id, 'alta'), resumen)
+        self.assertIn(('productos', nuevo.id, 'alta'), resumen)
+        self.assertIn(('productos', self.producto.id, 'modificacion'), resumen)
+
+    def test_compactar_y_cursor_caducado(self):
+        for precio in ('2.10', '2.20', '2.30'):
+            self.client.patch(reverse('api-producto-detail', args=[self.producto.id]), {'precio': precio}, format='json')
+        self.client.delete(reverse('api-cliente-detail', args=[self.cliente.id]))
+
+        call_command('compactar_cambios', dias=30, stdout=StringIO())
+        self.assertEqual(Cambio.objects.filter(recurso='productos', objeto_id=self.producto.id).count(), 1)
+        self.assertEqual(self._resumen(self._leer(self.cursor)), [
+            ('productos', self.producto.id, 'modificacion'), ('clientes', self.cliente.id, 'baja'),
+        ])
+
+        # Con las bajas purgadas, un cursor anterior podría perderse alguna
+        compactar_cambios(dias=0)
+        self.assertFalse(Cambio.objects.filter(operacion=Cambio.BAJA).exists())
+        self.assertEqual(CompactacionCambios.objects.count(), 2)
+        response = self.client.get(reverse('api-cambios'), {'desde': self.cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertNotIn(('clientes', self.cliente.id, 'alta'), self._resumen(self._leer()))
+
+    def test_cursor_no_valido(self):
+        for cursor in ('no-es-un-cursor', codificar_cursor(-1)):
+            self.assertEqual(self.client.get(reverse('api-cambios'), {'desde': cursor}).status_code, 400)
+
+
+# ----------------------------
+# Test eventos en vivo (SSE) y bus en memoria
+# ----------------------------
+import asyncio
+from django.test import SimpleTestCase
+from inventario.servicios import eventos
+from inventario.servicios.eventos import Suscripcion, bus_eventos
+
+
+class BusEventosTest(SimpleTestCase):
+    async def test_fusiona_el_stock_de_un_producto(self):
+        suscripcion = bus_eventos.suscribir()
+        try:
+            bus_eventos.publicar({1: {'id': 1, 'stock': 9}}, [('venta', {'id': 7})])
+            bus_eventos.publicar({1: {'id': 1, 'stock': 8}, 2: {'id': 2, 'stock': 5}}, [])
+            self.assertEqual(await suscripcion.siguientes(1), [
+                ('stock', {'id': 1, 'stock': 8}), ('stock', {'id': 2, 'stock': 5}), ('venta', {'id': 7}),
+            ])
+            self.assertEqual(await suscripcion.siguientes(0.01), [])
+        finally:
+            bus_eventos.cancelar(suscripcion)
+        self.assertEqual(len(bus_eventos), 0)
+
+    async def test_conexion_lenta_recibe_reinicio(self):
+        suscripcion = Suscripcion(asyncio.get_running_loop())
+        with patch.object(eventos, 'MAX_PEDIDOS_PENDIENTES', 2):
+            for pk in range(3):
+                suscripcion.entregar({}, [('compra', {'id': pk})])
+        self.assertEqual(await suscripcion.siguientes(1), [('reinicio', {})])
+        suscripcion.entregar({}, [('compra', {'id': 9})])
+        self.assertEqual(await suscripcion.siguientes(1), [('compra', {'id': 9})])
+
+
+class EventosTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin17', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.cliente = Cliente.objects.create(nombre="Librería Centro")
+        self.producto = Producto.objects.create(nombre="Bolígrafo", precio=Decimal('0.80'), stock=50)
+
+    def test_venta_publica_stock_y_pedido(self):
+        loop = asyncio.new_event_loop()
+        suscripcion = loop.run_until_complete(self._suscribir())
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                venta = self.client.post(reverse('api-venta-list-create'), {
+                    'cliente': self.cliente.id, 'total': '2.40',
+                    'detalles': [{'producto': self.producto.id, 'cantidad': 3, 'precio_unitario': '0.80'}],
+                }, format='json').data['id']
+            recibidos = dict(loop.run_until_complete(suscripcion.siguientes(1)))
+        finally:
+            bus_eventos.cancelar(suscripcion)
+            loop.close()
+        self.assertEqual(recibidos['stock'], {'id': self.producto.id, 'stock': 47, 'reservado': 0, 'disponible': 47})
+        self.assertEqual((recibidos['venta']['id'], recibidos['venta']['cliente']), (venta, self.cliente.id))
+
+    async def _suscribir(self):
+        return bus_eventos.suscribir()
+
+    def test_sin_suscriptores_no_consulta(self):
+        with patch.object(eventos, '_publicar') as publicar, self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('api-producto-detail', args=[self.producto.id]), {'stock': 40}, format='json')
+        publicar.assert_not_called()
+
+    async def test_stream_bajo_asgi(self):
+        self.assertEqual((await self.async_client.get(reverse('api-eventos'))).status_code, 401)
+
+        token = str(RefreshToken.for_user(self.user).access_token)
+        response = await self.async_client.get(reverse('api-eventos'), {'token': token})
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        contenido = aiter(response.streaming_content)
+        self.assertEqual(await anext(contenido), b'retry: 3000\n\n')
+        bus_eventos.publicar({self.producto.id: {'id': self.producto.id, 'stock': 12}}, [])
+        self.assertEqual(await anext(contenido), f'event: stock\ndata: {{"id": {self.producto.id}, "stock": 12}}\n\n'.encode())
+        # Al desconectarse el cliente, el servidor cancela la tarea que espera el siguiente evento
+        espera = asyncio.ensure_future(anext(contenido))
+        await asyncio.sleep(0)
+        espera.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await espera
+        self.assertEqual(len(bus_eventos), 0)
+
+
+# ----------------------------
+# Test lecturas async (ORM async con concurrencia acotada)
+# ----------------------------
+from asgiref.sync import sync_to_async
+from django.core.management.base import CommandError
+from inventario.views.views_async import limitar_bd
+
+
+class LecturasAsyncTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='admin18', password='testpass')
+        self.client.force_authenticate(self.user)
+        self.auth = {'headers': {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}}
+        self.cliente = Cliente.objects.create(nombre="Ópticas Ruiz", email="ruiz@example.com")
+        Cliente.objects.create(nombre="Oficinas Sur", email="sur@example.com")
+        self.productos = [
+            Producto.objects.create(nombre=f"Folio {i:02d}", precio=Decimal('0.10'), stock=100) for i in range(12)
+        ]
+        self.venta = self.client.post(reverse('api-venta-list-create'), {
+            'cliente': self.cliente.id, 'total': '0.50',
+            'detalles': [{'producto': self.productos[0].id, 'cantidad': 5, 'precio_unitario': '0.10'}],
+        }, format='json').data['id']
+
+    async def _json(self, nombre, args=(), params=None, estado=200):
+        response = await self.async_client.get(reverse(nombre, args=args), params or {}, **self.auth)
+        self.assertEqual(response.status_code, estado, response.content)
+        return json.loads(response.content)
+
+    async def test_mismas_respuestas_que_las_vistas_sincronas(self):
+        for sincrona, asincrona, args, params in (
+            ('api-producto-list-create', 'api-async-producto-list', [], {'page': 2}),
+            ('api-producto-detail', 'api-async-producto-detail', [self.productos[3].id], {}),
+            ('api-venta-detail', 'api-async-venta-detail', [self.venta], {}),
+        ):
+            with self.subTest(ruta=asincrona):
+                esperado = await sync_to_async(self.client.get)(reverse(sincrona, args=args), params)
+                obtenido = await self._json(asincrona, args, params)
+                # Sólo cambian los enlaces de paginación, que apuntan a su propia ruta
+                obtenido = json.loads(json.dumps(obtenido).replace('/api/async/', '/api/'))
+                self.assertEqual(obtenido, json.loads(esperado.content))
+
+    async def test_stock_y_busqueda_de_clientes(self):
+        ids = f'{self.productos[0].id},{self.productos[1].id},999999'
+        self.assertEqual(await self._json('api-async-stock', params={'ids': ids}), [
+            {'id': self.productos[0].id, 'stock': 95, 'reservado': 0, 'disponible': 95},
+            {'id': self.productos[1].id, 'stock': 100, 'reservado': 0, 'disponible': 100},
+        ])
+        await self._json('api-async-stock', params={'ids': 'a,b'}, estado=400)
+        encontrados = await self._json('api-async-cliente-buscar', params={'q': 'opti'})
+        self.assertEqual([c['nombre'] for c in encontrados], ["Ópticas Ruiz"])
+
+    async def test_autenticacion_y_no_encontrado(self):
+        response = await self.async_client.get(reverse('api-async-compra-detail', args=[1]))
+        self.assertEqual(response.status_code, 401)
+        await self._json('api-async-compra-detail', [999999], estado=404)
+        await self._json('api-async-producto-list', params={'page': 9}, estado=404)
+
+    @override_settings(ASYNC_MAX_CONSULTAS=2)
+    async def test_semaforo_limita_las_consultas_a_la_vez(self):
+        activas, maximo = 0, 0
+
+        async def consultar():
+            nonlocal activas, maximo
+            async with limitar_bd():
+                activas += 1
+                maximo = max(maximo, activas)
+                await asyncio.sleep(0.01)
+                activas -= 1
+
+        await asyncio.gather(*(consultar() for _ in range(6)))
+        self.assertEqual(maximo, 2)
+        respuestas = await asyncio.gather(*(
+            self.async_client.get(reverse('api-async-producto-detail', args=[p.id]), **self.auth)
+            for p in self.productos
+        ))
+        self.assertEqual({r.status_code for r in respuestas}, {200})
+
+    def test_benchmark_necesita_usuario_y_datos(self):
+        with self.assertRaisesMessage(CommandError, 'usuario'):
+            call_command('benchmark_concurrencia', usuario='nadie', stdout=StringIO())
+        Venta.objects.all().delete()
+        with self.assertRaisesMessage(CommandError, 'productos y ventas'):
+            call_command('benchmark_concurrencia', stdout=StringIO())
@@ -1,4 +1,15 @@
-from rest_framework import generics
+import hmac
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from urllib.parse import urlencode
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import generics, status
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -19,20 +30,180 @@ def me(request):
 
 # Importamos los modelos que vamos a gestionar desde la API
 from inventario.models import (
+    Cambio,
     Producto, Cliente, Proveedor,
     Compra, DetalleCompra,
-    Venta, DetalleVenta
+    Venta, DetalleVenta,
+    Reserva,
 )
+from inventario.servicios.reservas import ReservaNoValidaError, confirmar_reservas, liberar
+from inventario.servicios.stock import StockInsuficienteError
+from inventario.servicios.unidad_trabajo import diferir_recalculos
 
 # Importamos los serializers que transforman los modelos en JSON y viceversa
 from inventario.serializers import (
     ProductoSerializer, ClienteSerializer, ProveedorSerializer,
     CompraSerializer, DetalleCompraSerializer,
-    VentaSerializer, DetalleVentaSerializer
+    VentaSerializer, DetalleVentaSerializer,
+    ReservaSerializer, ConfirmarReservasSerializer,
+    StockEnFechaSerializer,
+)
+from inventario.filters import CompraFilter, DetalleCompraFilter, VentaFilter, DetalleVentaFilter
+from inventario.paginacion import PaginacionKeyset
+from inventario.perfilado import registro
+from inventario.servicios.autocompletar import RECURSOS_AUTOCOMPLETAR, autocompletar
+from inventario.servicios.busqueda import buscar_productos
+from inventario.servicios.cache_respuestas import (
+    RECURSOS_CACHEADOS, exportar_metricas_cache, guardar_respuesta, obtener_respuesta,
+)
+from inventario.servicios.cambios import (
+    LIMITE_CAMBIOS, LIMITE_MAXIMO_CAMBIOS, RECURSOS_CAMBIOS, CursorCaducadoError,
+    codificar_cursor, decodificar_cursor, leer_cambios, objetos_actuales,
 )
+from inventario.servicios.catalogo import FILAS_POR_LOTE, sincronizar_catalogo
+from inventario.servicios.exportacion import FORMATOS_EXPORTACION, exportar
+from inventario.servicios.importacion import FORMATOS_IMPORTACION, REGISTROS_POR_LOTE, importar_compras, importar_ventas
+from inventario.servicios.historico import interpretar_fecha, productos_con_stock_en_fecha
+from inventario.servicios.borrado import eliminar_clientes, eliminar_proveedores, eliminar_productos
+from inventario.servicios.versiones import agrupar_cambios, etag_de, reclamar_versiones, versiones_de
+
+# ==================== ARCHIVADO Y BORRADO EN BLOQUE ====================
+class OcultarArchivadosMixin:
+    """
+    Los listados no muestran los registros archivados salvo con ?archivados=1.
+    El detalle (/<pk>/) sí los devuelve, porque siguen referenciados por el histórico.
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.query_params.get('archivados') not in ('1', 'true'):
+            queryset = queryset.filter(archivado=False)
+        return queryset
+
+class BorradoEnBloqueMixin:
+    """
+    DELETE usa servicios.borrado, que aplica stock y totales en bloque en vez
+    de disparar las señales por cada línea de la cascada.
+    """
+    eliminar = None
+
+    def perform_destroy(self, instance):
+        try:
+            self.eliminar([instance.pk])
+        except StockInsuficienteError as exc:
+            raise ValidationError({'detail': f"{exc}. Archívalo en lugar de borrarlo (archivado=true)."})
+
+class CacheRespuestaMixin:
+    """
+    GET servido desde servicios.cache_respuestas cuando la misma consulta
+    (ruta, parámetros y perfil del usuario) ya se respondió y los datos del
+    recurso no han cambiado desde entonces. Se cachean los datos ya
+    serializados, no el JSON, para respetar la negociación de formato.
+    La cabecera X-Cache indica si fue un acierto (HIT) o no (MISS).
+    """
+    def get(self, request, *args, **kwargs):
+        recurso = RECURSOS_CACHEADOS[self.queryset.model]
+        clave, datos = obtener_respuesta(recurso, request)
+        if datos is not None:
+            response = Response(datos)
+            response['X-Cache'] = 'HIT'
+            return response
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            guardar_respuesta(clave, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+# ==================== ETAG Y PETICIONES CONDICIONALES ====================
+class PrecondicionFallida(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'El recurso ha cambiado desde que se leyó (If-Match no coincide). Vuelve a leerlo.'
+    default_code = 'precondicion_fallida'
+
+class VersionesETagMixin:
+    """
+    ETag y Last-Modified a partir de la versión de las tablas de la respuesta
+    (servicios.versiones), que se lee con una consulta a una tabla de pocas
+    filas. Un GET con If-None-Match (o If-Modified-Since) que coincide
+    responde 304 sin consultar las tablas del recurso ni serializar nada.
+    Un PUT/PATCH con If-Match distinto del ETag actual responde 412: alguien
+    ha cambiado los datos desde que el cliente los leyó.
+    """
+    modelos_version = None  # Por defecto, el modelo del queryset
+
+    def versiones(self):
+        return versiones_de(self.modelos_version or (self.queryset.model,))
+
+    def validadores(self, request, versiones):
+        consulta = urlencode(sorted(request.query_params.lists()), doseq=True)
+        return etag_de(versiones, request.path, consulta, request.accepted_renderer.format)
+
+    def get(self, request, *args, **kwargs):
+        etag, modificado = self.validadores(request, self.versiones())
+        if _no_modificado(request, etag, modificado):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().get(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        if modificado is not None:
+            response['Last-Modified'] = http_date(modificado.timestamp())
+        return response
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        if if_match is None:
+            return super().update(request, *args, **kwargs)
+        etiquetas = parse_etags(if_match)
+        with transaction.atomic():
+            versiones = self.versiones()
+            if '*' not in etiquetas and self.validadores(request, versiones)[0] not in etiquetas:
+                raise PrecondicionFallida()
+            # Comprobar y bloquear en el mismo UPDATE: si otra escritura ha
+            # cambiado la versión entre la lectura y aquí, también es un 412
+            if not reclamar_versiones(versiones):
+                raise PrecondicionFallida()
+            response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.validadores(request, self.versiones())[0]  # Para encadenar otra edición
+        return response
+
+    # Las señales y servicios de una misma escritura suben las versiones con un solo UPDATE
+    def perform_create(self, serializer):
+        with agrupar_cambios():
+            super().perform_create(serializer)
+
+    def perform_update(self, serializer):
+        with agrupar_cambios():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with agrupar_cambios():
+            super().perform_destroy(instance)
+
+def _no_modificado(request, etag, modificado):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        # Comparación débil: W/"x" coincide con "x"
+        etiquetas = {e.removeprefix('W/') for e in parse_etags(if_none_match)}
+        return '*' in etiquetas or etag in etiquetas
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return desde is not None and modificado is not None and int(modificado.timestamp()) <= desde
+
+class BorrarPedidoMixin:
+    """
+    DELETE de una compra o venta, o de una de sus líneas: la cascada devuelve
+    o retira el stock con un UPDATE por producto (diferir_recalculos). Si lo
+    comprado ya se ha vendido, 400 en lugar de dejar el stock en negativo.
+    """
+    def perform_destroy(self, instance):
+        try:
+            with diferir_recalculos():
+                instance.delete()
+        except StockInsuficienteError as exc:
+            raise ValidationError({'detail': str(exc)})
 
 # ==================== PRODUCTOS ====================
-class ProductoListCreateView(generics.ListCreateAPIView):
+class ProductoListCreateView(VersionesETagMixin, CacheRespuestaMixin, OcultarArchivadosMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los productos o crear uno nuevo.
     Usamos ListCreateAPIView que maneja GET para lista y POST para crear.
@@ -43,7 +214,52 @@ class ProductoListCreateView(generics.ListCreateAPIView):
     serializer_class = ProductoSerializer
     permission_classes = [IsAuthenticated]
 
-class ProductoRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProductoBusquedaView(generics.ListAPIView):
+    """
+    GET /api/productos/buscar/?q=<texto>[&limite=20][&archivados=1]
+    Búsqueda por nombre y descripción sobre el índice FTS5: por prefijo
+    ("cart ton" → "Cartucho de tóner"), sin tener en cuenta tildes y con los
+    más relevantes primero. Devuelve una lista sin paginar de hasta `limite`.
+    Solo usuarios autenticados pueden acceder.
+    """
+    serializer_class = ProductoSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+    filter_backends = []
+    LIMITE_MAXIMO = 100
+
+    def get_queryset(self):
+        params = self.request.query_params
+        try:
+            limite = max(1, min(int(params.get('limite', 20)), self.LIMITE_MAXIMO))
+        except ValueError:
+            raise ValidationError({'limite': 'Debe ser un número entero'})
+        return buscar_productos(
+            params.get('q', ''), limite=limite,
+            incluir_archivados=params.get('archivados') in ('1', 'true'),
+        )
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def productos_bulk_view(request):
+    """
+    POST /api/productos/bulk/[?lote=2000]
+    Cuerpo: lista de productos [{"sku", "nombre", "precio", "descripcion"?, "stock"?}]
+    (o {"productos": [...]}). Alta o actualización por SKU en bloque; devuelve
+    cuántos se insertaron, actualizaron y rechazaron, con el error de cada
+    fila rechazada (ver servicios.catalogo).
+    Solo usuarios autenticados pueden acceder.
+    """
+    filas = request.data.get('productos') if isinstance(request.data, dict) else request.data
+    if not isinstance(filas, list):
+        return Response({'productos': 'Debe ser una lista'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        lote = max(1, min(int(request.query_params.get('lote', FILAS_POR_LOTE)), 10000))
+    except ValueError:
+        return Response({'lote': 'Debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(sincronizar_catalogo(filas, lote).como_dict())
+
+class ProductoRetrieveUpdateDestroyView(VersionesETagMixin, CacheRespuestaMixin, BorradoEnBloqueMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar un producto específico por su ID.
     Solo usuarios autenticados pueden acceder.
@@ -51,9 +267,10 @@ class ProductoRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Producto.objects.all().order_by('id')
     serializer_class = ProductoSerializer
     permission_classes = [IsAuthenticated]
+    eliminar = staticmethod(eliminar_productos)
 
 # ==================== CLIENTES ====================
-class ClienteListCreateView(generics.ListCreateAPIView):
+class ClienteListCreateView(VersionesETagMixin, CacheRespuestaMixin, OcultarArchivadosMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los clientes o crear uno nuevo.
     Ordenamos los clientes por 'nombre' para que la lista sea más amigable al usuario.
@@ -63,7 +280,7 @@ class ClienteListCreateView(generics.ListCreateAPIView):
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
 
-class ClienteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ClienteRetrieveUpdateDestroyView(VersionesETagMixin, CacheRespuestaMixin, BorradoEnBloqueMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar un cliente específico por su ID.
     Solo usuarios autenticados pueden acceder.
@@ -71,9 +288,10 @@ class ClienteRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Cliente.objects.all().order_by('nombre')
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
+    eliminar = staticmethod(eliminar_clientes)
 
 # ==================== PROVEEDORES ====================
-class ProveedorListCreateView(generics.ListCreateAPIView):
+class ProveedorListCreateView(VersionesETagMixin, CacheRespuestaMixin, OcultarArchivadosMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los proveedores o crear uno nuevo.
     Ordenamos los proveedores por 'nombre' para facilitar su búsqueda.
@@ -83,7 +301,7 @@ class ProveedorListCreateView(generics.ListCreateAPIView):
     serializer_class = ProveedorSerializer
     permission_classes = [IsAuthenticated]
 
-class ProveedorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class ProveedorRetrieveUpdateDestroyView(VersionesETagMixin, CacheRespuestaMixin, BorradoEnBloqueMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar un proveedor específico por su ID.
     Solo usuarios autenticados pueden acceder.
@@ -91,17 +309,26 @@ class ProveedorRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     queryset = Proveedor.objects.all().order_by('nombre')
     serializer_class = ProveedorSerializer
     permission_classes = [IsAuthenticated]
+    eliminar = staticmethod(eliminar_proveedores)
 
 # ==================== COMPRAS ====================
 
-class CompraListCreateView(generics.ListCreateAPIView):
+class CompraListCreateView(VersionesETagMixin, generics.ListCreateAPIView):
     """
     Vista para listar todas las compras o registrar una nueva compra.
-    Ordenamos las compras por 'fecha' para mostrar primero las más antiguas o recientes.
+    Ordenamos las compras por 'fecha' e 'id' y paginamos por cursor (?cursor=, ?page_size=).
     Solo usuarios autenticados pueden acceder.
     """
-    queryset = Compra.objects.all().order_by('fecha')
-    # Consulta todas las compras, ordenadas por fecha
+    modelos_version = (Compra, DetalleCompra)  # La respuesta lleva cabecera y líneas
+    queryset = Compra.objects.con_detalles().order_by('fecha', 'id')
+    # Consulta todas las compras, ordenadas por fecha (y por id para desempatar)
+
+    pagination_class = PaginacionKeyset
+    orden_keyset = ('fecha', 'id')
+    # Paginación por cursor sobre el índice (fecha, id): sin OFFSET ni COUNT(*)
+
+    filterset_class = CompraFilter
+    # ?proveedor=, ?fecha_desde=, ?fecha_hasta=, ?producto=, ?total_min=, ?total_max=
 
     serializer_class = CompraSerializer
     # Se usa este serializer para transformar las compras a JSON y viceversa
@@ -109,12 +336,13 @@ class CompraListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     # Solo usuarios autenticados pueden acceder a esta vista (GET y POST)
 
-class CompraRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CompraRetrieveUpdateDestroyView(VersionesETagMixin, BorrarPedidoMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar una compra específica por su ID.
     Solo usuarios autenticados pueden acceder.
     """
-    queryset = Compra.objects.all().order_by('fecha')
+    modelos_version = (Compra, DetalleCompra)  # La respuesta lleva cabecera y líneas
+    queryset = Compra.objects.con_detalles()
     # Consulta todas las compras, necesario para poder buscar por ID
 
     serializer_class = CompraSerializer
@@ -125,61 +353,330 @@ class CompraRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # ==================== DETALLES DE COMPRA ====================
-class DetalleCompraListCreateView(generics.ListCreateAPIView):
+class DetalleCompraListCreateView(VersionesETagMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los detalles de compra o crear uno nuevo.
     Ordenamos por 'id' para mantener un orden estable.
     Solo usuarios autenticados pueden acceder.
     """
+    modelos_version = (DetalleCompra, Compra)  # Los filtros usan datos de la cabecera
     queryset = DetalleCompra.objects.all().order_by('id')
     serializer_class = DetalleCompraSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionKeyset  # Cursor sobre la clave primaria
+    filterset_class = DetalleCompraFilter  # ?producto=, ?compra=, ?proveedor=, rangos de fecha y subtotal
 
-class DetalleCompraRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class DetalleCompraRetrieveUpdateDestroyView(VersionesETagMixin, BorrarPedidoMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar un detalle de compra específico por su ID.
     Solo usuarios autenticados pueden acceder.
     """
+    modelos_version = (DetalleCompra, Compra)  # Los filtros usan datos de la cabecera
     queryset = DetalleCompra.objects.all().order_by('id')
     serializer_class = DetalleCompraSerializer
     permission_classes = [IsAuthenticated]
 
 # ==================== VENTAS ====================
-class VentaListCreateView(generics.ListCreateAPIView):
+class VentaListCreateView(VersionesETagMixin, generics.ListCreateAPIView):
     """
     Vista para listar todas las ventas o registrar una nueva venta.
-    Ordenamos por 'fecha' para mostrar ventas cronológicamente.
+    Ordenamos por 'fecha' e 'id' y paginamos por cursor (?cursor=, ?page_size=).
     Solo usuarios autenticados pueden acceder.
     """
-    queryset = Venta.objects.all().order_by('fecha')
+    modelos_version = (Venta, DetalleVenta)  # La respuesta lleva cabecera y líneas
+    queryset = Venta.objects.con_detalles().order_by('fecha', 'id')
     serializer_class = VentaSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionKeyset  # Cursor sobre el índice (fecha, id)
+    orden_keyset = ('fecha', 'id')
+    filterset_class = VentaFilter  # ?cliente=, ?fecha_desde=, ?fecha_hasta=, ?producto=, ?total_min=, ?total_max=
 
-class VentaRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class VentaRetrieveUpdateDestroyView(VersionesETagMixin, BorrarPedidoMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar una venta específica por su ID.
     Solo usuarios autenticados pueden acceder.
     """
-    queryset = Venta.objects.all().order_by('fecha')
+    modelos_version = (Venta, DetalleVenta)  # La respuesta lleva cabecera y líneas
+    queryset = Venta.objects.con_detalles()
     serializer_class = VentaSerializer
     permission_classes = [IsAuthenticated]
 
 # ==================== DETALLES DE VENTA ====================
-class DetalleVentaListCreateView(generics.ListCreateAPIView):
+class DetalleVentaListCreateView(VersionesETagMixin, generics.ListCreateAPIView):
     """
     Vista para listar todos los detalles de venta o crear uno nuevo.
     Ordenamos por 'id' para mantener orden consistente.
     Solo usuarios autenticados pueden acceder.
     """
+    modelos_version = (DetalleVenta, Venta)  # Los filtros usan datos de la cabecera
     queryset = DetalleVenta.objects.all().order_by('id')
     serializer_class = DetalleVentaSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PaginacionKeyset  # Cursor sobre la clave primaria
+    filterset_class = DetalleVentaFilter  # ?producto=, ?venta=, ?cliente=, rangos de fecha y subtotal
 
-class DetalleVentaRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class DetalleVentaRetrieveUpdateDestroyView(VersionesETagMixin, BorrarPedidoMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Vista para obtener, actualizar o eliminar un detalle de venta específico por su ID.
     Solo usuarios autenticados pueden acceder.
     """
+    modelos_version = (DetalleVenta, Venta)  # Los filtros usan datos de la cabecera
     queryset = DetalleVenta.objects.all().order_by('id')
     serializer_class = DetalleVentaSerializer
     permission_classes = [IsAuthenticated]
+
+# ==================== RESERVAS ====================
+class ReservaListCreateView(generics.ListCreateAPIView):
+    """
+    Vista para listar las reservas vivas del usuario o crear una nueva.
+    Crear una reserva retiene stock del producto durante unos minutos.
+    Solo usuarios autenticados pueden acceder.
+    """
+    serializer_class = ReservaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Reserva.objects.filter(
+            usuario=self.request.user, expira__gt=timezone.now()
+        ).order_by('id')
+
+class ReservaRetrieveDestroyView(generics.RetrieveDestroyAPIView):
+    """
+    Vista para consultar o cancelar (DELETE) una reserva del usuario.
+    Cancelarla devuelve las unidades retenidas al stock disponible.
+    """
+    serializer_class = ReservaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Reserva.objects.filter(usuario=self.request.user).order_by('id')
+
+    def perform_destroy(self, instance):
+        liberar(instance)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def confirmar_reservas_view(request):
+    """
+    POST /api/reservas/confirmar/ { cliente, reservas: [ids] }
+    → convierte las reservas en una venta (201) en una sola transacción.
+    """
+    serializer = ConfirmarReservasSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        venta = confirmar_reservas(
+            serializer.validated_data['reservas'],
+            serializer.validated_data['cliente'],
+            usuario=request.user,
+        )
+    except (ReservaNoValidaError, StockInsuficienteError) as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(VentaSerializer(venta).data, status=status.HTTP_201_CREATED)
+
+# ==================== STOCK EN UNA FECHA ====================
+class StockHistoricoView(generics.ListAPIView):
+    """
+    GET /api/stock-historico/?fecha=AAAA-MM-DD[&producto=<id>]
+    Stock de cada producto en esa fecha, calculado desde la foto más cercana
+    (SnapshotStock) más los movimientos posteriores.
+    Solo usuarios autenticados pueden acceder.
+    """
+    serializer_class = StockEnFechaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        fecha = interpretar_fecha(self.request.query_params.get('fecha'))
+        if fecha is None:
+            raise ValidationError({'fecha': 'Indica una fecha válida (AAAA-MM-DD o ISO 8601)'})
+        productos = Producto.objects.order_by('id')
+        producto_id = self.request.query_params.get('producto')
+        if producto_id:
+            productos = productos.filter(pk=producto_id)
+        return productos_con_stock_en_fecha(fecha, productos)
+
+# ==================== AUTOCOMPLETAR ====================
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def autocompletar_view(request, recurso):
+    """
+    GET /api/autocompletar/<productos|clientes|proveedores>/?q=<texto>[&limite=20]
+    Opciones cuyo nombre empieza por el texto, sin tildes ni mayúsculas, en el
+    formato {"results": [{"id": ..., "text": ...}]} de los widgets tipo Select2.
+    Solo usuarios autenticados pueden acceder.
+    """
+    if recurso not in RECURSOS_AUTOCOMPLETAR:
+        return Response({'detail': 'Recurso no válido'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        limite = max(1, min(int(request.query_params.get('limite', 20)), 50))
+    except ValueError:
+        return Response({'limite': 'Debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+    texto = request.query_params.get('q', '')
+    return Response({'results': autocompletar(recurso, texto, limite) if texto.strip() else []})
+
+# ==================== EXPORTACIÓN (CSV / NDJSON) ====================
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def exportar_view(request, recurso):
+    """
+    GET /api/exportar/<ventas|compras|stock>/?formato=csv|ndjson
+    Descarga completa en streaming, una fila por línea de venta/compra (con
+    los datos de su cabecera) o por producto. Ventas y compras admiten los
+    filtros de sus líneas: ?fecha_desde=, ?fecha_hasta=, ?cliente= / ?proveedor=,
+    ?producto=. El stock incluye los archivados sólo con ?archivados=1.
+    Solo usuarios autenticados pueden acceder.
+    """
+    filtros = {'ventas': (DetalleVentaFilter, DetalleVenta), 'compras': (DetalleCompraFilter, DetalleCompra)}
+    formato = request.query_params.get('formato', 'csv')
+    if recurso not in filtros and recurso != 'stock':
+        return Response({'detail': 'Recurso no válido'}, status=status.HTTP_404_NOT_FOUND)
+    if formato not in FORMATOS_EXPORTACION:
+        return Response({'formato': f"Debe ser uno de: {', '.join(FORMATOS_EXPORTACION)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    if recurso == 'stock':
+        queryset = Producto.objects.all()
+        if request.query_params.get('archivados') not in ('1', 'true'):
+            queryset = queryset.filter(archivado=False)
+    else:
+        filterset_class, modelo = filtros[recurso]
+        filterset = filterset_class(request.query_params, queryset=modelo.objects.all(), request=request)
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        queryset = filterset.qs
+
+    response = StreamingHttpResponse(exportar(recurso, queryset, formato), content_type=FORMATOS_EXPORTACION[formato])
+    nombre = f"{recurso}-{timezone.localdate():%Y%m%d}.{formato}"
+    response['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+# ==================== IMPORTACIÓN MASIVA (NDJSON / CSV) ====================
+def _lineas_de_texto(fichero):
+    # Decodifica línea a línea a medida que llega el cuerpo, sin leerlo entero.
+    # Los bytes no UTF-8 quedan como \ufffd y su registro falla al validarse
+    for n, linea in enumerate(fichero):
+        linea = linea.decode('utf-8', errors='replace')
+        yield linea.lstrip('\ufeff') if n == 0 else linea
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def importar_view(request, recurso):
+    """
+    POST /api/importar/<ventas|compras>/?formato=ndjson|csv[&lote=1000]
+    El cuerpo es el fichero tal cual (Content-Type application/x-ndjson o
+    text/csv) o un multipart con el campo 'fichero'. Se procesa a medida que
+    se lee, en transacciones de `lote` pedidos; los registros con errores se
+    devuelven en 'errores' sin deshacer los demás (ver servicios.importacion).
+    Solo usuarios autenticados pueden acceder.
+    """
+    importadores = {'ventas': importar_ventas, 'compras': importar_compras}
+    if recurso not in importadores:
+        return Response({'detail': 'Recurso no válido'}, status=status.HTTP_404_NOT_FOUND)
+    formato = request.query_params.get('formato', 'ndjson')
+    if formato not in FORMATOS_IMPORTACION:
+        return Response({'formato': f"Debe ser uno de: {', '.join(FORMATOS_IMPORTACION)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    try:
+        lote = max(1, min(int(request.query_params.get('lote', REGISTROS_POR_LOTE)), 10000))
+    except ValueError:
+        return Response({'lote': 'Debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.content_type.startswith('multipart/'):
+        fichero = request.FILES.get('fichero')
+        if fichero is None:
+            return Response({'fichero': 'Falta el fichero'}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        fichero = request.stream or []
+
+    resultado = importadores[recurso](_lineas_de_texto(fichero), formato, lote)
+    return Response(resultado.como_dict())
+
+# ==================== CAMBIOS (SINCRONIZACIÓN INCREMENTAL) ====================
+class CursorCaducado(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'El cursor es anterior a la última compactación del registro; hay que sincronizar de nuevo sin ?desde=.'
+    default_code = 'cursor_caducado'
+
+
+SERIALIZADORES_CAMBIOS = {
+    'productos': ProductoSerializer,
+    'clientes': ClienteSerializer,
+    'proveedores': ProveedorSerializer,
+    'ventas': VentaSerializer,
+    'compras': CompraSerializer,
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cambios_view(request):
+    """
+    GET /api/cambios/?desde=<cursor>[&limite=500][&recursos=productos,ventas]
+    Altas, modificaciones y bajas de productos, clientes, proveedores, ventas
+    y compras posteriores al cursor, cada objeto una vez y con sus datos
+    actuales (las bajas sólo llevan recurso e id). Se sigue pidiendo con el
+    'cursor' devuelto mientras 'mas' sea true; sin ?desde= se parte del
+    principio. Un cursor anterior a la última compactación devuelve 410.
+    Solo usuarios autenticados pueden acceder.
+    """
+    try:
+        desde = decodificar_cursor(request.query_params.get('desde'))
+    except ValueError:
+        return Response({'desde': 'Cursor no válido'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limite = max(1, min(int(request.query_params.get('limite', LIMITE_CAMBIOS)), LIMITE_MAXIMO_CAMBIOS))
+    except ValueError:
+        return Response({'limite': 'Debe ser un número entero'}, status=status.HTTP_400_BAD_REQUEST)
+    recursos = [r for r in request.query_params.get('recursos', '').split(',') if r]
+    if not set(recursos) <= set(RECURSOS_CAMBIOS):
+        return Response({'recursos': f"Deben ser de: {', '.join(RECURSOS_CAMBIOS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        cambios, ultimo, hay_mas = leer_cambios(desde, limite, recursos)
+    except CursorCaducadoError:
+        raise CursorCaducado
+
+    # Una consulta por recurso (más la de las líneas en ventas y compras)
+    vigentes = defaultdict(list)
+    for recurso, pk, operacion in cambios:
+        if operacion != Cambio.BAJA:
+            vigentes[recurso].append(pk)
+    datos = {}
+    for recurso, ids in vigentes.items():
+        serializer = SERIALIZADORES_CAMBIOS[recurso](
+            objetos_actuales(recurso, ids), many=True, context={'request': request},
+        )
+        datos.update(((recurso, fila['id']), fila) for fila in serializer.data)
+
+    resultado = []
+    for recurso, pk, operacion in cambios:
+        fila = datos.get((recurso, pk))
+        if fila is None:
+            # Ya no existe: se ha borrado después (su baja llegará más adelante)
+            resultado.append({'recurso': recurso, 'id': pk, 'operacion': Cambio.BAJA})
+        else:
+            resultado.append({'recurso': recurso, 'id': pk, 'operacion': operacion, 'datos': fila})
+    return Response({'cursor': codificar_cursor(ultimo), 'mas': hay_mas, 'cambios': resultado})
+
+# ==================== MÉTRICAS (PROMETHEUS) ====================
+def metricas_view(request):
+    """
+    GET /api/_metrics/
+    Histogramas de latencia y tiempos de BD, serializadores y señales por ruta
+    (ver inventario.middleware.PerfiladoMiddleware) y aciertos y fallos de la
+    caché de respuestas, en formato de texto de Prometheus. Sólo para
+    usuarios staff (sesión) o con "Authorization: Bearer <token>" si
+    PERFILADO_METRICAS_TOKEN está definido; abierta a cualquiera únicamente
+    con PERFILADO_METRICAS_PUBLICAS = True.
+    """
+    token = getattr(settings, 'PERFILADO_METRICAS_TOKEN', None)
+    autorizacion = request.headers.get('Authorization', '')
+    permitido = (
+        getattr(settings, 'PERFILADO_METRICAS_PUBLICAS', False)
+        or (token and hmac.compare_digest(autorizacion.encode(), f'Bearer {token}'.encode()))
+        or request.user.is_staff
+    )
+    if not permitido:
+        return HttpResponseForbidden()
+    return HttpResponse(registro.exportar() + exportar_metricas_cache(), content_type='text/plain; version=0.0.4; charset=utf-8')
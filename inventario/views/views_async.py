@@ -0,0 +1,203 @@
+import asyncio
+import weakref
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from inventario.models import Cliente, Compra, Producto, Venta
+from inventario.serializers import ClienteSerializer, CompraSerializer, ProductoSerializer, VentaSerializer
+from inventario.servicios.autocompletar import filtrar_por_prefijo
+
+MAX_CONSULTAS_POR_DEFECTO = 8  # Peticiones async consultando la BD a la vez en cada proceso
+LIMITE_BUSQUEDA = 20
+MAX_IDS_STOCK = 100
+
+
+# ==================== CONCURRENCIA CON LA BASE DE DATOS ====================
+# El ORM async de Django ejecuta cada consulta en un hilo (sync_to_async) con
+# su propia conexión. Sin límite, 500 peticiones a la vez serían 500 hilos y
+# 500 conexiones compitiendo por SQLite; con el semáforo, las que exceden
+# ASYNC_MAX_CONSULTAS esperan en el bucle de eventos sin ocupar ninguno.
+_semaforos = weakref.WeakKeyDictionary()
+
+
+def limitar_bd():
+    """Semáforo del bucle de eventos actual (uno por bucle: asyncio no los comparte)."""
+    bucle = asyncio.get_running_loop()
+    semaforo = _semaforos.get(bucle)
+    if semaforo is None:
+        semaforo = _semaforos[bucle] = asyncio.Semaphore(
+            getattr(settings, 'ASYNC_MAX_CONSULTAS', MAX_CONSULTAS_POR_DEFECTO)
+        )
+    return semaforo
+
+
+# ==================== AUTENTICACIÓN ====================
+async def usuario_autenticado(request, token_en_query=False):
+    """
+    Usuario de la sesión o del JWT (Authorization: Bearer), o None. Con
+    `token_en_query` el JWT también se admite en ?token= (para EventSource,
+    que no permite añadir cabeceras).
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user
+    autorizacion = request.headers.get('Authorization', '')
+    if autorizacion.startswith('Bearer '):
+        token = autorizacion[len('Bearer '):]
+    else:
+        token = request.GET.get('token') if token_en_query else None
+    if not token:
+        return None
+    autenticacion = JWTAuthentication()
+    try:
+        validado = autenticacion.get_validated_token(token)
+        return await sync_to_async(autenticacion.get_user)(validado)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+class _NoEncontrado(Exception):
+    pass
+
+
+def lectura_async(vista):
+    """
+    Para las vistas de este módulo: sólo GET, usuario autenticado y la
+    respuesta que devuelva la vista (datos ya serializados) en JSON con el
+    mismo renderer que DRF, de modo que coincide con la de la vista síncrona.
+    """
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        async with limitar_bd():
+            user = await usuario_autenticado(request)
+        if user is None:
+            return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+        try:
+            datos, estado = await vista(request, *args, **kwargs)
+        except _NoEncontrado:
+            datos, estado = {'detail': 'No encontrado.'}, 404
+        return HttpResponse(JSONRenderer().render(datos), content_type='application/json', status=estado)
+    return envoltura
+
+
+# ==================== PRODUCTOS ====================
+@lectura_async
+async def productos_async_view(request):
+    """
+    GET /api/async/productos/[?page=N][&archivados=1]
+    Como /api/productos/: páginas de PAGE_SIZE por id con count, next y previous.
+    """
+    queryset = Producto.objects.order_by('id')
+    if request.GET.get('archivados') not in ('1', 'true'):
+        queryset = queryset.filter(archivado=False)
+    tamano = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        pagina = int(request.GET.get('page', 1))
+    except ValueError:
+        pagina = 0
+    if pagina < 1:
+        raise _NoEncontrado
+
+    async with limitar_bd():
+        total = await queryset.acount()
+        productos = [p async for p in queryset[(pagina - 1) * tamano:pagina * tamano]]
+    if not productos and pagina > 1:
+        raise _NoEncontrado
+
+    url = request.build_absolute_uri()
+    anterior = None
+    if pagina == 2:
+        anterior = remove_query_param(url, 'page')
+    elif pagina > 2:
+        anterior = replace_query_param(url, 'page', pagina - 1)
+    return {
+        'count': total,
+        'next': replace_query_param(url, 'page', pagina + 1) if pagina * tamano < total else None,
+        'previous': anterior,
+        'results': ProductoSerializer(productos, many=True).data,
+    }, 200
+
+
+@lectura_async
+async def producto_async_view(request, pk):
+    """GET /api/async/productos/<pk>/ (como /api/productos/<pk>/)."""
+    async with limitar_bd():
+        producto = await Producto.objects.filter(pk=pk).afirst()
+    if producto is None:
+        raise _NoEncontrado
+    return ProductoSerializer(producto).data, 200
+
+
+@lectura_async
+async def stock_async_view(request):
+    """
+    GET /api/async/stock/?ids=1,2,3
+    Stock, reservado y disponible (stock - reservado) de hasta 100 productos
+    en una sola consulta; los ids que no existen no aparecen.
+    """
+    try:
+        ids = sorted({int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()})
+    except ValueError:
+        return {'ids': 'Deben ser números enteros separados por comas'}, 400
+    if not ids or len(ids) > MAX_IDS_STOCK:
+        return {'ids': f'Indica entre 1 y {MAX_IDS_STOCK} productos'}, 400
+
+    async with limitar_bd():
+        filas = [
+            fila async for fila in Producto.objects.filter(pk__in=ids).order_by('id')
+            .values_list('id', 'stock', 'reservado')
+        ]
+    return [
+        {'id': pk, 'stock': stock, 'reservado': reservado, 'disponible': stock - reservado}
+        for pk, stock, reservado in filas
+    ], 200
+
+
+# ==================== CLIENTES ====================
+@lectura_async
+async def clientes_buscar_async_view(request):
+    """
+    GET /api/async/clientes/buscar/?q=<texto>[&limite=20]
+    Clientes no archivados cuyo nombre empieza por el texto (sin tildes ni
+    mayúsculas), por orden alfabético, con los datos de /api/clientes/<pk>/.
+    """
+    try:
+        limite = max(1, min(int(request.GET.get('limite', LIMITE_BUSQUEDA)), 100))
+    except ValueError:
+        return {'limite': 'Debe ser un número entero'}, 400
+    queryset = filtrar_por_prefijo(Cliente.objects.filter(archivado=False), request.GET.get('q', ''))
+    async with limitar_bd():
+        clientes = [c async for c in queryset.order_by('nombre_normalizado')[:limite]]
+    return ClienteSerializer(clientes, many=True).data, 200
+
+
+# ==================== VENTAS Y COMPRAS ====================
+async def _pedido(modelo, serializer_class, pk):
+    # con_detalles(): cabecera y tercero en un JOIN y las líneas en otra consulta
+    async with limitar_bd():
+        pedido = await modelo.objects.con_detalles().filter(pk=pk).afirst()
+    if pedido is None:
+        raise _NoEncontrado
+    return serializer_class(pedido).data, 200
+
+
+@lectura_async
+async def venta_async_view(request, pk):
+    """GET /api/async/ventas/<pk>/ (como /api/ventas/<pk>/, con sus líneas)."""
+    return await _pedido(Venta, VentaSerializer, pk)
+
+
+@lectura_async
+async def compra_async_view(request, pk):
+    """GET /api/async/compras/<pk>/ (como /api/compras/<pk>/, con sus líneas)."""
+    return await _pedido(Compra, CompraSerializer, pk)
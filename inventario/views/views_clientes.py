@@ -2,11 +2,14 @@
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
 from ..models import Cliente
 from ..forms import ClienteForm
+from ..servicios.borrado import eliminar_clientes
+from ..servicios.stock import StockInsuficienteError
 
 # -------------------------------------------------------------------
 # 📋 Listar todos los clientes (requiere login)
@@ -15,6 +18,7 @@ class ClienteListView(LoginRequiredMixin, ListView):
     model = Cliente
     template_name = 'inventario/cliente_list.html'
     context_object_name = 'clientes'
+    queryset = Cliente.objects.filter(archivado=False)  # Los archivados no se listan
     login_url = 'login'            # Redirige a login si no está autenticado
     redirect_field_name = 'next'
 
@@ -30,8 +34,12 @@ class ClienteCreateView(LoginRequiredMixin, CreateView):
     redirect_field_name = 'next'
 
     def form_valid(self, form):
+        # guardar() devuelve None si otro usuario acaba de dar de alta el mismo nombre
+        self.object = form.guardar()
+        if self.object is None:
+            return self.form_invalid(form)
         messages.success(self.request, "✅ Cliente creado correctamente.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def form_invalid(self, form):
         messages.error(self.request, "❌ Error al crear el cliente. Revisa los datos.")
@@ -49,8 +57,12 @@ class ClienteUpdateView(LoginRequiredMixin, UpdateView):
     redirect_field_name = 'next'
 
     def form_valid(self, form):
+        # guardar() devuelve None si otro usuario acaba de dar de alta el mismo nombre
+        self.object = form.guardar()
+        if self.object is None:
+            return self.form_invalid(form)
         messages.success(self.request, "✅ Cliente actualizado correctamente.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def form_invalid(self, form):
         messages.error(self.request, "❌ Error al actualizar el cliente.")
@@ -69,3 +81,14 @@ class ClienteDeleteView(LoginRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(self.request, "🗑️ Cliente eliminado correctamente.")
         return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        # Borrado en bloque: stock y totales se aplican una vez por producto
+        # y cabecera en lugar de disparar las señales por cada línea
+        try:
+            eliminar_clientes([self.object.pk])
+        except StockInsuficienteError as exc:
+            messages.error(self.request, f"❌ {exc}. Archívalo en lugar de borrarlo.")
+        else:
+            messages.success(self.request, "🗑️ Cliente eliminado correctamente.")
+        return redirect(self.get_success_url())
@@ -2,11 +2,14 @@
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
 from ..models import Compra, DetalleCompra
 from ..forms import CompraForm, DetalleCompraFormSet
+from ..servicios.stock import StockInsuficienteError
+from ..servicios.unidad_trabajo import diferir_recalculos
 
 # -------------------------------------------------------------------
 # 📋 Listar todas las compras (requiere autenticación)
@@ -17,6 +20,11 @@ class CompraListView(LoginRequiredMixin, ListView):
     model = Compra
     template_name = 'inventario/lista_compras.html'
     context_object_name = 'compras'      # Nombre de la variable usada en la plantilla
+    paginate_by = 20                     # Cada compra pinta todas sus líneas: mejor por páginas
+
+    def get_queryset(self):
+        # Proveedor y líneas (con producto) en consultas fijas por página, no una por fila
+        return Compra.objects.con_detalles().order_by('fecha', 'id')
 
 # -------------------------------------------------------------------
 # ➕ Crear una compra con líneas (formset) (requiere autenticación)
@@ -43,11 +51,18 @@ class CompraCreateView(LoginRequiredMixin, CreateView):
         context = self.get_context_data()
         formset = context['formset']
         if form.is_valid() and formset.is_valid():
+            try:
+                with diferir_recalculos():
+                    self.object = form.save()
+                    formset.instance = self.object
+                    formset.save()
+            except StockInsuficienteError as exc:
+                messages.error(self.request, f"❌ {exc}")
+                return self.form_invalid(form)
             messages.success(self.request, "✅ Compra creada correctamente.")
-            self.object = form.save()
-            formset.instance = self.object
-            formset.save()
-            return super().form_valid(form)
+            # Sin super().form_valid(): volvería a guardar la cabecera con el
+            # total viejo encima del que acaba de recalcular la BD
+            return redirect(self.get_success_url())
         else:
             messages.error(self.request, "❌ Revisa los errores del formulario.")
             return self.form_invalid(form)
@@ -75,11 +90,18 @@ class CompraUpdateView(LoginRequiredMixin, UpdateView):
         context = self.get_context_data()
         formset = context['formset']
         if form.is_valid() and formset.is_valid():
+            try:
+                with diferir_recalculos():
+                    self.object = form.save()
+                    formset.instance = self.object
+                    formset.save()
+            except StockInsuficienteError as exc:
+                messages.error(self.request, f"❌ {exc}")
+                return self.form_invalid(form)
             messages.success(self.request, "✅ Compra actualizada correctamente.")
-            self.object = form.save()
-            formset.instance = self.object
-            formset.save()
-            return super().form_valid(form)
+            # Sin super().form_valid(): volvería a guardar la cabecera con el
+            # total viejo encima del que acaba de recalcular la BD
+            return redirect(self.get_success_url())
         else:
             messages.error(self.request, "❌ Revisa los errores del formulario.")
             return self.form_invalid(form)
@@ -97,3 +119,12 @@ class CompraDeleteView(LoginRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(self.request, "🗑️ Compra eliminada correctamente.")
         return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        # Borrar la compra resta su stock: si ya se ha vendido, no se puede
+        try:
+            with diferir_recalculos():
+                return super().form_valid(form)
+        except StockInsuficienteError as exc:
+            messages.error(self.request, f"❌ {exc}")
+            return redirect('lista_compras')
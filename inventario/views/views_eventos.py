@@ -0,0 +1,60 @@
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+
+from inventario.servicios.eventos import bus_eventos
+from inventario.views.views_async import usuario_autenticado
+
+LATIDO = 15       # Segundos sin eventos tras los que se manda un comentario (mantiene viva la conexión)
+REINTENTO = 3000  # Milisegundos que espera EventSource antes de reconectar
+
+
+# ==================== STREAM DE EVENTOS (SSE) ====================
+def _mensaje(evento, datos):
+    return f'event: {evento}\ndata: {json.dumps(datos, cls=DjangoJSONEncoder)}\n\n'
+
+
+async def _emitir(latido=LATIDO):
+    # La suscripción se crea al empezar a enviar, en el bucle de eventos que
+    # atiende la conexión, y se cancela al cerrarse (el servidor ASGI cancela
+    # la tarea cuando el cliente se desconecta)
+    suscripcion = bus_eventos.suscribir()
+    try:
+        yield f'retry: {REINTENTO}\n\n'
+        while True:
+            eventos = await suscripcion.siguientes(latido)
+            yield ''.join(_mensaje(evento, datos) for evento, datos in eventos) if eventos else ': latido\n\n'
+    finally:
+        bus_eventos.cancelar(suscripcion)
+
+
+async def eventos_view(request):
+    """
+    GET /api/eventos/ (text/event-stream, sólo bajo ASGI)
+    Stream de Server-Sent Events con los cambios que se confirman en este
+    proceso:
+      - stock:    {"id", "stock", "reservado", "disponible"}; el último valor
+                  de cada producto (los cambios seguidos se fusionan)
+      - venta / compra: {"id", "cliente"/"proveedor", "fecha", "total"} de
+                  cada pedido nuevo
+      - reinicio: la conexión se ha quedado atrás y se ha descartado lo
+                  pendiente; hay que volver a cargar los datos
+    Cada conexión es una corrutina en espera, no un hilo. Solo usuarios
+    autenticados (sesión, Authorization: Bearer o ?token=).
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    # EventSource no permite añadir cabeceras: el JWT puede ir en ?token=
+    # (conviene no registrar la query string de esta ruta en los logs del proxy)
+    if await usuario_autenticado(request, token_en_query=True) is None:
+        return JsonResponse({'detail': 'Las credenciales de autenticación no se proveyeron.'}, status=401)
+    if not isinstance(request, ASGIRequest):
+        # Bajo WSGI Django consumiría el stream entero antes de responder
+        return JsonResponse({'detail': 'Este endpoint necesita un servidor ASGI (uvicorn, daphne).'}, status=501)
+
+    response = StreamingHttpResponse(_emitir(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: enviar cada evento sin acumularlo
+    return response
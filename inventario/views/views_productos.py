@@ -4,6 +4,8 @@ from django.contrib import messages
 from django.shortcuts import redirect
 from inventario.models import Producto
 from inventario.forms import ProductoForm
+from inventario.servicios.borrado import eliminar_productos
+from inventario.servicios.stock import StockInsuficienteError
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import ListView, DeleteView, UpdateView, CreateView
 
@@ -17,6 +19,7 @@ class ProductoListView(LoginRequiredMixin,ListView):
     model = Producto
     template_name = 'inventario/producto_list.html'
     context_object_name = 'productos'  # Nombre de la variable en la plantilla (opcional pero claro)
+    queryset = Producto.objects.filter(archivado=False)  # Los archivados no se listan
 
 
 # -------------------------------------------------------------------
@@ -66,3 +69,14 @@ class ProductoDeleteView(LoginRequiredMixin,DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(self.request, "🗑️ Producto eliminado correctamente.")
         return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        # Borrado en bloque: stock y totales se aplican una vez por producto
+        # y cabecera en lugar de disparar las señales por cada línea
+        try:
+            eliminar_productos([self.object.pk])
+        except StockInsuficienteError as exc:
+            messages.error(self.request, f"❌ {exc}. Archívalo en lugar de borrarlo.")
+        else:
+            messages.success(self.request, "🗑️ Producto eliminado correctamente.")
+        return redirect(self.get_success_url())
@@ -2,11 +2,14 @@
 
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 
 from ..models import Proveedor
 from ..forms import ProveedorForm
+from ..servicios.borrado import eliminar_proveedores
+from ..servicios.stock import StockInsuficienteError
 
 # -------------------------------------------------------------------
 # 📋 Listar todos los proveedores (requiere login)
@@ -15,6 +18,7 @@ class ProveedorListView(LoginRequiredMixin, ListView):
     model = Proveedor
     template_name = 'inventario/proveedor_list.html'
     context_object_name = 'proveedores'
+    queryset = Proveedor.objects.filter(archivado=False)  # Los archivados no se listan
     login_url = 'login'              # Redirige aquí si no está autenticado
     redirect_field_name = 'next'
 
@@ -30,8 +34,12 @@ class ProveedorCreateView(LoginRequiredMixin, CreateView):
     redirect_field_name = 'next'
 
     def form_valid(self, form):
+        # guardar() devuelve None si otro usuario acaba de dar de alta el mismo nombre
+        self.object = form.guardar()
+        if self.object is None:
+            return self.form_invalid(form)
         messages.success(self.request, "✅ Proveedor creado correctamente.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def form_invalid(self, form):
         messages.error(self.request, "❌ Error al crear el proveedor. Revisa los datos.")
@@ -49,8 +57,12 @@ class ProveedorUpdateView(LoginRequiredMixin, UpdateView):
     redirect_field_name = 'next'
 
     def form_valid(self, form):
+        # guardar() devuelve None si otro usuario acaba de dar de alta el mismo nombre
+        self.object = form.guardar()
+        if self.object is None:
+            return self.form_invalid(form)
         messages.success(self.request, "✅ Proveedor actualizado correctamente.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def form_invalid(self, form):
         messages.error(self.request, "❌ Error al actualizar el proveedor.")
@@ -69,3 +81,14 @@ class ProveedorDeleteView(LoginRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(self.request, "🗑️ Proveedor eliminado correctamente.")
         return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        # Borrado en bloque: stock y totales se aplican una vez por producto
+        # y cabecera en lugar de disparar las señales por cada línea
+        try:
+            eliminar_proveedores([self.object.pk])
+        except StockInsuficienteError as exc:
+            messages.error(self.request, f"❌ {exc}. Archívalo en lugar de borrarlo.")
+        else:
+            messages.success(self.request, "🗑️ Proveedor eliminado correctamente.")
+        return redirect(self.get_success_url())
@@ -9,6 +9,8 @@ from django.views.generic import ListView, DeleteView
 
 from ..models import Venta, DetalleVenta
 from ..forms import VentaForm, DetalleVentaFormSet
+from ..servicios.stock import StockInsuficienteError
+from ..servicios.unidad_trabajo import diferir_recalculos
 
 # 📋 Listar ventas (requiere login)
 class VentaListView(LoginRequiredMixin, ListView):
@@ -17,6 +19,11 @@ class VentaListView(LoginRequiredMixin, ListView):
     model = Venta
     template_name = 'inventario/lista_ventas.html'
     context_object_name = 'ventas'
+    paginate_by = 20  # Cada venta pinta todas sus líneas: mejor por páginas
+
+    def get_queryset(self):
+        # Cliente y líneas (con producto) en consultas fijas por página, no una por fila
+        return Venta.objects.con_detalles().order_by('fecha', 'id')
 
 # ➕ Crear venta con formset (requiere login)
 @login_required(login_url='login')
@@ -27,11 +34,16 @@ def VentaCreateView(request):
 
     if request.method == 'POST':
         if form.is_valid() and formset.is_valid():
-            venta = form.save()
-            formset.instance = venta
-            formset.save()
-            messages.success(request, "✅ Venta creada correctamente.")
-            return redirect('lista_ventas')
+            try:
+                with diferir_recalculos():
+                    venta = form.save()
+                    formset.instance = venta
+                    formset.save()
+            except StockInsuficienteError as exc:
+                messages.error(request, f"❌ {exc}")
+            else:
+                messages.success(request, "✅ Venta creada correctamente.")
+                return redirect('lista_ventas')
         else:
             messages.error(request, "❌ Revisa los errores del formulario.")
 
@@ -49,10 +61,15 @@ def VentaUpdateView(request, pk):
 
     if request.method == 'POST':
         if form.is_valid() and formset.is_valid():
-            form.save()
-            formset.save()
-            messages.success(request, "✅ Venta actualizada correctamente.")
-            return redirect('lista_ventas')
+            try:
+                with diferir_recalculos():
+                    form.save()
+                    formset.save()
+            except StockInsuficienteError as exc:
+                messages.error(request, f"❌ {exc}")
+            else:
+                messages.success(request, "✅ Venta actualizada correctamente.")
+                return redirect('lista_ventas')
         else:
             messages.error(request, "❌ Revisa los errores del formulario.")
 
@@ -72,3 +89,8 @@ class VentaDeleteView(LoginRequiredMixin, DeleteView):
     def delete(self, request, *args, **kwargs):
         messages.success(self.request, "🗑️ Venta eliminada correctamente.")
         return super().delete(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        # El borrado en cascada de las líneas devuelve el stock de una vez
+        with diferir_recalculos():
+            return super().form_valid(form)
@@ -0,0 +1,49 @@
+# inventario/widgets.py
+
+from django import forms
+from django.urls import reverse
+
+
+# -------------------------------------------------------------------
+# 🔤 <select> con opciones bajo demanda
+# -------------------------------------------------------------------
+class SelectAutocompletar(forms.Select):
+    """
+    Desplegable que sólo pinta la opción elegida. El resto se piden a
+    /api/autocompletar/<recurso>/ mientras el usuario escribe (ver
+    static/inventario/js/autocompletar.js), así que el HTML no crece con el
+    tamaño del catálogo.
+
+    `etiquetas` puede ser un callable que devuelva {pk: texto} precargado
+    (LineasFormSet lo usa para no hacer una consulta por línea).
+    """
+    etiquetas = None
+
+    class Media:
+        js = ('inventario/js/autocompletar.js',)
+
+    def __init__(self, recurso, attrs=None):
+        super().__init__(attrs)
+        self.recurso = recurso
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocompletar'] = reverse('api-autocompletar', args=[self.recurso])
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        seleccion = [str(v) for v in value if v not in (None, '')]
+        opciones = [self.create_option(name, '', '---------', not seleccion, 0)]
+        for indice, (pk, texto) in enumerate(self._etiquetas_de(seleccion), start=1):
+            opciones.append(self.create_option(name, pk, texto, True, indice))
+        return [(None, opciones, 0)]
+
+    def _etiquetas_de(self, seleccion):
+        if not seleccion:
+            return []
+        conocidas = self.etiquetas() if callable(self.etiquetas) else (self.etiquetas or {})
+        faltan = [pk for pk in seleccion if pk not in conocidas]
+        if faltan:
+            queryset = self.choices.queryset.filter(pk__in=faltan)
+            conocidas = {**conocidas, **{str(obj.pk): str(obj) for obj in queryset}}
+        return [(pk, conocidas[pk]) for pk in seleccion if pk in conocidas]
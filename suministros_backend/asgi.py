@@ -11,11 +11,11 @@ import os  # Importa módulo para manipular variables del entorno del sistema
 
 from django.core.asgi import get_asgi_application  # Importa la función para crear una app ASGI compatible
 
-# Establece el módulo de configuración por defecto de Django.
-# IMPORTANTE: Asegúrate de que el nombre coincida con tu proyecto real.
-# Si tu proyecto se llama 'suministros_backend', cambia esto por: 'suministros_backend.settings'
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", 'Empresa_suministros.settings')
+# Establece el módulo de configuración por defecto de Django (el mismo que manage.py)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", 'suministros_backend.settings')
 
-# Obtiene la aplicación ASGI lista para ser usada por servidores como Uvicorn o Daphne
+# Obtiene la aplicación ASGI lista para ser usada por servidores como Uvicorn o Daphne.
+# Es la necesaria para /api/eventos/ (SSE): cada conexión abierta es una corrutina, no un hilo
+#   uvicorn suministros_backend.asgi:application
 application = get_asgi_application()
 
@@ -52,8 +52,46 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",  # Mensajes flash
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "inventario.middleware.PerfiladoMiddleware",       # Server-Timing y métricas por ruta
+    "inventario.middleware.ConsultasLentasMiddleware", # Vista de origen en el log de consultas lentas
 ]
 
+# --- PERFILADO DE PETICIONES (inventario.middleware.PerfiladoMiddleware) ---
+# Fracción de peticiones que se miden (1.0 = todas, 0 = ninguna)
+PERFILADO_MUESTREO = 1.0
+# /api/_metrics/ sólo la ven usuarios staff con sesión o, si se define el token,
+# quien mande la cabecera "Authorization: Bearer <token>" (p. ej. Prometheus)
+PERFILADO_METRICAS_TOKEN = None
+# True la deja abierta a cualquiera (sólo tras un proxy que ya la proteja)
+PERFILADO_METRICAS_PUBLICAS = False
+
+# --- REGISTRO DE CONSULTAS LENTAS (inventario/consultas_lentas.py) ---
+# Sentencias más lentas que el umbral se guardan con su plan (EXPLAIN QUERY PLAN)
+# en un log rotativo; resumen con "python manage.py slow_queries". None = desactivado
+CONSULTAS_LENTAS_UMBRAL_MS = 100
+CONSULTAS_LENTAS_FICHERO = BASE_DIR / "logs" / "consultas_lentas.log"
+CONSULTAS_LENTAS_MAX_BYTES = 5 * 1024 * 1024
+CONSULTAS_LENTAS_COPIAS = 5
+
+# --- CACHÉ DE RESPUESTAS (inventario/servicios/cache_respuestas.py) ---
+# GET de productos, clientes y proveedores; se invalida por señales al cambiar los datos.
+# LocMemCache es propia de cada proceso: con varios workers (gunicorn -w N) un worker no
+# vería las invalidaciones de otro, así que hay que usar un backend compartido, p. ej.
+#   {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": BASE_DIR / "cache"}
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "respuestas": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "respuestas",
+        "TIMEOUT": 300,                       # Segundos; además se invalida al cambiar los datos
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+# Alias de CACHES que se usa; None = desactivada
+CACHE_RESPUESTAS_ALIAS = "respuestas"
+
 # --- CORS: permitir peticiones desde el frontend React ---
 CORS_ALLOW_ALL_ORIGINS = True
 # Para producción, restringir:
@@ -80,6 +118,10 @@ TEMPLATES = [
 
 # --- PUNTO DE ENTRADA WSGI PARA DESPLIEGUE ---
 WSGI_APPLICATION = "suministros_backend.wsgi.application"
+# Servidor ASGI (uvicorn/daphne), necesario para /api/eventos/ y las vistas de /api/async/
+ASGI_APPLICATION = "suministros_backend.asgi.application"
+# Peticiones de las vistas async (/api/async/...) consultando la BD a la vez en cada proceso
+ASYNC_MAX_CONSULTAS = 8
 
 # --- BASE DE DATOS ---
 DATABASES = {